@@ -0,0 +1,129 @@
+"""Agent message monthly partitions and retention
+
+Revision ID: 3d9b6f0a2c71
+Revises: e7f20b9c4d13
+Create Date: 2026-10-17 13:21:44.905127
+
+"""
+
+from collections.abc import Sequence
+from datetime import UTC, date, datetime
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "3d9b6f0a2c71"
+down_revision: str | None = "e7f20b9c4d13"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+PARTITIONS_AHEAD = 2
+
+
+def next_month(month: date) -> date:
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+
+    return date(month.year, month.month + 1, 1)
+
+
+def create_agentmessage_table(table_name: str, partitioned: bool) -> None:
+    op.create_table(
+        table_name,
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('agentmessage_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("agent_id", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.TIMESTAMP(timezone=True), nullable=not partitioned),
+        sa.Column("query", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("response", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("caller_agent_id", sa.Integer(), nullable=True),
+        sa.Column("caller_player_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["agent_id"], ["agent.id"], name=f"{table_name}_agent_id_fkey"),
+        sa.ForeignKeyConstraint(
+            ["caller_agent_id"], ["agent.id"], name=f"{table_name}_caller_agent_id_fkey"
+        ),
+        sa.ForeignKeyConstraint(
+            ["caller_player_id"], ["player.id"], name=f"{table_name}_caller_player_id_fkey"
+        ),
+        sa.PrimaryKeyConstraint(
+            *(("id", "timestamp") if partitioned else ("id",)), name=f"{table_name}_pkey"
+        ),
+        **({"postgresql_partition_by": "RANGE (timestamp)"} if partitioned else {}),
+    )
+
+
+def replace_agentmessage_table(partitioned: bool) -> None:
+    op.drop_index("ix_agentmessage_caller_agent_id_timestamp", table_name="agentmessage")
+    op.drop_index("ix_agentmessage_agent_id_timestamp", table_name="agentmessage")
+    for constraint in ("pkey", "agent_id_fkey", "caller_agent_id_fkey", "caller_player_id_fkey"):
+        op.execute(
+            f"ALTER TABLE agentmessage RENAME CONSTRAINT agentmessage_{constraint} "
+            f"TO agentmessage_old_{constraint}"
+        )
+    op.rename_table("agentmessage", "agentmessage_old")
+
+    create_agentmessage_table("agentmessage", partitioned)
+    op.execute("ALTER SEQUENCE agentmessage_id_seq OWNED BY agentmessage.id")
+
+    if partitioned:
+        op.execute("CREATE TABLE agentmessage_default PARTITION OF agentmessage DEFAULT")
+
+        oldest = op.get_bind().execute(sa.text("SELECT min(timestamp) FROM agentmessage_old"))
+        now = datetime.now(UTC)
+        month = min(oldest.scalar() or now, now).astimezone(UTC).date().replace(day=1)
+        last_month = now.date().replace(day=1)
+        for _ in range(PARTITIONS_AHEAD):
+            last_month = next_month(last_month)
+
+        while month <= last_month:
+            op.execute(
+                f"CREATE TABLE agentmessage_p{month.year:04}_{month.month:02} "
+                f"PARTITION OF agentmessage "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{next_month(month).isoformat()} 00:00:00+00')"
+            )
+            month = next_month(month)
+
+    columns = "id, agent_id, timestamp, query, response, caller_agent_id, caller_player_id"
+    op.execute(
+        f"INSERT INTO agentmessage ({columns}) "
+        f"SELECT {columns} FROM agentmessage_old"
+        + (" WHERE timestamp IS NOT NULL" if partitioned else "")
+    )
+    if partitioned:
+        # The partition key cannot be null, messages without a timestamp are kept as sent now
+        op.execute(
+            f"INSERT INTO agentmessage ({columns}) "
+            f"SELECT id, agent_id, now(), query, response, caller_agent_id, caller_player_id "
+            f"FROM agentmessage_old WHERE timestamp IS NULL"
+        )
+
+    op.drop_table("agentmessage_old")
+
+    op.create_index(
+        "ix_agentmessage_agent_id_timestamp",
+        "agentmessage",
+        ["agent_id", "timestamp", "id"],
+    )
+    op.create_index(
+        "ix_agentmessage_caller_agent_id_timestamp",
+        "agentmessage",
+        ["caller_agent_id", "timestamp", "id"],
+    )
+
+
+def upgrade() -> None:
+    op.add_column("agent", sa.Column("message_retention_days", sa.Integer(), nullable=True))
+    replace_agentmessage_table(partitioned=True)
+
+
+def downgrade() -> None:
+    replace_agentmessage_table(partitioned=False)
+    op.drop_column("agent", "message_retention_days")
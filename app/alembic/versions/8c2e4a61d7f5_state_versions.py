@@ -0,0 +1,34 @@
+"""State versions
+
+Revision ID: 8c2e4a61d7f5
+Revises: 3d9b6f0a2c71
+Create Date: 2026-10-17 14:37:12.518340
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c2e4a61d7f5"
+down_revision: str | None = "3d9b6f0a2c71"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "globalstate",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "agent",
+        sa.Column("state_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent", "state_version")
+    op.drop_column("globalstate", "version")
@@ -0,0 +1,45 @@
+"""Agent history strategy
+
+Revision ID: 9a3e5c7d1f20
+Revises: 1b72747ee2a1
+Create Date: 2026-10-17 10:12:31.402815
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a3e5c7d1f20"
+down_revision: str | None = "1b72747ee2a1"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "agent",
+        sa.Column(
+            "history_strategy",
+            sa.Enum(
+                "LAST_MESSAGES",
+                "TOKEN_BUDGET",
+                "TIME_WINDOW",
+                name="historystrategy",
+                native_enum=False,
+            ),
+            nullable=False,
+            server_default="LAST_MESSAGES",
+        ),
+    )
+    op.add_column(
+        "agent",
+        sa.Column("history_limit", sa.Integer(), nullable=False, server_default="50"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent", "history_limit")
+    op.drop_column("agent", "history_strategy")
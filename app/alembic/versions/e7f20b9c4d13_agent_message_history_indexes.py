@@ -0,0 +1,35 @@
+"""Agent message history indexes
+
+Revision ID: e7f20b9c4d13
+Revises: c41d8e2b6a57
+Create Date: 2026-10-17 11:52:07.630944
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7f20b9c4d13"
+down_revision: str | None = "c41d8e2b6a57"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_agentmessage_agent_id_timestamp",
+        "agentmessage",
+        ["agent_id", "timestamp", "id"],
+    )
+    op.create_index(
+        "ix_agentmessage_caller_agent_id_timestamp",
+        "agentmessage",
+        ["caller_agent_id", "timestamp", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agentmessage_caller_agent_id_timestamp", table_name="agentmessage")
+    op.drop_index("ix_agentmessage_agent_id_timestamp", table_name="agentmessage")
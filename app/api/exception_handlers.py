@@ -1,7 +1,7 @@
 from fastapi import HTTPException, Request, Response
 from fastapi.exception_handlers import http_exception_handler
 
-from app.errors.api import ConflictError, NotFoundError
+from app.errors.api import BadRequestError, ConflictError, NotFoundError
 
 
 async def not_found_error_handler(request: Request, exc: NotFoundError) -> Response:
@@ -10,3 +10,7 @@ async def not_found_error_handler(request: Request, exc: NotFoundError) -> Respo
 
 async def conflict_error_handler(request: Request, exc: ConflictError) -> Response:
     return await http_exception_handler(request, HTTPException(status_code=409, detail=str(exc)))
+
+
+async def bad_request_error_handler(request: Request, exc: BadRequestError) -> Response:
+    return await http_exception_handler(request, HTTPException(status_code=400, detail=str(exc)))
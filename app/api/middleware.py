@@ -0,0 +1,52 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import count_statements, http_request_duration, record_statements
+
+
+class HttpMetricsMiddleware:
+    """
+    Measures the duration and the SQL statements of the requests by route template.
+    A request is measured until the last chunk of its response body is sent,
+    so that the statements of streamed responses are counted as well.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record() -> None:
+            nonlocal recorded
+            if recorded:
+                return
+
+            recorded = True
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method, path, status)
+            record_statements(f"{method} {path}", statements)
+
+        async def send_and_record(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        with count_statements() as statements:
+            try:
+                await self.app(scope, receive, send_and_record)
+            finally:
+                record()
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 
 from app.api.dependencies import validate_token
-from app.errors.api import NotFoundError
+from app.errors.api import BadRequestError, NotFoundError
 from app.models import AgentMessage
 from app.models.agent import Agent, AgentRequest, AgentResponse, AgentUpdateRequest
+from app.models.agent_message import (
+    MessagePosition,
+    decode_message_cursor,
+    encode_message_cursor,
+)
 from app.services.agent_service import AgentService
 
 agents_router = APIRouter(prefix="/agents", tags=["agents"], dependencies=[Depends(validate_token)])
@@ -38,9 +46,45 @@ async def delete_agent(agent_id: int) -> None:
     await AgentService().delete_agent(agent_id)
 
 
+def decode_cursor(cursor: str | None) -> MessagePosition | None:
+    if cursor is None:
+        return None
+
+    try:
+        return decode_message_cursor(cursor)
+    except ValueError as e:
+        raise BadRequestError(str(e))
+
+
 @agents_router.get("/{agent_id}/messages")
-async def get_agent_messages(agent_id: int) -> list[AgentMessage]:
-    return await AgentService().get_agent_messages(agent_id)
+async def get_agent_messages(
+    agent_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: str | None = None,
+    after: str | None = None,
+) -> list[AgentMessage]:
+    messages = await AgentService().get_agent_messages_page(
+        agent_id, limit, decode_cursor(before), decode_cursor(after)
+    )
+    if messages:
+        response.headers["X-Before-Cursor"] = encode_message_cursor(messages[0].position)
+        response.headers["X-After-Cursor"] = encode_message_cursor(messages[-1].position)
+
+    return messages
+
+
+@agents_router.get("/{agent_id}/messages/export")
+async def export_agent_messages(agent_id: int) -> StreamingResponse:
+    agent_service = AgentService()
+    if await agent_service.get_agent_by_id(agent_id) is None:
+        raise NotFoundError(f"Agent with id {agent_id} not found")
+
+    async def ndjson_lines() -> AsyncIterator[str]:
+        async for message in agent_service.stream_agent_messages(agent_id):
+            yield message.model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 
 @agents_router.delete("/{agent_id}/messages", status_code=204)
@@ -13,6 +13,8 @@ from app.models.action_condition_operator import (
     ActionConditionOperatorRequest,
     ActionConditionOperatorResponse,
     ActionConditionOperatorUpdateRequest,
+    ConditionTreeRequest,
+    ConditionTreeResponse,
     NewConditionTreeRequest,
 )
 from app.services.action_condition_service import ActionConditionService
@@ -43,6 +45,13 @@ async def create_new_condition_tree(
     return await ActionConditionService().create_condition_operator_root(tree_request)
 
 
+@conditions_router.put("/tree/{action_id}", response_model=ConditionTreeResponse)
+async def replace_condition_tree(
+    action_id: int, tree_request: ConditionTreeRequest
+) -> ConditionTreeResponse:
+    return await ActionConditionService().replace_condition_tree(action_id, tree_request)
+
+
 @conditions_router.get("/condition", response_model=list[ActionConditionResponse])
 async def get_action_conditions() -> list[ActionCondition]:
     return await ActionConditionService().get_conditions()
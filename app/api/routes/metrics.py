@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import QueuePool
+
+from app.api.dependencies import validate_token
+from app.core.database import async_engine
+from app.core.metrics import (
+    cache_hit_ratio,
+    cache_hits,
+    cache_misses,
+    db_pool_connections,
+    db_pool_size,
+    metrics,
+    socketio_connections,
+)
+from app.models.structured_output import structured_output_cache
+from app.services.action_condition_service import condition_tree_cache
+from app.services.llm_service import agent_chain_cache
+from app.sockets import sio
+
+metrics_router = APIRouter(tags=["metrics"], dependencies=[Depends(validate_token)])
+
+CACHES = {
+    "agent_chain": agent_chain_cache,
+    "condition_tree": condition_tree_cache,
+    "structured_output": structured_output_cache,
+}
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """
+    Gets the metrics in the Prometheus text format.
+    The values kept elsewhere, like the pool and cache counters, are only read when scraped.
+    """
+
+    socketio_connections.set(sum(1 for _ in sio.manager.get_participants("/", None)))
+
+    pool = async_engine.pool
+    if isinstance(pool, QueuePool):
+        db_pool_size.set(pool.size())
+        db_pool_connections.set(pool.checkedout(), "checked_out")
+        db_pool_connections.set(pool.checkedin(), "idle")
+        db_pool_connections.set(max(pool.overflow(), 0), "overflow")
+
+    for name, cache in CACHES.items():
+        cache_hits.set(cache.hits, name)
+        cache_misses.set(cache.misses, name)
+        cache_hit_ratio.set(cache.hit_ratio, name)
+
+    return metrics.render()
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import TypedDict
+
+__all__ = ("CacheStats", "LRUCache")
+
+
+class CacheStats(TypedDict):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class LRUCache[K, V]:
+    """
+    An in-process least recently used cache, counting its hits and misses.
+    The generation is incremented whenever values are removed, so that values loaded
+    before an invalidation are not cached afterwards.
+    """
+
+    maxsize: int
+    generation: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> V | None:
+        """Gets the cached value for the key, or None if it is not cached."""
+
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, generation: int | None = None) -> None:
+        """
+        Caches the value for the key, evicting the least recently used values if full.
+        If a generation is given, the value is only cached if nothing was removed since,
+        as it might have been loaded before an invalidation.
+        """
+
+        if generation is not None and generation != self.generation:
+            return
+
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        """Removes the cached value for the key, if any."""
+
+        self.generation += 1
+        self._items.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[K, V], bool]) -> None:
+        """Removes all cached values for which the predicate is true."""
+
+        self.generation += 1
+        for key in [key for key, value in self._items.items() if predicate(key, value)]:
+            del self._items[key]
+
+    def clear(self) -> None:
+        """Removes all cached values."""
+
+        self.generation += 1
+        self._items.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        """The ratio of hits to all lookups, or 0 if there were no lookups."""
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> CacheStats:
+        """Gets the size and the hit and miss counters of the cache."""
+
+        return CacheStats(
+            size=len(self),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hit_ratio,
+        )
@@ -2,7 +2,7 @@ from os import getenv
 
 from dotenv import load_dotenv
 from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 load_dotenv()
@@ -16,7 +16,41 @@ DATABASE_URL = (
     f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:5432/{POSTGRES_DB}"
 )
 
-async_engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+DATABASE_POOL_ENABLED = getenv("DATABASE_POOL_ENABLED", "true").lower() == "true"
+DATABASE_POOL_SIZE = int(getenv("DATABASE_POOL_SIZE", "10"))
+DATABASE_POOL_MAX_OVERFLOW = int(getenv("DATABASE_POOL_MAX_OVERFLOW", "20"))
+DATABASE_POOL_PRE_PING = getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+DATABASE_POOL_RECYCLE = int(getenv("DATABASE_POOL_RECYCLE", "1800"))
+DATABASE_STATEMENT_CACHE_SIZE = int(getenv("DATABASE_STATEMENT_CACHE_SIZE", "500"))
+
+
+def create_engine(url: str, pooled: bool = DATABASE_POOL_ENABLED) -> AsyncEngine:
+    """
+    Creates an async engine for the given database URL.
+
+    Args:
+        url (str): The database URL.
+        pooled (bool): Whether to keep a pool of connections, which also keeps
+            their prepared statement caches. Otherwise, every session opens a new connection.
+
+    Returns:
+        AsyncEngine: The created engine.
+    """
+
+    if not pooled:
+        return create_async_engine(url, poolclass=NullPool)
+
+    return create_async_engine(
+        url,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_POOL_MAX_OVERFLOW,
+        pool_pre_ping=DATABASE_POOL_PRE_PING,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        connect_args={"prepared_statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE},
+    )
+
+
+async_engine = create_engine(DATABASE_URL)
 
 Session = async_sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
@@ -0,0 +1,271 @@
+from bisect import bisect_left
+from collections import Counter as StatementCounter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from sqlalchemy import Engine, event
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "StatementCount",
+    "count_statements",
+    "metrics",
+    "record_statements",
+    "statement_observers",
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+Labels = tuple[str, ...]
+
+
+class Metric:
+    """
+    A metric in the Prometheus text format, with a value per combination of label values.
+    The app runs on a single event loop, so the values are updated without locking.
+    """
+
+    kind: str
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: Any) -> None:
+        """Set the value, for values kept elsewhere which are copied when scraped."""
+
+        self._values[tuple(map(str, labels))] = value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self._values.items():
+            yield f"{self.name}{self._format_labels(labels)} {_format_value(value)}"
+
+    def _format_labels(self, labels: Labels, **extra: str) -> str:
+        pairs = [*zip(self.labelnames, labels, strict=True), *extra.items()]
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        key = tuple(map(str, labels))
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    """Counts the observed values in buckets by upper bound, rendered cumulatively."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._counts: dict[Labels, list[int]] = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        key = tuple(map(str, labels))
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+
+        counts[bisect_left(self.buckets, value)] += 1
+        self._values[key] = self._values.get(key, 0) + value
+
+    def clear(self) -> None:
+        super().clear()
+        self._counts.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts, strict=True):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _format_value(bound)
+                yield f"{self.name}_bucket{self._format_labels(labels, le=le)} {cumulative}"
+
+            label_text = self._format_labels(labels)
+            yield f"{self.name}_sum{label_text} {_format_value(self._values[labels])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+MetricType = TypeVar("MetricType", bound=Metric)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: MetricType) -> MetricType:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+
+        return (
+            "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+        )
+
+    def clear(self) -> None:
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Duration of the HTTP requests by route.",
+        ("method", "route", "status"),
+    )
+)
+socketio_event_duration = metrics.register(
+    Histogram(
+        "socketio_event_duration_seconds",
+        "Duration of the Socket.IO event handlers by event.",
+        ("event",),
+    )
+)
+socketio_connections = metrics.register(
+    Gauge("socketio_connections", "Connected Socket.IO clients.")
+)
+db_pool_connections = metrics.register(
+    Gauge(
+        "db_pool_connections",
+        "Database connections of the pool, checked out, idle in the pool or overflowing it.",
+        ("state",),
+    )
+)
+db_pool_size = metrics.register(Gauge("db_pool_size", "Size of the database connection pool."))
+db_statements_per_request = metrics.register(
+    Histogram(
+        "db_statements_per_request",
+        "SQL statements executed per HTTP request or Socket.IO event.",
+        ("endpoint",),
+        buckets=STATEMENT_BUCKETS,
+    )
+)
+llm_request_duration = metrics.register(
+    Histogram(
+        "llm_request_duration_seconds",
+        "Duration of the LLM calls by agent.",
+        ("agent_id",),
+        buckets=LLM_LATENCY_BUCKETS,
+    )
+)
+llm_tokens = metrics.register(
+    Counter(
+        "llm_tokens_total",
+        "Tokens used by the LLM calls by agent, as input or output.",
+        ("agent_id", "type"),
+    )
+)
+condition_evaluations = metrics.register(
+    Counter(
+        "condition_evaluations_total",
+        "Evaluations of action conditions by result: available, unavailable or error.",
+        ("result",),
+    )
+)
+cache_hits = metrics.register(Counter("cache_hits_total", "Cache hits by cache.", ("cache",)))
+cache_misses = metrics.register(Counter("cache_misses_total", "Cache misses by cache.", ("cache",)))
+cache_hit_ratio = metrics.register(
+    Gauge("cache_hit_ratio", "Ratio of hits to all lookups by cache.", ("cache",))
+)
+
+
+class StatementCount:
+    """The SQL statements executed while handling a request, by SQL text if recorded."""
+
+    count: int
+    texts: StatementCounter[str] | None
+
+    def __init__(self, record_texts: bool = False) -> None:
+        self.count = 0
+        self.texts = StatementCounter() if record_texts else None
+
+
+# Called with the endpoint and the statements of every handled request, like the test suite
+# query budgets. The SQL texts of the statements are only recorded while there are observers.
+statement_observers: list[Callable[[str, StatementCount], None]] = []
+
+_statement_count: ContextVar[StatementCount | None] = ContextVar("statement_count", default=None)
+
+
+@contextmanager
+def count_statements() -> Iterator[StatementCount]:
+    """
+    Count the SQL statements executed in this context, including in the tasks it creates.
+
+    Yields:
+        StatementCount: The count, updated as the statements are executed.
+    """
+
+    statements = StatementCount(record_texts=bool(statement_observers))
+    token = _statement_count.set(statements)
+    try:
+        yield statements
+    finally:
+        _statement_count.reset(token)
+
+
+def record_statements(endpoint: str, statements: StatementCount) -> None:
+    """
+    Record the statements executed while handling a request of the endpoint.
+
+    Args:
+        endpoint (str): The route or the event of the request.
+        statements (StatementCount): The statements counted while handling it.
+    """
+
+    db_statements_per_request.observe(statements.count, endpoint)
+    for observer in statement_observers:
+        observer(endpoint, statements)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(_connection: Any, _cursor: Any, statement: str, *_: Any) -> None:
+    statements = _statement_count.get()
+    if statements is not None:
+        statements.count += 1
+        if statements.texts is not None:
+            statements.texts[statement] += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
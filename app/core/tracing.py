@@ -0,0 +1,286 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypedDict
+from uuid import UUID
+
+import httpx
+from dotenv import load_dotenv
+
+__all__ = (
+    "Span",
+    "SpanTree",
+    "TRACING_ENABLED",
+    "Trace",
+    "export_trace",
+    "span",
+    "start_trace",
+    "traced",
+)
+
+load_dotenv()
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+TRACING_ENABLED = bool(TRACE_EXPORT_PATH or TRACE_COLLECTOR_URL)
+
+SERVICE_NAME = "agents-framework"
+
+# OpenTelemetry span status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+logger = logging.getLogger(__name__)
+
+
+class SpanTree(TypedDict):
+    name: str
+    start_ms: float
+    duration_ms: float
+    attributes: dict[str, Any]
+    error: str | None
+    children: list["SpanTree"]
+
+
+class Span:
+    """A timed operation of a trace, nested in its parent span."""
+
+    __slots__ = ("name", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    def to_otlp(self, trace_id: str) -> dict[str, Any]:
+        """The span in the OTLP JSON encoding."""
+
+        return {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": STATUS_ERROR, "message": self.error}
+                if self.error is not None
+                else {"code": STATUS_OK}
+            ),
+        }
+
+
+class Trace:
+    """The spans recorded while handling a query, identified by the query ID."""
+
+    def __init__(self, query_id: UUID) -> None:
+        self.query_id = query_id
+        self.spans: list[Span] = []
+
+    def to_otlp(self) -> dict[str, Any]:
+        """The trace as an OTLP JSON export request, as accepted by OpenTelemetry collectors."""
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span_.to_otlp(self.query_id.hex) for span_ in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def to_tree(self) -> list[SpanTree]:
+        """The root spans with their children nested, timed from the start of the trace."""
+
+        if not self.spans:
+            return []
+
+        start_ns = min(span_.start_ns for span_ in self.spans)
+        trees: dict[str, SpanTree] = {
+            span_.span_id: {
+                "name": span_.name,
+                "start_ms": (span_.start_ns - start_ns) / 1e6,
+                "duration_ms": ((span_.end_ns or span_.start_ns) - span_.start_ns) / 1e6,
+                "attributes": span_.attributes,
+                "error": span_.error,
+                "children": [],
+            }
+            for span_ in self.spans
+        }
+
+        roots = []
+        for span_ in self.spans:
+            parent = trees.get(span_.parent_id) if span_.parent_id is not None else None
+            (parent["children"] if parent is not None else roots).append(trees[span_.span_id])
+
+        return roots
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def start_trace(query_id: UUID) -> Iterator[Trace]:
+    """
+    Record the spans started in this context, including in the tasks it creates, into a trace.
+
+    Args:
+        query_id (UUID): The ID of the query, used as the trace ID.
+
+    Yields:
+        Trace: The trace, complete once the context exits.
+    """
+
+    trace = Trace(query_id)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """
+    Time the operation in a span, nested in the current span.
+    Outside of a trace nothing is recorded, so spans cost a context variable lookup.
+
+    Args:
+        name (str): The name of the span.
+        **attributes (Any): The attributes of the span.
+
+    Yields:
+        Span | None: The span, or None outside of a trace.
+    """
+
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    span_ = Span(name, parent.span_id if parent is not None else None, attributes)
+    trace.spans.append(span_)
+    token = _current_span.set(span_)
+    try:
+        yield span_
+    except BaseException as e:
+        span_.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span_.end()
+        _current_span.reset(token)
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """
+    Decorate a function to run in a span, named after the function by default.
+
+    Args:
+        name (str | None): The name of the span.
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _current_trace.get() is None:
+                    return await func(*args, **kwargs)
+
+                with span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def export_trace(trace: Trace) -> None:
+    """
+    Export the trace as OTLP JSON, appended as a line to TRACE_EXPORT_PATH
+    and posted to the collector at TRACE_COLLECTOR_URL, if configured.
+    Export failures are logged, so they never fail the query.
+
+    Args:
+        trace (Trace): The complete trace.
+    """
+
+    if not TRACING_ENABLED:
+        return
+
+    payload = trace.to_otlp()
+
+    if TRACE_EXPORT_PATH:
+        try:
+            await asyncio.to_thread(_append_line, TRACE_EXPORT_PATH, json.dumps(payload))
+        except OSError:
+            logger.exception(f"Failed to export trace {trace.query_id} to {TRACE_EXPORT_PATH}")
+
+    if TRACE_COLLECTOR_URL:
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(TRACE_COLLECTOR_URL, json=payload)
+                response.raise_for_status()
+        except httpx.HTTPError:
+            logger.exception(f"Failed to export trace {trace.query_id} to {TRACE_COLLECTOR_URL}")
+
+
+def _append_line(path: str, line: str) -> None:
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
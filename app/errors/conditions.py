@@ -4,3 +4,7 @@ class ConditionEvaluationError(Exception):
 
 class StateVariableNotFoundError(ConditionEvaluationError):
     pass
+
+
+class InvalidConditionTreeError(ConditionEvaluationError):
+    pass
@@ -0,0 +1,2 @@
+class LLMResponseError(Exception):
+    pass
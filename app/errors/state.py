@@ -0,0 +1,17 @@
+from app.models.global_state import State
+
+
+class StatePatchError(Exception):
+    pass
+
+
+class StateVersionConflictError(Exception):
+    """Raised when a state changed since the version a compare-and-set write expected."""
+
+    version: int
+    state: State
+
+    def __init__(self, version: int, state: State) -> None:
+        super().__init__(f"State version conflict, the current version is {version}")
+        self.version = version
+        self.state = state
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import random
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, field_validator
+
+WORDS = (
+    "the traveller asks about the old road north of the village where the merchants "
+    "lost their cart last winter and nobody has seen the miller since the storm"
+).split()
+
+LATENCY_DISTRIBUTION_PARAMS = {"none": 0, "constant": 1, "uniform": 2, "lognormal": 2}
+
+
+def parse_latency(latency: str) -> tuple[str, list[float]]:
+    """
+    Parse a latency distribution, one of none, constant:<seconds>,
+    uniform:<min seconds>,<max seconds> or lognormal:<median seconds>,<sigma>.
+
+    Args:
+        latency (str): The latency distribution.
+
+    Returns:
+        tuple[str, list[float]]: The name of the distribution and its parameters.
+    """
+
+    name, _, params = latency.partition(":")
+    if name not in LATENCY_DISTRIBUTION_PARAMS:
+        raise ValueError(f"Unknown latency distribution {name}")
+
+    values = [float(param) for param in params.split(",")] if params else []
+    if len(values) != LATENCY_DISTRIBUTION_PARAMS[name]:
+        raise ValueError(
+            f"Latency distribution {name} takes {LATENCY_DISTRIBUTION_PARAMS[name]} params"
+        )
+
+    return name, values
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A local chat model for load tests, answering without calling any LLM.
+    Structured outputs are valid instances of the requested schema, calling each optional
+    action with the given probability, and the answers are streamed word by word.
+    The answers only depend on the seed and the messages, so runs can be reproduced,
+    while the latency of each answer is sampled from the latency distribution.
+    """
+
+    model_name: str = "fake"
+    latency: str = "none"
+    action_probability: float = 0.3
+    seed: int = 0
+
+    @field_validator("latency")
+    @classmethod
+    def validate_latency(cls, latency: str) -> str:
+        parse_latency(latency)
+        return latency
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def with_structured_output(
+        self, schema: type[BaseModel], **kwargs: Any
+    ) -> Runnable[Any, BaseModel]:
+        """
+        Answer with JSON matching the schema, parsed into its model.
+        The other arguments, like the method, are accepted for compatibility and ignored.
+        """
+
+        return self.bind(response_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        response_schema: type[BaseModel] | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        rng = self._random(messages)
+        time.sleep(self._sample_latency(rng))
+        return self._chat_result(messages, self._answer(rng, response_schema))
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        response_schema: type[BaseModel] | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        rng = self._random(messages)
+        await asyncio.sleep(self._sample_latency(rng))
+        return self._chat_result(messages, self._answer(rng, response_schema))
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        response_schema: type[BaseModel] | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, run_manager, response_schema)
+        yield from self._chunks(result)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        response_schema: type[BaseModel] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        result = await self._agenerate(messages, stop, run_manager, response_schema)
+        for chunk in self._chunks(result):
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _random(self, messages: list[BaseMessage]) -> random.Random:
+        """A random generator seeded by the seed and the messages, to reproduce the answers."""
+
+        return random.Random(f"{self.seed}:{[message.content for message in messages]}")
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        name, params = parse_latency(self.latency)
+        if name == "constant":
+            return params[0]
+        if name == "uniform":
+            return rng.uniform(*params)
+        if name == "lognormal":
+            return params[0] * rng.lognormvariate(0, params[1])
+        return 0
+
+    def _answer(self, rng: random.Random, response_schema: type[BaseModel] | None) -> str:
+        if response_schema is None:
+            return self._text(rng)
+
+        json_schema = response_schema.model_json_schema()
+        return json.dumps(self._fake_value(rng, json_schema, json_schema.get("$defs", {})))
+
+    def _fake_value(self, rng: random.Random, schema: dict, defs: dict) -> Any:
+        """Create a random value valid for the JSON schema."""
+
+        if "$ref" in schema:
+            return self._fake_value(rng, defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+
+        if "anyOf" in schema:
+            options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+            if len(options) < len(schema["anyOf"]) and rng.random() >= self.action_probability:
+                return None
+            return self._fake_value(rng, rng.choice(options), defs)
+
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        if "const" in schema:
+            return schema["const"]
+
+        match schema.get("type"):
+            case "object":
+                return {
+                    name: self._fake_value(rng, property_schema, defs)
+                    for name, property_schema in schema.get("properties", {}).items()
+                }
+            case "array":
+                return []
+            case "integer":
+                return rng.randint(0, 100)
+            case "number":
+                return round(rng.uniform(0, 100), 2)
+            case "boolean":
+                return rng.random() < 0.5
+            case _:
+                return self._text(rng)
+
+    def _text(self, rng: random.Random) -> str:
+        return " ".join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + "."
+
+    def _chat_result(self, messages: list[BaseMessage], content: str) -> ChatResult:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        output_tokens = len(content.split())
+        message = AIMessage(
+            content=content,
+            response_metadata={"model_name": self.model_name},
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, result: ChatResult) -> Iterator[ChatGenerationChunk]:
+        """Split the answer into a chunk per word, with the usage in the last chunk."""
+
+        message = result.generations[0].message
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=word if last else f"{word} ",
+                    usage_metadata=message.usage_metadata if last else None,
+                    response_metadata=message.response_metadata if last else {},
+                )
+            )
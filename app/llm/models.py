@@ -1,5 +1,6 @@
 from typing import TypedDict
 
+from langchain_core.messages import BaseMessage
 from pydantic import BaseModel
 
 from app.models.global_state import State
@@ -25,6 +26,8 @@ class ChainInput(TypedDict):
     agent_internal_state: State
     agent_external_state: State
     action_agents: dict[str, AgentDetails]
+    conversation_summary: str
+    conversation_history: list[BaseMessage]
 
 
 class ChainOutput(BaseModel):
@@ -0,0 +1,111 @@
+import json
+import re
+
+RESPONSE_START = re.compile(r'"response"\s*:\s*"')
+RESPONSE_TEXT = re.compile(r'[^"\\]+')
+UNICODE_ESCAPE_LENGTH = len("\\u0000")
+
+# Characters kept from the previous chunks when searching the start of the response,
+# as it can be split across chunks, allowing for some whitespace around the colon
+RESPONSE_START_OVERLAP = 64
+
+
+class ResponseTextStream:
+    """
+    Extracts the text response from the JSON of a structured output while it is generated.
+    The text response is the first field of the structured output, so only the start
+    of the JSON is searched for it, and its string is then decoded chunk by chunk,
+    in time linear in the length of the response.
+    Text which is not JSON yields no response, the parser of the chain reports it
+    once the stream ends.
+    """
+
+    def __init__(self) -> None:
+        self._json = ""
+        self._started = False
+        self._done = False
+        self._escape = ""
+        self._high_surrogate = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of the generated JSON.
+
+        Args:
+            chunk (str): The next chunk of the JSON.
+
+        Returns:
+            str: The text added to the response by the chunk, empty if none.
+        """
+
+        if self._done:
+            return ""
+
+        if not self._started:
+            searched = max(len(self._json) - RESPONSE_START_OVERLAP, 0)
+            self._json += chunk
+            match = RESPONSE_START.search(self._json, searched)
+            if match is None:
+                return ""
+
+            self._started = True
+            chunk = self._json[match.end() :]
+            self._json = ""
+
+        return self._decode(chunk)
+
+    def _decode(self, chunk: str) -> str:
+        """Decode the next chunk of the response string, up to its closing quote."""
+
+        text = []
+        position = 0
+        while position < len(chunk) and not self._done:
+            if self._escape:
+                position = self._decode_escape(chunk, position, text)
+            elif chunk[position] == "\\":
+                self._escape = "\\"
+                position += 1
+            else:
+                self._flush_high_surrogate(text)
+                if match := RESPONSE_TEXT.match(chunk, position):
+                    text.append(match.group())
+                    position = match.end()
+                else:
+                    self._done = True
+
+        return "".join(text)
+
+    def _decode_escape(self, chunk: str, position: int, text: list[str]) -> int:
+        """
+        Continue the escape sequence started in this or a previous chunk.
+        A sequence is only decoded once complete, and a high surrogate together
+        with the low surrogate following it.
+        """
+
+        self._escape += chunk[position]
+        position += 1
+        if len(self._escape) < (UNICODE_ESCAPE_LENGTH if self._escape[1] == "u" else 2):
+            return position
+
+        escape, self._escape = self._escape, ""
+        try:
+            decoded = json.loads(f'"{self._high_surrogate}{escape}"')
+        except json.JSONDecodeError:
+            # Not JSON after all, the parser of the chain reports it once the stream ends
+            self._done = True
+            return position
+
+        if not self._high_surrogate and "\ud800" <= decoded <= "\udbff":
+            self._high_surrogate = escape
+        else:
+            self._high_surrogate = ""
+            text.append(decoded)
+
+        return position
+
+    def _flush_high_surrogate(self, text: list[str]) -> None:
+        """Add a high surrogate which is not followed by a low surrogate as is."""
+
+        if self._high_surrogate:
+            text.append(json.loads(f'"{self._high_surrogate}"'))
+            self._high_surrogate = ""
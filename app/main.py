@@ -1,16 +1,44 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from socketio import ASGIApp
 
-from app.api.exception_handlers import conflict_error_handler, not_found_error_handler
+from app.api.exception_handlers import (
+    bad_request_error_handler,
+    conflict_error_handler,
+    not_found_error_handler,
+)
 from app.api.main import api_router
-from app.errors.api import ConflictError, NotFoundError
+from app.api.middleware import HttpMetricsMiddleware
+from app.api.routes.metrics import metrics_router
+from app.errors.api import BadRequestError, ConflictError, NotFoundError
+from app.services.llm_service import chat_models
 from app.sockets import sio
+from app.workers.message_archive_worker import message_archive_worker
+from app.workers.state_flush_worker import state_flush_worker
+from app.workers.summarization_worker import summarization_worker
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+    summarization_worker.start()
+    message_archive_worker.start()
+    state_flush_worker.start()
+
+    yield
+
+    await state_flush_worker.stop()
+    await message_archive_worker.stop()
+    await summarization_worker.stop()
+    await chat_models.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,10 +46,15 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Before-Cursor", "X-After-Cursor"],
 )
 
+app.add_middleware(HttpMetricsMiddleware)
+
 app.include_router(api_router)
+app.include_router(metrics_router)
 app.add_exception_handler(NotFoundError, not_found_error_handler)
 app.add_exception_handler(ConflictError, conflict_error_handler)
+app.add_exception_handler(BadRequestError, bad_request_error_handler)
 
 socket_app = ASGIApp(sio, app)
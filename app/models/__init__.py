@@ -4,6 +4,7 @@ from .action_condition_operator import ActionConditionOperator
 from .action_param import ActionParam
 from .agent import Agent
 from .agent_message import AgentMessage
+from .agent_summary import AgentSummary
 from .agents_actions_match import AgentsActionsMatch
 from .global_state import GlobalState
 from .player import Player
@@ -14,6 +15,7 @@ __all__ = (
     "ActionCondition",
     "ActionConditionOperator",
     "AgentMessage",
+    "AgentSummary",
     "AgentsActionsMatch",
     "ActionParam",
     "GlobalState",
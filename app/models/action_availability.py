@@ -0,0 +1,144 @@
+from collections import defaultdict
+from collections.abc import Iterable
+
+from app.models.global_state import StateKey
+
+
+class ActionAvailabilityIndex:
+    """
+    Materialized availability of actions, indexed by the state keys their condition trees read
+    and by the roots of their trees. A state change only invalidates the actions reading
+    the changed keys, and a tree change only the actions of the tree, so the availability
+    of the other actions is read without evaluating their trees.
+
+    The index is kept in process rather than in a table, as it is derived from the global
+    state, which is itself served from memory and written behind (see GlobalStateService).
+    A persisted availability would have to be written on every state change and could still
+    lag the in-memory state. The index starts empty on restart, and the availability of every
+    action is evaluated again from the cached condition trees the first time it is requested.
+    The app runs as a single instance. Other workers would each keep their own index,
+    invalidated only by the writes they handle, and could serve an outdated availability.
+    """
+
+    generation: int
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self._availability: dict[int, bool] = {}
+        self._stale_action_ids: set[int] = set()
+        self._action_ids_by_state_key: dict[StateKey, set[int]] = defaultdict(set)
+        self._state_keys_by_action_id: dict[int, set[StateKey]] = {}
+        self._action_ids_by_root_id: dict[int, set[int]] = defaultdict(set)
+        self._root_id_by_action_id: dict[int, int] = {}
+
+    def get(self, action_id: int) -> bool | None:
+        """Get the availability of the action, or None if it is unknown."""
+
+        return self._availability.get(action_id)
+
+    def store(
+        self,
+        action_id: int,
+        available: bool,
+        state_keys: set[StateKey],
+        generation: int,
+        root_id: int | None = None,
+    ) -> None:
+        """
+        Store the availability of the action together with the state keys it depends on
+        and the root of its condition tree, None if it has no tree.
+        The availability is discarded if the index was invalidated since the given generation,
+        as it might have been evaluated from outdated states.
+        """
+
+        if generation != self.generation:
+            return
+
+        self._remove(action_id)
+        self._availability[action_id] = available
+        self._state_keys_by_action_id[action_id] = state_keys
+        for state_key in state_keys:
+            self._action_ids_by_state_key[state_key].add(action_id)
+
+        if root_id is not None:
+            self._root_id_by_action_id[action_id] = root_id
+            self._action_ids_by_root_id[root_id].add(action_id)
+
+    def invalidate_state_keys(self, owner_id: int | None, keys: Iterable[str]) -> set[int]:
+        """
+        Invalidate the actions depending on the given keys of the global or agent state.
+
+        Args:
+            owner_id (int | None): The ID of the agent owning the state, or None for global state.
+            keys (Iterable[str]): The changed top-level keys of the state.
+
+        Returns:
+            set[int]: The IDs of the invalidated actions.
+        """
+
+        action_ids = {
+            action_id
+            for key in keys
+            for action_id in self._action_ids_by_state_key.get((owner_id, key), ())
+        }
+        self.invalidate_actions(action_ids)
+        return action_ids
+
+    def invalidate_root(self, root_id: int, action_ids: Iterable[int] = ()) -> set[int]:
+        """
+        Invalidate the actions whose availability was evaluated from the tree of the root.
+
+        Args:
+            root_id (int): The root operator ID of the changed tree.
+            action_ids (Iterable[int]): Other actions the tree now belongs to.
+
+        Returns:
+            set[int]: The IDs of the invalidated actions.
+        """
+
+        invalidated_action_ids = {*self._action_ids_by_root_id.get(root_id, ()), *action_ids}
+        self.invalidate_actions(invalidated_action_ids)
+        return invalidated_action_ids
+
+    def invalidate_actions(self, action_ids: Iterable[int]) -> None:
+        """Invalidate the availability of the given actions, marking them as stale."""
+
+        self.generation += 1
+        for action_id in action_ids:
+            self._remove(action_id)
+            self._stale_action_ids.add(action_id)
+
+    def pop_stale_action_ids(self) -> set[int]:
+        """Get and forget the IDs of the actions invalidated since the last call."""
+
+        stale_action_ids, self._stale_action_ids = self._stale_action_ids, set()
+        return stale_action_ids
+
+    def clear(self) -> None:
+        """Forget the availability of all actions."""
+
+        self.generation += 1
+        self._availability.clear()
+        self._stale_action_ids.clear()
+        self._action_ids_by_state_key.clear()
+        self._state_keys_by_action_id.clear()
+        self._action_ids_by_root_id.clear()
+        self._root_id_by_action_id.clear()
+
+    def _remove(self, action_id: int) -> None:
+        self._availability.pop(action_id, None)
+        for state_key in self._state_keys_by_action_id.pop(action_id, ()):
+            action_ids = self._action_ids_by_state_key[state_key]
+            action_ids.discard(action_id)
+            if not action_ids:
+                del self._action_ids_by_state_key[state_key]
+
+        root_id = self._root_id_by_action_id.pop(action_id, None)
+        if root_id is not None:
+            action_ids = self._action_ids_by_root_id[root_id]
+            action_ids.discard(action_id)
+            if not action_ids:
+                del self._action_ids_by_root_id[root_id]
+
+
+action_availability = ActionAvailabilityIndex()
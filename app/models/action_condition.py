@@ -7,6 +7,10 @@ from sqlmodel import Column, Field, Relationship, SQLModel
 if TYPE_CHECKING:
     from app.models.action_condition_operator import ActionConditionOperator
 
+# Compiled condition trees nest a closure per level, which are compiled and evaluated
+# recursively, so deeper trees are rejected before they could exceed the recursion limit
+MAX_CONDITION_TREE_DEPTH = 100
+
 
 class ComparisonMethod(str, Enum):
     EQUAL = "=="
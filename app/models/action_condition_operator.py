@@ -1,9 +1,16 @@
-from typing import Optional
+from typing import Any, Optional
 
+from pydantic import model_validator
 from sqlalchemy import Enum as SAEnum
 from sqlmodel import Column, Field, Relationship, SQLModel
 
-from app.models.action_condition import ActionCondition, LogicalOperator
+from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
+    ActionCondition,
+    ActionConditionResponse,
+    ComparisonMethod,
+    LogicalOperator,
+)
 
 
 class ActionConditionOperatorBase(SQLModel):
@@ -62,3 +69,52 @@ class ActionConditionOperatorResponse(ActionConditionOperatorBase):
     id: int
     parent_id: int | None
     root_id: int | None
+
+
+class ConditionTreeConditionRequest(SQLModel):
+    id: int | None = None
+    state_agent_id: int | None = None
+    state_variable_name: str
+    comparison: ComparisonMethod
+    expected_value: str
+
+
+class ConditionTreeRequest(SQLModel):
+    """
+    An operator of a condition tree with its children, the root operator for the whole tree.
+    Nodes with an ID update the existing nodes of the tree, nodes without one are created.
+    """
+
+    id: int | None = None
+    logical_operator: LogicalOperator
+    conditions: list[ConditionTreeConditionRequest] = []
+    operators: list["ConditionTreeRequest"] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def validate_depth(cls, data: Any) -> Any:
+        """Reject trees too deep to be evaluated, before validating their nested operators."""
+
+        nodes = [(data, 1)]
+        while nodes:
+            node, depth = nodes.pop()
+            if not isinstance(node, dict):
+                continue
+
+            has_children = bool(node.get("conditions")) or bool(node.get("operators"))
+            if has_children and depth >= MAX_CONDITION_TREE_DEPTH:
+                raise ValueError(
+                    "Condition tree is deeper than the maximum of "
+                    f"{MAX_CONDITION_TREE_DEPTH} levels"
+                )
+
+            if isinstance(node.get("operators"), list):
+                nodes.extend((child, depth + 1) for child in node["operators"])
+
+        return data
+
+
+class ConditionTreeResponse(SQLModel):
+    root_id: int
+    operators: list[ActionConditionOperatorResponse]
+    conditions: list[ActionConditionResponse]
@@ -1,10 +1,35 @@
 import json
+from collections import defaultdict
+from collections.abc import Callable
+from operator import eq, ge, gt, le, lt, ne
+from typing import Any, NoReturn
 
-from app.errors.conditions import ConditionEvaluationError, StateVariableNotFoundError
-from app.models.action_condition import ActionCondition, ComparisonMethod, LogicalOperator
+from app.errors.conditions import (
+    ConditionEvaluationError,
+    InvalidConditionTreeError,
+    StateVariableNotFoundError,
+)
+from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
+    ActionCondition,
+    ComparisonMethod,
+    LogicalOperator,
+)
 from app.models.action_condition_operator import ActionConditionOperator
 from app.models.agent import Agent
-from app.models.global_state import GlobalState, State, StateValue
+from app.models.global_state import GlobalState, State, StateKey, StateValue
+
+AgentStates = dict[int, State]
+ConditionEvaluator = Callable[[State, AgentStates], bool]
+
+COMPARISON_FUNCTIONS: dict[ComparisonMethod, Callable[[Any, Any], bool]] = {
+    ComparisonMethod.EQUAL: eq,
+    ComparisonMethod.NOT_EQUAL: ne,
+    ComparisonMethod.GREATER: gt,
+    ComparisonMethod.LESS: lt,
+    ComparisonMethod.AT_LEAST: ge,
+    ComparisonMethod.AT_MOST: le,
+}
 
 
 class ActionConditionTreeNode:
@@ -44,16 +69,104 @@ class ActionConditionTreeNode:
         conditions: list[ActionCondition],
         operators: list[ActionConditionOperator],
     ) -> "ActionConditionTreeNode":
+        """
+        Build the tree under the given root node from the conditions and operators of the tree.
+        The children are indexed by their parent IDs once, so the tree is built in linear time.
+
+        Args:
+            parent (ActionConditionTreeNode): The root node of the tree.
+            conditions (list[ActionCondition]): The conditions of the tree.
+            operators (list[ActionConditionOperator]): The operators of the tree.
+
+        Returns:
+            ActionConditionTreeNode: The root node with its children.
+
+        Raises:
+            InvalidConditionTreeError:
+                If some conditions or operators are orphaned or form a cycle,
+                so they cannot be reached from the root,
+                or if the tree is deeper than MAX_CONDITION_TREE_DEPTH.
+        """
+
+        conditions_by_parent: dict[int, list[ActionCondition]] = defaultdict(list)
         for condition in conditions:
-            if condition.parent_id == parent.node_id:
-                parent.add_child(cls.from_condition(condition))
+            conditions_by_parent[condition.parent_id].append(condition)
 
+        operators_by_parent: dict[int | None, list[ActionConditionOperator]] = defaultdict(list)
         for operator in operators:
-            if operator.parent_id == parent.node_id:
-                parent.add_child(cls.build(cls.from_operator(operator), conditions, operators))
+            if operator.id != parent.node_id:
+                operators_by_parent[operator.parent_id].append(operator)
+
+        nodes = [(parent, 1)]
+        while nodes:
+            node, depth = nodes.pop()
+            children_conditions = conditions_by_parent.pop(node.node_id, [])
+            children_operators = operators_by_parent.pop(node.node_id, [])
+            if (children_conditions or children_operators) and depth >= MAX_CONDITION_TREE_DEPTH:
+                raise InvalidConditionTreeError(
+                    f"Condition tree with root id {parent.node_id} is deeper "
+                    f"than the maximum of {MAX_CONDITION_TREE_DEPTH} levels"
+                )
+
+            for condition in children_conditions:
+                node.add_child(cls.from_condition(condition))
+
+            for operator in children_operators:
+                child = cls.from_operator(operator)
+                node.add_child(child)
+                nodes.append((child, depth + 1))
+
+        if conditions_by_parent or operators_by_parent:
+            cls._raise_unreachable_nodes(
+                parent,
+                [condition for group in conditions_by_parent.values() for condition in group],
+                [operator for group in operators_by_parent.values() for operator in group],
+            )
 
         return parent
 
+    @staticmethod
+    def _raise_unreachable_nodes(
+        root: "ActionConditionTreeNode",
+        conditions: list[ActionCondition],
+        operators: list[ActionConditionOperator],
+    ) -> NoReturn:
+        """
+        Raise an error describing the conditions and operators which are not reachable
+        from the root, separating the operators which form a cycle from the orphaned ones.
+        """
+
+        parent_ids = {operator.id: operator.parent_id for operator in operators}
+        in_cycle: dict[int, bool] = {}
+
+        for operator_id in parent_ids:
+            path: list[int] = []
+            current = operator_id
+            while current in parent_ids and current not in in_cycle and current not in path:
+                path.append(current)
+                current = parent_ids[current]
+
+            cycle = path[path.index(current) :] if current in path else []
+            for path_operator_id in path:
+                in_cycle[path_operator_id] = path_operator_id in cycle
+
+        cyclic_operator_ids = sorted(id_ for id_, cyclic in in_cycle.items() if cyclic)
+        orphaned_operator_ids = sorted(id_ for id_, cyclic in in_cycle.items() if not cyclic)
+        orphaned_condition_ids = sorted(condition.id for condition in conditions)
+
+        problems = []
+        if orphaned_condition_ids:
+            problems.append(f"orphaned conditions {orphaned_condition_ids}")
+        if orphaned_operator_ids:
+            problems.append(f"orphaned operators {orphaned_operator_ids}")
+        if cyclic_operator_ids:
+            problems.append(f"operators in a cycle {cyclic_operator_ids}")
+
+        raise InvalidConditionTreeError(
+            f"Condition tree with root id {root.node_id} has unreachable nodes: "
+            + ", ".join(problems)
+        )
+
     @classmethod
     def from_condition(cls, condition: ActionCondition) -> "ActionConditionTreeNode":
         return cls(
@@ -76,46 +189,20 @@ class ActionConditionTreeNode:
     def is_operator(self) -> bool:
         return self.logical_operator is not None
 
-    def _evaluate_operator(self, global_state: State, agent_states: dict[int, State]) -> bool:
-        """Evaluate the logical operator node."""
-
-        results = (child.evaluate(global_state, agent_states) for child in self.children)
-        if self.logical_operator == LogicalOperator.AND:
-            return all(results)
-        else:
-            return any(results)
-
-    def _evaluate_condition(self, global_state: State, agent_states: dict[int, State]) -> bool:
-        """Evaluate the condition leaf node."""
+    def compile(self) -> ConditionEvaluator:
+        """
+        Compile the node and its children into a single evaluator function.
+        Expected values, state variable paths and comparison functions are resolved once,
+        so that evaluating the compiled function only reads the states.
 
-        state_var = self._get_state_variable(global_state, agent_states)
+        Returns:
+            ConditionEvaluator: The function evaluating the node for the given states.
+        """
 
-        try:
-            expected_value = json.loads(self.expected_value)
-        except json.JSONDecodeError:
-            expected_value = self.expected_value
+        if self.is_operator():
+            return self._compile_operator()
 
-        try:
-            match self.comparison:
-                case ComparisonMethod.EQUAL:
-                    return state_var == expected_value
-                case ComparisonMethod.NOT_EQUAL:
-                    return state_var != expected_value
-                case ComparisonMethod.GREATER:
-                    return state_var > expected_value
-                case ComparisonMethod.LESS:
-                    return state_var < expected_value
-                case ComparisonMethod.AT_LEAST:
-                    return state_var >= expected_value
-                case ComparisonMethod.AT_MOST:
-                    return state_var <= expected_value
-                case _:
-                    raise ConditionEvaluationError(f"Unknown comparison method: {self.comparison}")
-        except TypeError:
-            raise ConditionEvaluationError(
-                f"Comparison '{self.comparison.name}' is not valid for values: "
-                f"state_var={state_var}, expected_value={expected_value}"
-            )
+        return self._compile_condition()
 
     def evaluate(self, global_state: State, agent_states: dict[int, State]) -> bool:
         """
@@ -129,54 +216,144 @@ class ActionConditionTreeNode:
             bool: The result of the evaluation.
         """
 
-        if self.is_operator():
-            return self._evaluate_operator(global_state, agent_states)
+        return self.compile()(global_state, agent_states)
+
+    def state_keys(self) -> set[StateKey]:
+        """
+        Get the state keys read by the node and its children.
+        Each key is the ID of the agent owning the state, or None for the global state,
+        and the top-level key of the state variable.
+        """
+
+        state_keys = set()
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            if not node.is_operator():
+                state_keys.add((node.state_agent_id, node.state_variable_name.split("/")[0]))
+            nodes.extend(node.children)
 
-        return self._evaluate_condition(global_state, agent_states)
+        return state_keys
 
-    def _get_state_variable(
-        self, global_state: State, agent_states: dict[int, State]
-    ) -> StateValue:
-        """Retrieve the state variable value based on the state_variable_name and state_agent_id."""
+    def _compile_operator(self) -> ConditionEvaluator:
+        """Compile the logical operator node."""
 
-        if self.state_agent_id is None:
-            state = global_state
-        else:
-            state = agent_states.get(self.state_agent_id)
-            if state is None:
-                raise ConditionEvaluationError(f"Agent with id {self.state_agent_id} not found")
+        children = tuple(child.compile() for child in self.children)
+
+        if self.logical_operator == LogicalOperator.AND:
 
-        keys = self.state_variable_name.split("/")
-        current = state
+            def evaluate_and(global_state: State, agent_states: AgentStates) -> bool:
+                return all(child(global_state, agent_states) for child in children)
+
+            return evaluate_and
+
+        def evaluate_or(global_state: State, agent_states: AgentStates) -> bool:
+            return any(child(global_state, agent_states) for child in children)
+
+        return evaluate_or
+
+    def _compile_condition(self) -> ConditionEvaluator:
+        """Compile the condition leaf node."""
+
+        get_state_variable = self._compile_state_variable_getter()
+        comparison = self.comparison
+        compare = COMPARISON_FUNCTIONS.get(comparison)
 
         try:
-            for key in keys:
-                if isinstance(current, dict):
-                    current = current[key]
-                elif isinstance(current, list):
-                    current = current[int(key)]
-                else:
-                    raise StateVariableNotFoundError(
-                        f"State variable name '{self.state_variable_name}' not found"
-                    )
-            return current
-        except (KeyError, IndexError, ValueError, TypeError) as e:
-            raise StateVariableNotFoundError(
-                f"State variable name '{self.state_variable_name}' not found"
-            ) from e
+            expected_value = json.loads(self.expected_value)
+        except json.JSONDecodeError:
+            expected_value = self.expected_value
+
+        def evaluate_condition(global_state: State, agent_states: AgentStates) -> bool:
+            state_var = get_state_variable(global_state, agent_states)
+
+            if compare is None:
+                raise ConditionEvaluationError(f"Unknown comparison method: {comparison}")
+
+            try:
+                return compare(state_var, expected_value)
+            except TypeError:
+                raise ConditionEvaluationError(
+                    f"Comparison '{comparison.name}' is not valid for values: "
+                    f"state_var={state_var}, expected_value={expected_value}"
+                )
+
+        return evaluate_condition
+
+    def _compile_state_variable_getter(self) -> Callable[[State, AgentStates], StateValue]:
+        """
+        Compile the retrieval of the state variable value
+        based on the state_variable_name and state_agent_id.
+        """
+
+        state_agent_id = self.state_agent_id
+        state_variable_name = self.state_variable_name
+        path = tuple((key, _to_index(key)) for key in state_variable_name.split("/"))
+
+        def get_state_variable(global_state: State, agent_states: AgentStates) -> StateValue:
+            if state_agent_id is None:
+                state = global_state
+            else:
+                state = agent_states.get(state_agent_id)
+                if state is None:
+                    raise ConditionEvaluationError(f"Agent with id {state_agent_id} not found")
+
+            current = state
+
+            try:
+                for key, index in path:
+                    if isinstance(current, dict):
+                        current = current[key]
+                    elif isinstance(current, list) and index is not None:
+                        current = current[index]
+                    else:
+                        raise StateVariableNotFoundError(
+                            f"State variable name '{state_variable_name}' not found"
+                        )
+                return current
+            except (KeyError, IndexError, TypeError) as e:
+                raise StateVariableNotFoundError(
+                    f"State variable name '{state_variable_name}' not found"
+                ) from e
+
+        return get_state_variable
+
+
+def _to_index(key: str) -> int | None:
+    """Convert the state variable path key to a list index, or None if it is not one."""
+
+    try:
+        return int(key)
+    except ValueError:
+        return None
+
+
+class CompiledActionConditionTree:
+    root_id: int
+    evaluator: ConditionEvaluator
+    state_keys: set[StateKey]
+    state_agent_ids: list[int]
+
+    def __init__(self, root: ActionConditionTreeNode) -> None:
+        self.root_id = root.node_id
+        self.evaluator = root.compile()
+        self.state_keys = root.state_keys()
+        self.state_agent_ids = sorted(
+            {agent_id for agent_id, _ in self.state_keys if agent_id is not None}
+        )
 
 
 class ActionConditionTree:
-    root: ActionConditionTreeNode
+    compiled: CompiledActionConditionTree
     global_state: State
     agent_states: dict[int, State]
 
     def __init__(
-        self, root: ActionConditionTreeNode, global_state: GlobalState, agents: list[Agent]
+        self, compiled: CompiledActionConditionTree, global_state: GlobalState, agents: list[Agent]
     ) -> None:
-        self.root = root
+        self.compiled = compiled
         self.global_state = global_state.state
         self.agent_states = {agent.id: agent.combined_state for agent in agents}
 
     def evaluate(self) -> bool:
-        return self.root.evaluate(self.global_state, self.agent_states)
+        return self.compiled.evaluator(self.global_state, self.agent_states)
@@ -1,6 +1,8 @@
+import enum
 from functools import cached_property
 
 from pydantic import create_model
+from sqlalchemy import Enum
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Column, Field, Relationship, SQLModel
 
@@ -9,6 +11,7 @@ from app.models.action import Action, ActionResponse
 from app.models.agent_message import AgentMessage
 from app.models.agents_actions_match import AgentsActionsMatch
 from app.models.global_state import State
+from app.models.structured_output import fingerprint_actions, structured_output_cache
 
 CONVERSATION_HISTORY_PRIMARY_JOIN = """
 or_(
@@ -18,16 +21,36 @@ or_(
 """
 
 
+class HistoryStrategy(str, enum.Enum):
+    """
+    How much of the conversation history is put into the prompt, bounded by the history limit:
+    the last messages, the newest messages fitting a token budget (estimated as 4 characters
+    per token), or the messages sent within a time window in seconds.
+    """
+
+    LAST_MESSAGES = "last_messages"
+    TOKEN_BUDGET = "token_budget"
+    TIME_WINDOW = "time_window"
+
+
 class AgentBase(SQLModel):
     name: str
     description: str | None = None
     instructions: str | None = None
+    history_strategy: HistoryStrategy = HistoryStrategy.LAST_MESSAGES
+    history_limit: int = Field(default=50, gt=0)
+    message_retention_days: int | None = Field(default=None, gt=0)
 
 
 class Agent(AgentBase, table=True):
     id: int = Field(default=None, primary_key=True)
+    history_strategy: HistoryStrategy = Field(
+        default=HistoryStrategy.LAST_MESSAGES,
+        sa_column=Column(Enum(HistoryStrategy, native_enum=False), nullable=False),
+    )
     external_state: State = Field(default={}, sa_column=Column(JSONB, nullable=False))
     internal_state: State = Field(default={}, sa_column=Column(JSONB, nullable=False))
+    state_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     conversation_history: list[AgentMessage] = Relationship(
         back_populates="agent",
@@ -58,6 +81,7 @@ class Agent(AgentBase, table=True):
     def to_structured_output(self, available_actions: list[Action]) -> type[ChainOutput]:
         """
         Create a Pydantic model representing the structured output of the agent's response.
+        The models are cached by the fingerprint of the available actions and their params.
 
         Args:
             available_actions (list[Action]):
@@ -67,6 +91,11 @@ class Agent(AgentBase, table=True):
             type[ChainOutput]: The Pydantic model representing the structured output.
         """
 
+        fingerprint = fingerprint_actions(available_actions)
+        structured_output = structured_output_cache.get(fingerprint)
+        if structured_output is not None:
+            return structured_output
+
         actions_model = create_model(
             "Actions",
             **{
@@ -78,11 +107,14 @@ class Agent(AgentBase, table=True):
             },
         )
 
-        return create_model(
+        structured_output = create_model(
             "Response",
             response=(str, Field(..., description="The text response.")),
             actions=(actions_model, Field(..., description="The actions to take.")),
         )
+        structured_output_cache.set(fingerprint, structured_output)
+
+        return structured_output
 
     def to_details(self) -> AgentDetails:
         """Converts the agent to agent details dict."""
@@ -103,6 +135,9 @@ class AgentUpdateRequest(SQLModel):
     name: str | None = None
     description: str | None = None
     instructions: str | None = None
+    history_strategy: HistoryStrategy | None = None
+    history_limit: int | None = Field(default=None, gt=0)
+    message_retention_days: int | None = Field(default=None, gt=0)
 
 
 class AgentResponse(AgentBase):
@@ -1,7 +1,10 @@
+import base64
+import binascii
 from datetime import UTC, datetime
 from typing import TYPE_CHECKING, Any, Optional
 
 from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import TIMESTAMP, Column, Field, Relationship, SQLModel
 from typing_extensions import TypedDict
@@ -10,6 +13,32 @@ if TYPE_CHECKING:
     from app.models import Agent, Player
 
 
+# The timestamp and ID of a message, ordering the conversation history
+MessagePosition = tuple[datetime, int]
+
+
+def encode_message_cursor(position: MessagePosition) -> str:
+    """Encode the position of a message as an opaque pagination cursor."""
+
+    timestamp, id_ = position
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()},{id_}".encode()).decode()
+
+
+def decode_message_cursor(cursor: str) -> MessagePosition:
+    """
+    Decode a pagination cursor into the position of a message.
+
+    Raises:
+        ValueError: If the cursor is not a valid message cursor.
+    """
+
+    try:
+        timestamp, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return datetime.fromisoformat(timestamp), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid message cursor {cursor}")
+
+
 class ActionResponseDict(TypedDict):
     name: str
     params: dict[str, Any]
@@ -21,14 +50,14 @@ class QueryResponseDict(TypedDict):
 
 
 class AgentMessage(SQLModel, table=True):
-    id: int = Field(default=None, primary_key=True)
+    id: int = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     agent_id: int = Field(foreign_key="agent.id")
     caller_agent_id: int | None = Field(default=None, foreign_key="agent.id")
     caller_player_id: int | None = Field(default=None, foreign_key="player.id")
     query: str
     response: QueryResponseDict = Field(sa_column=Column(JSONB))
     timestamp: datetime = Field(
-        sa_column=Column(TIMESTAMP(timezone=True)),
+        sa_column=Column(TIMESTAMP(timezone=True), primary_key=True),
         default_factory=lambda: datetime.now(UTC),
     )
 
@@ -37,6 +66,18 @@ class AgentMessage(SQLModel, table=True):
         sa_relationship_kwargs={"foreign_keys": "[AgentMessage.agent_id]"},
     )
 
+    __table_args__ = (
+        Index("ix_agentmessage_agent_id_timestamp", "agent_id", "timestamp", "id"),
+        Index("ix_agentmessage_caller_agent_id_timestamp", "caller_agent_id", "timestamp", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+    @property
+    def position(self) -> MessagePosition:
+        """The position of the message in the conversation history."""
+
+        return self.timestamp, self.id
+
     def to_llm_messages(self, caller: Optional["Agent | Player"]) -> tuple[HumanMessage, AIMessage]:
         """
         Converts the agent message to LangChain LLM messages.
@@ -0,0 +1,71 @@
+import re
+from datetime import UTC, date, datetime
+
+PARTITIONED_TABLE = "agentmessage"
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+PARTITION_NAME_PATTERN = re.compile(rf"^{PARTITIONED_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+class AgentMessagePartition:
+    """
+    A monthly range partition of the agent message table, named after its month,
+    e.g. agentmessage_p2025_01 holds the messages sent in January 2025.
+    """
+
+    month: date
+
+    def __init__(self, month: date) -> None:
+        self.month = month.replace(day=1)
+
+    @classmethod
+    def from_name(cls, name: str) -> "AgentMessagePartition":
+        """
+        Get the partition from its table name.
+
+        Raises:
+            ValueError: If the name is not the name of a monthly partition.
+        """
+
+        match = PARTITION_NAME_PATTERN.match(name)
+        if match is None:
+            raise ValueError(f"Invalid agent message partition name {name}")
+
+        year, month = match.groups()
+        return cls(date(int(year), int(month), 1))
+
+    @classmethod
+    def of(cls, timestamp: datetime) -> "AgentMessagePartition":
+        """Get the partition holding the messages sent at the given time."""
+
+        return cls(timestamp.astimezone(UTC).date())
+
+    @property
+    def name(self) -> str:
+        return f"{PARTITIONED_TABLE}_p{self.month.year:04}_{self.month.month:02}"
+
+    @property
+    def start(self) -> datetime:
+        """The inclusive lower bound of the message timestamps."""
+
+        return datetime(self.month.year, self.month.month, 1, tzinfo=UTC)
+
+    @property
+    def end(self) -> datetime:
+        """The exclusive upper bound of the message timestamps."""
+
+        return self.next().start
+
+    def next(self) -> "AgentMessagePartition":
+        if self.month.month == 12:
+            return AgentMessagePartition(date(self.month.year + 1, 1, 1))
+
+        return AgentMessagePartition(date(self.month.year, self.month.month + 1, 1))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AgentMessagePartition) and self.month == other.month
+
+    def __hash__(self) -> int:
+        return hash(self.month)
+
+    def __repr__(self) -> str:
+        return f"AgentMessagePartition({self.name})"
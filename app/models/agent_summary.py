@@ -0,0 +1,29 @@
+from datetime import UTC, datetime
+
+from sqlmodel import TIMESTAMP, Column, Field, SQLModel
+
+from app.models.agent_message import MessagePosition
+
+
+class AgentSummary(SQLModel, table=True):
+    """
+    Rolling summary of the older part of an agent's conversation history.
+    The messages up to and including the last summarized message are folded into the summary
+    and left out of the prompt.
+    """
+
+    id: int = Field(default=None, primary_key=True)
+    agent_id: int = Field(foreign_key="agent.id", unique=True, ondelete="CASCADE")
+    summary: str
+    last_message_id: int
+    last_message_timestamp: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True)))
+    updated_at: datetime = Field(
+        sa_column=Column(TIMESTAMP(timezone=True)),
+        default_factory=lambda: datetime.now(UTC),
+    )
+
+    @property
+    def last_message_position(self) -> MessagePosition:
+        """The position of the last summarized message in the conversation history."""
+
+        return self.last_message_timestamp, self.last_message_id
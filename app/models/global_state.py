@@ -4,8 +4,21 @@ from sqlmodel import Column, Field, SQLModel
 
 StateValue = str | int | float | bool | dict | list | None
 State = dict[str, StateValue]
+# The ID of the agent owning the state, or None for the global state, and a top-level key
+StateKey = tuple[int | None, str]
 
 
 class GlobalState(SQLModel, table=True):
     id: int = Field(sa_column=Column(Integer, autoincrement=True, primary_key=True))
     state: State = Field(sa_column=Column(JSONB))
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
+
+def changed_state_keys(previous: State, current: State) -> set[str]:
+    """Get the top-level keys whose values differ between the two states."""
+
+    return {
+        key
+        for key in previous.keys() | current.keys()
+        if key not in previous or key not in current or previous[key] != current[key]
+    }
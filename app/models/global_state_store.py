@@ -0,0 +1,76 @@
+import asyncio
+from copy import deepcopy
+
+from app.models.global_state import State, changed_state_keys
+
+
+class GlobalStateStore:
+    """
+    The authoritative in-memory copy of the global state, persisted by write-behind flushes.
+    Reads are served from memory, writes bump the version and mark the state as dirty
+    until a flush writes it to the database.
+
+    Durability: the database holds the state as of the last committed flush,
+    so a crash loses the writes made since then, while a graceful shutdown flushes them.
+    The store assumes a single app instance owns the global state,
+    as writes made to the database by another process are not seen until the store is cleared.
+    """
+
+    state: State | None
+    version: int
+    persisted_version: int
+    lock: asyncio.Lock
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.clear()
+
+    @property
+    def loaded(self) -> bool:
+        return self.state is not None
+
+    @property
+    def dirty(self) -> bool:
+        return self.loaded and self.version != self.persisted_version
+
+    def load(self, state: State, version: int) -> None:
+        """Load the state as persisted in the database."""
+
+        self.state = state
+        self.version = version
+        self.persisted_version = version
+
+    def set(self, state: State) -> set[str]:
+        """
+        Replace the state and bump its version, keeping a copy so that callers
+        mutating their state afterwards do not change the stored one.
+
+        Returns:
+            set[str]: The changed top-level keys of the state.
+        """
+
+        changed_keys = changed_state_keys(self.state or {}, state)
+        self.state = deepcopy(state)
+        self.version += 1
+        return changed_keys
+
+    def update(self, state: State, version: int) -> None:
+        """Replace the state with one already written to the database, but not yet committed."""
+
+        self.state = state
+        self.version = version
+
+    def mark_persisted(self, version: int) -> None:
+        """Mark the given version as committed to the database."""
+
+        self.persisted_version = max(self.persisted_version, version)
+
+    def clear(self) -> None:
+        """Forget the state, so that it is loaded from the database again on the next read."""
+
+        self.state = None
+        self.version = 0
+        self.persisted_version = 0
+
+
+global_state_store = GlobalStateStore()
@@ -0,0 +1,174 @@
+from typing import Literal, Self
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from app.models.global_state import State, StateValue
+
+
+def parse_json_pointer(pointer: str) -> list[str]:
+    """
+    Split an RFC 6901 JSON pointer into its unescaped reference tokens.
+    The empty pointer references the whole document.
+
+    Raises:
+        ValueError: If the pointer is neither empty nor starts with a slash.
+    """
+
+    if pointer == "":
+        return []
+
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer {pointer}")
+
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def json_pointer(tokens: list[str]) -> str:
+    """Join reference tokens into an RFC 6901 JSON pointer, escaping them."""
+
+    return "".join(f"/{token.replace('~', '~0').replace('/', '~1')}" for token in tokens)
+
+
+def pointer_overlaps(pointer: str, prefix: str) -> bool:
+    """Whether the value at the pointer contains or is contained in the value at the prefix."""
+
+    shorter, longer = sorted((pointer, prefix), key=len)
+    return shorter == "" or longer == shorter or longer.startswith(f"{shorter}/")
+
+
+def diff_states(
+    previous: StateValue, current: StateValue, tokens: list[str] | None = None
+) -> list[dict]:
+    """
+    The RFC 6902 JSON Patch operations turning the previous state into the current one.
+    Objects are compared member by member, other values are replaced as a whole.
+
+    Returns:
+        list[dict]: The patch operations as JSON objects.
+    """
+
+    tokens = tokens or []
+    if isinstance(previous, dict) and isinstance(current, dict):
+        operations = [
+            {"op": "remove", "path": json_pointer([*tokens, key])}
+            for key in previous
+            if key not in current
+        ]
+
+        for key, value in current.items():
+            if key not in previous:
+                operations.append(
+                    {"op": "add", "path": json_pointer([*tokens, key]), "value": value}
+                )
+            elif previous[key] != value:
+                operations.extend(diff_states(previous[key], value, [*tokens, key]))
+
+        return operations
+
+    if previous == current:
+        return []
+
+    return [{"op": "replace", "path": json_pointer(tokens), "value": current}]
+
+
+class JsonPatchOperation(BaseModel):
+    """An RFC 6902 JSON Patch operation."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: StateValue = None
+    from_: str | None = Field(default=None, alias="from")
+
+    @field_validator("path", "from_")
+    @classmethod
+    def validate_pointer(cls, pointer: str | None) -> str | None:
+        if pointer is not None:
+            parse_json_pointer(pointer)
+
+        return pointer
+
+    @model_validator(mode="after")
+    def validate_operation(self) -> Self:
+        if self.op in ("add", "replace", "test") and "value" not in self.model_fields_set:
+            raise ValueError(f"The {self.op} operation requires a value")
+
+        if self.op in ("move", "copy") and self.from_ is None:
+            raise ValueError(f"The {self.op} operation requires a from pointer")
+
+        if (self.op == "remove" and self.path_tokens == []) or (
+            self.op == "move" and self.from_tokens == []
+        ):
+            raise ValueError(f"The {self.op} operation cannot remove the whole state")
+
+        if (
+            self.op in ("add", "replace")
+            and self.path_tokens == []
+            and not isinstance(self.value, dict)
+        ):
+            raise ValueError("The state must be an object")
+
+        if (
+            self.op == "move"
+            and len(self.path_tokens) > len(self.from_tokens)
+            and self.path_tokens[: len(self.from_tokens)] == self.from_tokens
+        ):
+            raise ValueError("The move operation cannot move a value into its own children")
+
+        return self
+
+    @property
+    def path_tokens(self) -> list[str]:
+        return parse_json_pointer(self.path)
+
+    @property
+    def from_tokens(self) -> list[str]:
+        return parse_json_pointer(self.from_ or "")
+
+
+class JsonPatchTest(BaseModel):
+    """A precondition of a merge patch, met when the value at the path equals the given value."""
+
+    path: str
+    value: StateValue
+
+    @field_validator("path")
+    @classmethod
+    def validate_pointer(cls, pointer: str) -> str:
+        parse_json_pointer(pointer)
+        return pointer
+
+    def to_operation(self) -> JsonPatchOperation:
+        return JsonPatchOperation(op="test", path=self.path, value=self.value)
+
+
+MergePatch = State
+
+
+class StatePatchResult:
+    """
+    The outcome of a state patch applied in the database.
+    The version and the state are the current ones if a step failed, with step 0 being
+    the version check.
+    """
+
+    failed_step: int | None
+    version: int | None
+    changed_keys: set[str]
+    state: State | None
+    previous_state: State | None
+
+    def __init__(
+        self,
+        failed_step: int | None,
+        version: int | None,
+        changed_keys: set[str],
+        state: State | None,
+        previous_state: State | None,
+    ):
+        self.failed_step = failed_step
+        self.version = version
+        self.changed_keys = changed_keys
+        self.state = state
+        self.previous_state = previous_state
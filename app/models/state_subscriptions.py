@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+from app.models.global_state import State
+from app.models.state_patch import diff_states, pointer_overlaps
+
+# The ID of the agent owning the state, or None for the global state, and whether it is internal
+StateTopic = tuple[int | None, bool]
+
+GLOBAL_STATE_TOPIC: StateTopic = (None, False)
+
+
+def subscription_room(topic: StateTopic, path: str) -> str:
+    """The Socket.IO room of the clients subscribed to the path of the state."""
+
+    agent_id, internal = topic
+    if agent_id is None:
+        return f"state:global:{path}"
+
+    return f"state:agent:{agent_id}:{'internal' if internal else 'external'}:{path}"
+
+
+class StateChange:
+    """A committed change of a state, as the JSON Patch turning the previous state into it."""
+
+    topic: StateTopic
+    version: int
+    operations: list[dict]
+
+    def __init__(self, topic: StateTopic, version: int, operations: list[dict]) -> None:
+        self.topic = topic
+        self.version = version
+        self.operations = operations
+
+    def operations_under(self, path: str) -> list[dict]:
+        """The operations changing the value at the path, its children or its parents."""
+
+        return [
+            operation for operation in self.operations if pointer_overlaps(operation["path"], path)
+        ]
+
+
+class StateSubscriptions:
+    """
+    The paths of the states clients are subscribed to, and the changes waiting to be sent to them.
+    Changes of states without subscribers are not recorded, so they cost no diff.
+    """
+
+    def __init__(self) -> None:
+        self._sids_by_path: dict[StateTopic, dict[str, set[str]]] = defaultdict(dict)
+        self._subscriptions_by_sid: dict[str, set[tuple[StateTopic, str]]] = defaultdict(set)
+        self._changes: list[StateChange] = []
+
+    def subscribe(self, sid: str, topic: StateTopic, path: str) -> None:
+        self._sids_by_path[topic].setdefault(path, set()).add(sid)
+        self._subscriptions_by_sid[sid].add((topic, path))
+
+    def unsubscribe(self, sid: str, topic: StateTopic, path: str) -> None:
+        paths = self._sids_by_path.get(topic, {})
+        sids = paths.get(path, set())
+        sids.discard(sid)
+        if not sids:
+            paths.pop(path, None)
+        if not paths:
+            self._sids_by_path.pop(topic, None)
+
+        subscriptions = self._subscriptions_by_sid.get(sid, set())
+        subscriptions.discard((topic, path))
+        if not subscriptions:
+            self._subscriptions_by_sid.pop(sid, None)
+
+    def unsubscribe_all(self, sid: str) -> None:
+        """Remove all subscriptions of the client, once it disconnected."""
+
+        for topic, path in list(self._subscriptions_by_sid.get(sid, ())):
+            self.unsubscribe(sid, topic, path)
+
+    def paths(self, topic: StateTopic) -> list[str]:
+        """The paths of the state with at least one subscriber."""
+
+        return list(self._sids_by_path.get(topic, ()))
+
+    def record_change(
+        self, topic: StateTopic, previous: State, current: State, version: int
+    ) -> None:
+        """Record the change of the state to be sent to its subscribers, if it has any."""
+
+        if topic not in self._sids_by_path:
+            return
+
+        operations = diff_states(previous, current)
+        if operations:
+            self._changes.append(StateChange(topic, version, operations))
+
+    def pop_changes(self) -> list[StateChange]:
+        """Get and forget the changes recorded since the last call."""
+
+        changes, self._changes = self._changes, []
+        return changes
+
+    def clear(self) -> None:
+        self._sids_by_path.clear()
+        self._subscriptions_by_sid.clear()
+        self._changes.clear()
+
+
+state_subscriptions = StateSubscriptions()
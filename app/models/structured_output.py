@@ -0,0 +1,65 @@
+import os
+from collections.abc import Iterable
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from app.core.cache import LRUCache
+from app.models.action import Action
+from app.models.action_param import ActionParamType, LiteralValue
+
+load_dotenv()
+
+STRUCTURED_OUTPUT_CACHE_SIZE = int(os.getenv("STRUCTURED_OUTPUT_CACHE_SIZE", "256"))
+
+ParamFingerprint = tuple[str, ActionParamType, tuple[LiteralValue, ...] | None, str]
+ActionFingerprint = tuple[int, str, str | None, tuple[ParamFingerprint, ...]]
+ActionsFingerprint = tuple[ActionFingerprint, ...]
+
+# Structured output models by fingerprint of the available actions
+structured_output_cache: LRUCache[ActionsFingerprint, type[BaseModel]] = LRUCache(
+    STRUCTURED_OUTPUT_CACHE_SIZE
+)
+
+
+def fingerprint_actions(actions: Iterable[Action]) -> ActionsFingerprint:
+    """
+    Create a hashable fingerprint of everything the structured output model is built from.
+
+    Args:
+        actions (Iterable[Action]): The available actions, in the order of the model fields.
+
+    Returns:
+        ActionsFingerprint: The fingerprint of the actions and their params.
+    """
+
+    return tuple(
+        (
+            action.id,
+            action.name,
+            action.description,
+            tuple(
+                (
+                    param.name,
+                    param.type,
+                    tuple(param.literal_values) if param.literal_values is not None else None,
+                    param.description,
+                )
+                for param in action.params
+            ),
+        )
+        for action in actions
+    )
+
+
+def invalidate_structured_outputs(action_id: int) -> None:
+    """
+    Drop the cached structured output models built from the given action.
+
+    Args:
+        action_id (int): The ID of the action.
+    """
+
+    structured_output_cache.pop_where(
+        lambda fingerprint, _: any(action[0] == action_id for action in fingerprint)
+    )
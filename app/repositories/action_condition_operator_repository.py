@@ -1,3 +1,4 @@
+from sqlalchemy import delete, update
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -24,3 +25,40 @@ class ActionConditionOperatorRepository(BaseRepository[ActionConditionOperator])
             select(ActionConditionOperator).where(ActionConditionOperator.root_id == root_id)
         )
         return list(result.all())
+
+    async def find_roots_by_action_ids(
+        self, action_ids: list[int]
+    ) -> list[ActionConditionOperator]:
+        if not action_ids:
+            return []
+
+        result = await self._session.exec(
+            select(ActionConditionOperator)
+            .where(ActionConditionOperator.action_id.in_(action_ids))
+            .where(ActionConditionOperator.id == ActionConditionOperator.root_id)
+            .order_by(ActionConditionOperator.id)
+        )
+        return list(result.all())
+
+    async def find_all_by_root_ids(self, root_ids: list[int]) -> list[ActionConditionOperator]:
+        if not root_ids:
+            return []
+
+        result = await self._session.exec(
+            select(ActionConditionOperator).where(ActionConditionOperator.root_id.in_(root_ids))
+        )
+        return list(result.all())
+
+    async def update_action_id_by_root_id(self, root_id: int, action_id: int) -> None:
+        await self._session.execute(
+            update(ActionConditionOperator)
+            .where(ActionConditionOperator.root_id == root_id)
+            .values(action_id=action_id)
+        )
+
+    async def delete_all_by_root_id(self, root_id: int) -> None:
+        """Delete the operators of the tree in a single statement, children included."""
+
+        await self._session.execute(
+            delete(ActionConditionOperator).where(ActionConditionOperator.root_id == root_id)
+        )
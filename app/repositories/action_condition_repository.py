@@ -1,3 +1,4 @@
+from sqlalchemy import delete
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -15,3 +16,17 @@ class ActionConditionRepository(BaseRepository[ActionCondition]):
             select(ActionCondition).where(ActionCondition.root_id == root_id)
         )
         return list(result.all())
+
+    async def find_all_by_root_ids(self, root_ids: list[int]) -> list[ActionCondition]:
+        if not root_ids:
+            return []
+
+        result = await self._session.exec(
+            select(ActionCondition).where(ActionCondition.root_id.in_(root_ids))
+        )
+        return list(result.all())
+
+    async def delete_all_by_root_id(self, root_id: int) -> None:
+        await self._session.execute(
+            delete(ActionCondition).where(ActionCondition.root_id == root_id)
+        )
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.agent_message_partition import (
+    DEFAULT_PARTITION,
+    PARTITION_NAME_PATTERN,
+    PARTITIONED_TABLE,
+    AgentMessagePartition,
+)
+
+STREAM_BATCH_SIZE = 1000
+
+
+class AgentMessagePartitionRepository:
+    _session: AsyncSession
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    async def find_all(self) -> list[AgentMessagePartition]:
+        result = await self._session.exec(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+            ).bindparams(table=PARTITIONED_TABLE)
+        )
+        partitions = [
+            AgentMessagePartition.from_name(name)
+            for (name,) in result.all()
+            if PARTITION_NAME_PATTERN.match(name)
+        ]
+        return sorted(partitions, key=lambda partition: partition.month)
+
+    async def create(self, partition: AgentMessagePartition) -> None:
+        """
+        Create the partition, moving its messages out of the default partition,
+        as a partition cannot be attached while the default partition holds messages in its range.
+        """
+
+        bounds = f"FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+        await self._session.execute(
+            text(
+                f"CREATE TABLE {partition.name} "
+                f"(LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+        )
+        await self._session.execute(
+            text(
+                f"WITH moved AS ("
+                f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+                f"RETURNING *"
+                f") INSERT INTO {partition.name} SELECT * FROM moved"
+            ).bindparams(start=partition.start, end=partition.end)
+        )
+        await self._session.execute(
+            text(
+                f"ALTER TABLE {PARTITIONED_TABLE} "
+                f"ATTACH PARTITION {partition.name} FOR VALUES {bounds}"
+            )
+        )
+
+    async def find_retention_days_by_partition(
+        self, before: datetime
+    ) -> dict[AgentMessagePartition, list[int | None]]:
+        """
+        The message retention days of the agents whose conversations have messages
+        in each partition, for the messages sent before the given time.
+        """
+
+        result = await self._session.exec(
+            text(
+                f"SELECT DISTINCT CAST(CAST(message.tableoid AS regclass) AS text), "
+                f"agent.message_retention_days "
+                f"FROM {PARTITIONED_TABLE} AS message "
+                f"JOIN agent ON agent.id IN (message.agent_id, message.caller_agent_id) "
+                f"WHERE message.timestamp < :before"
+            ).bindparams(before=before)
+        )
+
+        retention_days = defaultdict(list)
+        for name, days in result.all():
+            if PARTITION_NAME_PATTERN.match(name):
+                retention_days[AgentMessagePartition.from_name(name)].append(days)
+
+        return retention_days
+
+    async def delete_expired_rows(
+        self, now: datetime, default_retention_days: int | None, limit: int
+    ) -> list[str]:
+        """
+        Delete messages which outlived the retention of the agents of their conversation,
+        either their own or the default one, and return them as JSON objects.
+        At most the given number of messages are deleted.
+        """
+
+        result = await self._session.execute(
+            text(
+                f"DELETE FROM {PARTITIONED_TABLE} AS message "
+                f"WHERE (message.id, message.timestamp) IN ("
+                f"SELECT expired.id, expired.timestamp FROM {PARTITIONED_TABLE} AS expired "
+                f"JOIN agent ON agent.id = expired.agent_id "
+                f"LEFT JOIN agent AS caller ON caller.id = expired.caller_agent_id "
+                f"WHERE expired.timestamp < CAST(:now AS timestamptz) - make_interval("
+                f"days => COALESCE(agent.message_retention_days, CAST(:days AS integer))"
+                f") "
+                f"AND (expired.caller_agent_id IS NULL "
+                f"OR expired.timestamp < CAST(:now AS timestamptz) - make_interval("
+                f"days => COALESCE(caller.message_retention_days, CAST(:days AS integer))"
+                f")) "
+                f"LIMIT :limit"
+                f") "
+                f"RETURNING CAST(to_jsonb(message) AS text)"
+            ).bindparams(now=now, days=default_retention_days, limit=limit)
+        )
+        return list(result.scalars())
+
+    async def stream_rows(self, partition: AgentMessagePartition) -> AsyncIterator[str]:
+        """The messages of the partition as JSON objects, fetched from a server-side cursor."""
+
+        result = await self._session.stream_scalars(
+            text(
+                f"SELECT CAST(to_jsonb(message) AS text) FROM {partition.name} AS message "
+                f"ORDER BY message.timestamp, message.id"
+            ),
+            execution_options={"yield_per": STREAM_BATCH_SIZE},
+        )
+        try:
+            async for row in result:
+                yield row
+        finally:
+            await result.close()
+
+    async def insert_rows(self, rows: list[str]) -> int:
+        """
+        Insert messages from their JSON objects, skipping the messages already present
+        and the messages of agents and players which no longer exist.
+        """
+
+        result = await self._session.execute(
+            text(
+                f"INSERT INTO {PARTITIONED_TABLE} "
+                f"SELECT message.* FROM jsonb_populate_recordset("
+                f"CAST(NULL AS {PARTITIONED_TABLE}), CAST(:rows AS jsonb)"
+                f") AS message "
+                f"WHERE EXISTS (SELECT 1 FROM agent WHERE agent.id = message.agent_id) "
+                f"AND (message.caller_agent_id IS NULL OR EXISTS ("
+                f"SELECT 1 FROM agent WHERE agent.id = message.caller_agent_id"
+                f")) "
+                f"AND (message.caller_player_id IS NULL OR EXISTS ("
+                f"SELECT 1 FROM player WHERE player.id = message.caller_player_id"
+                f")) "
+                f"ON CONFLICT DO NOTHING"
+            ).bindparams(rows=f"[{','.join(rows)}]")
+        )
+        return result.rowcount
+
+    async def drop(self, partition: AgentMessagePartition) -> None:
+        await self._session.execute(
+            text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {partition.name}")
+        )
+        await self._session.execute(text(f"DROP TABLE {partition.name}"))
@@ -1,10 +1,180 @@
+from collections.abc import AsyncIterator, Callable
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import ColumnElement, Text, cast, delete, func, or_, tuple_, union_all
+from sqlalchemy.orm import aliased
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
 from app.models import AgentMessage
+from app.models.agent import HistoryStrategy
+from app.models.agent_message import MessagePosition
 
 from .base_repository import BaseRepository
 
+STREAM_BATCH_SIZE = 1000
+
+
+def estimated_tokens(message: type[AgentMessage]) -> ColumnElement[float]:
+    """Rough token count of a message, assuming 4 characters per token."""
+
+    return (func.length(message.query) + func.length(cast(message.response, Text))) / 4
+
+
+def newest_first(message: type[AgentMessage]) -> tuple[ColumnElement, ColumnElement]:
+    return message.timestamp.desc(), message.id.desc()
+
+
+def oldest_first(message: type[AgentMessage]) -> tuple[ColumnElement, ColumnElement]:
+    return message.timestamp.asc(), message.id.asc()
+
 
 class AgentMessageRepository(BaseRepository[AgentMessage]):
     def __init__(self, session: AsyncSession):
         super().__init__(session, AgentMessage)
+
+    async def find_all_by_agent_id(
+        self, agent_id: int, after: MessagePosition | None = None
+    ) -> list[AgentMessage]:
+        conversation = self._conversation_of(agent_id, after)
+        result = await self._session.exec(
+            select(conversation).order_by(conversation.timestamp, conversation.id)
+        )
+        return list(result.all())
+
+    async def find_page_by_agent_id(
+        self,
+        agent_id: int,
+        limit: int,
+        before: MessagePosition | None = None,
+        after: MessagePosition | None = None,
+    ) -> list[AgentMessage]:
+        """
+        A page of the messages sent to or by the agent, in chronological order.
+        With an after cursor the page holds the oldest messages after it,
+        otherwise the newest messages before the before cursor, if any.
+        """
+
+        order = oldest_first if after is not None else newest_first
+        conversation = self._conversation_of(
+            agent_id, after, before=before, limit=limit, order=order
+        )
+        result = await self._session.exec(
+            select(conversation).order_by(*order(conversation)).limit(limit)
+        )
+        messages = list(result.all())
+        return messages if after is not None else messages[::-1]
+
+    async def stream_all_by_agent_id(self, agent_id: int) -> AsyncIterator[AgentMessage]:
+        """
+        The messages sent to or by the agent, in chronological order,
+        fetched in batches from a server-side cursor.
+        """
+
+        conversation = self._conversation_of(agent_id)
+        result = await self._session.stream_scalars(
+            select(conversation).order_by(*oldest_first(conversation)),
+            execution_options={"yield_per": STREAM_BATCH_SIZE},
+        )
+        try:
+            async for message in result:
+                yield message
+        finally:
+            await result.close()
+
+    async def sum_estimated_tokens(
+        self, agent_id: int, after: MessagePosition | None = None
+    ) -> float:
+        conversation = self._conversation_of(agent_id, after)
+        result = await self._session.exec(
+            select(func.coalesce(func.sum(estimated_tokens(conversation)), 0))
+        )
+        return float(result.one())
+
+    async def find_conversation_history(
+        self,
+        agent_id: int,
+        strategy: HistoryStrategy,
+        limit: int,
+        max_messages: int,
+        after: MessagePosition | None = None,
+    ) -> list[AgentMessage]:
+        match strategy:
+            case HistoryStrategy.LAST_MESSAGES:
+                limit = min(limit, max_messages)
+                conversation = self._conversation_of(agent_id, after, limit=limit)
+                query = select(conversation).order_by(*newest_first(conversation)).limit(limit)
+            case HistoryStrategy.TIME_WINDOW:
+                since = datetime.now(UTC) - timedelta(seconds=limit)
+                conversation = self._conversation_of(
+                    agent_id, after, since=since, limit=max_messages
+                )
+                query = (
+                    select(conversation).order_by(*newest_first(conversation)).limit(max_messages)
+                )
+            case HistoryStrategy.TOKEN_BUDGET:
+                conversation = self._conversation_of(agent_id, after, limit=max_messages)
+                newest = (
+                    select(
+                        conversation,
+                        func.sum(estimated_tokens(conversation))
+                        .over(order_by=newest_first(conversation))
+                        .label("running_tokens"),
+                    )
+                    .order_by(*newest_first(conversation))
+                    .limit(max_messages)
+                    .subquery()
+                )
+                budgeted = aliased(AgentMessage, newest)
+                query = (
+                    select(budgeted)
+                    .where(newest.c.running_tokens <= limit)
+                    .order_by(*newest_first(budgeted))
+                )
+
+        result = await self._session.exec(query)
+        return list(reversed(result.all()))
+
+    async def delete_all_by_agent_id(self, agent_id: int) -> None:
+        await self._session.execute(
+            delete(AgentMessage).where(
+                or_(AgentMessage.agent_id == agent_id, AgentMessage.caller_agent_id == agent_id)
+            )
+        )
+
+    @staticmethod
+    def _conversation_of(
+        agent_id: int,
+        after: MessagePosition | None = None,
+        since: datetime | None = None,
+        limit: int | None = None,
+        before: MessagePosition | None = None,
+        order: Callable[[type[AgentMessage]], tuple[ColumnElement, ColumnElement]] = newest_first,
+    ) -> type[AgentMessage]:
+        """
+        The messages sent to or by the agent, as a UNION ALL of a range scan of the
+        agent ID index and of the caller agent ID index, instead of an OR condition
+        which cannot use either. With a limit, each scan stops after the first messages
+        in the given order, the newest by default.
+        """
+
+        branches: list[SelectOfScalar[AgentMessage]] = [
+            select(AgentMessage).where(AgentMessage.agent_id == agent_id),
+            select(AgentMessage).where(
+                AgentMessage.caller_agent_id == agent_id, AgentMessage.agent_id != agent_id
+            ),
+        ]
+
+        for i, branch in enumerate(branches):
+            if after is not None:
+                branch = branch.where(tuple_(AgentMessage.timestamp, AgentMessage.id) > after)
+            if before is not None:
+                branch = branch.where(tuple_(AgentMessage.timestamp, AgentMessage.id) < before)
+            if since is not None:
+                branch = branch.where(AgentMessage.timestamp >= since)
+            if limit is not None:
+                branch = branch.order_by(*order(AgentMessage)).limit(limit)
+            branches[i] = branch
+
+        return aliased(AgentMessage, union_all(*branches).subquery("conversation"))
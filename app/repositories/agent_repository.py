@@ -1,9 +1,13 @@
+from sqlalchemy import update
 from sqlalchemy.orm import selectinload
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models import Action, Agent
+from app.models.global_state import State
+from app.models.state_patch import StatePatchResult
 
 from .base_repository import BaseRepository
+from .state_patch import StatePatchStep, state_patch_statement
 
 
 class AgentRepository(BaseRepository[Agent]):
@@ -17,9 +21,39 @@ class AgentRepository(BaseRepository[Agent]):
         return await self._session.get(
             Agent,
             agent_id,
-            options=[
-                selectinload(Agent.conversation_history),
-                selectinload(Agent.actions).selectinload(Action.triggered_agent),
-            ],
+            options=[selectinload(Agent.actions).selectinload(Action.triggered_agent)],
             populate_existing=True,
         )
+
+    async def update_state(self, agent_id: int, internal: bool, state: State, version: int) -> bool:
+        """Replace the state of the agent unless its state version is no longer the given one."""
+
+        state_column = Agent.internal_state if internal else Agent.external_state
+        result = await self._session.execute(
+            update(Agent)
+            .where(Agent.id == agent_id, Agent.state_version == version)
+            .values({state_column: state, Agent.state_version: version + 1})
+        )
+        return result.rowcount == 1
+
+    async def patch_state(
+        self,
+        agent_id: int,
+        internal: bool,
+        steps: list[StatePatchStep],
+        expected_version: int | None = None,
+    ) -> StatePatchResult | None:
+        state_column = Agent.internal_state if internal else Agent.external_state
+        result = await self._session.execute(
+            state_patch_statement(
+                Agent.id, agent_id, state_column, Agent.state_version, steps, expected_version
+            )
+        )
+        row = result.first()
+        if row is None:
+            return None
+
+        failed_step, version, changed_keys, state, previous_state = row
+        return StatePatchResult(
+            failed_step, version, set(changed_keys or ()), state, previous_state
+        )
@@ -0,0 +1,21 @@
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import AgentSummary
+
+from .base_repository import BaseRepository
+
+
+class AgentSummaryRepository(BaseRepository[AgentSummary]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(session, AgentSummary)
+
+    async def find_by_agent_id(self, agent_id: int) -> AgentSummary | None:
+        result = await self._session.exec(
+            select(AgentSummary).where(AgentSummary.agent_id == agent_id)
+        )
+        return result.first()
+
+    async def delete_by_agent_id(self, agent_id: int) -> None:
+        await self._session.execute(delete(AgentSummary).where(AgentSummary.agent_id == agent_id))
@@ -1,10 +1,14 @@
+import inspect
 from abc import ABC
-from typing import TypeVar
+from typing import Any, TypeVar
 
+from sqlalchemy import delete, func, insert, update
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.tracing import traced
+
 __all__ = ("BaseRepository", "ModelType")
 
 
@@ -15,6 +19,14 @@ class BaseRepository[ModelType](ABC):
     _session: AsyncSession
     _model_cls: type[ModelType]
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Trace the queries of the repositories, as a span per call of their public methods."""
+
+        super().__init_subclass__(**kwargs)
+        for name, method in inspect.getmembers(cls, inspect.iscoroutinefunction):
+            if not name.startswith("_") and not hasattr(method, "__wrapped__"):
+                setattr(cls, name, traced(f"{cls.__name__}.{name}")(method))
+
     def __init__(self, session: AsyncSession, model_cls: type[ModelType]) -> None:
         self._session = session
         self._model_cls = model_cls
@@ -55,6 +67,39 @@ class BaseRepository[ModelType](ABC):
             await self._session.rollback()
             raise
 
+    async def allocate_ids(self, count: int) -> list[int]:
+        """Reserve IDs from the sequence of the table, for rows inserted referencing each other."""
+
+        if count == 0:
+            return []
+
+        result = await self._session.execute(
+            select(
+                func.nextval(func.pg_get_serial_sequence(self._model_cls.__tablename__, "id"))
+            ).select_from(func.generate_series(1, count))
+        )
+        return list(result.scalars().all())
+
+    async def create_all(self, models: list[ModelType]) -> None:
+        """Insert the models in a single statement, their IDs must be set beforehand."""
+
+        if models:
+            await self._session.execute(
+                insert(self._model_cls), [model.model_dump() for model in models]
+            )
+
+    async def update_all(self, models: list[ModelType]) -> None:
+        """Update the rows of the models by their IDs in a single statement."""
+
+        if models:
+            await self._session.execute(
+                update(self._model_cls), [model.model_dump() for model in models]
+            )
+
+    async def delete_all_by_ids(self, ids: list[int]) -> None:
+        if ids:
+            await self._session.execute(delete(self._model_cls).where(self._model_cls.id.in_(ids)))
+
     async def delete(self, model: ModelType) -> None:
         await self._session.delete(model)
 
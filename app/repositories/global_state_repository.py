@@ -1,21 +1,47 @@
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models import GlobalState
+from app.models.global_state import State
+from app.models.state_patch import StatePatchResult
 
 from .base_repository import BaseRepository
+from .state_patch import StatePatchStep, state_patch_statement
 
 
 class GlobalStateRepository(BaseRepository[GlobalState]):
     def __init__(self, session: AsyncSession):
         super().__init__(session, GlobalState)
 
+    async def save_state(self, id_: int, state: State, version: int) -> None:
+        await self._session.execute(
+            update(GlobalState).where(GlobalState.id == id_).values(state=state, version=version)
+        )
+
     async def update(self, model: GlobalState) -> GlobalState:
         try:
             model = await self._session.merge(model)
+            model.version = GlobalState.version + 1
             await self._session.flush()
             await self._session.refresh(model)
             return model
         except IntegrityError:
             await self._session.rollback()
             raise
+
+    async def patch_state(
+        self, id_: int, steps: list[StatePatchStep], expected_version: int | None = None
+    ) -> StatePatchResult | None:
+        statement = state_patch_statement(
+            GlobalState.id, id_, GlobalState.state, GlobalState.version, steps, expected_version
+        )
+        result = await self._session.execute(statement)
+        row = result.first()
+        if row is None:
+            return None
+
+        failed_step, version, changed_keys, state, previous_state = row
+        return StatePatchResult(
+            failed_step, version, set(changed_keys or ()), state, previous_state
+        )
@@ -0,0 +1,241 @@
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Select,
+    Text,
+    case,
+    func,
+    literal,
+    null,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.models.state_patch import JsonPatchOperation, JsonPatchTest, MergePatch
+
+# Max arguments of a Postgres function call, each object member passes a key and a value
+MAX_BUILD_OBJECT_MEMBERS = 50
+
+StatePatchApply = Callable[[ColumnElement], tuple[ColumnElement, ColumnElement]]
+
+
+class StatePatchStep:
+    """
+    A step of a state patch, computing the patched document from the previous one
+    together with the precondition the previous document has to meet.
+    """
+
+    apply: StatePatchApply
+    error: str
+
+    def __init__(self, apply: StatePatchApply, error: str) -> None:
+        self.apply = apply
+        self.error = error
+
+
+def tokens_literal(tokens: list[str]) -> ColumnElement:
+    return literal(tokens, ARRAY(Text))
+
+
+def value_literal(value: Any) -> ColumnElement:
+    return literal(value, JSONB)
+
+
+def get_path(doc: ColumnElement, tokens: list[str]) -> ColumnElement:
+    return doc.op("#>", return_type=JSONB)(tokens_literal(tokens)) if tokens else doc
+
+
+def remove_path(doc: ColumnElement, tokens: list[str]) -> ColumnElement:
+    return doc.op("#-", return_type=JSONB)(tokens_literal(tokens))
+
+
+def add_path(
+    doc: ColumnElement, tokens: list[str], value: ColumnElement
+) -> tuple[ColumnElement, ColumnElement]:
+    """
+    The RFC 6902 add of the value at the path: array elements are inserted (or appended with
+    the "-" index) and object members are set, and the parent of the path has to exist.
+    """
+
+    if not tokens:
+        return value, true()
+
+    *parent, last = tokens
+    parent_type = func.jsonb_typeof(get_path(doc, parent))
+
+    if last == "-":
+        appended = func.jsonb_insert(doc, tokens_literal([*parent, "-1"]), value, True)
+        return appended, parent_type == "array"
+
+    member_set = func.jsonb_set(doc, tokens_literal(tokens), value, True)
+    if not last.isdigit():
+        return member_set, parent_type == "object"
+
+    element_inserted = func.jsonb_insert(doc, tokens_literal(tokens), value)
+    return (
+        case((parent_type == "array", element_inserted), else_=member_set),
+        parent_type.in_(["array", "object"]),
+    )
+
+
+def json_patch_step(operation: JsonPatchOperation) -> StatePatchStep:
+    path = operation.path_tokens
+    value = value_literal(operation.value)
+
+    def apply(doc: ColumnElement) -> tuple[ColumnElement, ColumnElement]:
+        exists = get_path(doc, path).is_not(None)
+
+        match operation.op:
+            case "test":
+                return doc, func.coalesce(get_path(doc, path) == value, False)
+            case "remove":
+                return remove_path(doc, path), exists
+            case "replace" if not path:
+                return value, true()
+            case "replace":
+                return func.jsonb_set(doc, tokens_literal(path), value, False), exists
+            case "add":
+                return add_path(doc, path, value)
+            case "move" | "copy":
+                source = operation.from_tokens
+                moved = get_path(doc, source)
+                target = remove_path(doc, source) if operation.op == "move" else doc
+                patched, added = add_path(target, path, moved)
+                return patched, moved.is_not(None) & added
+
+    if operation.op == "test":
+        error = f"Test failed at path {operation.path}"
+    else:
+        error = f"Cannot {operation.op} the value at path {operation.path}"
+
+    return StatePatchStep(apply, error)
+
+
+def json_patch_steps(operations: list[JsonPatchOperation]) -> list[StatePatchStep]:
+    # Moving or copying a value to the whole state could replace it with a non-object
+    state_object_step = StatePatchStep(
+        lambda doc: (doc, func.jsonb_typeof(doc) == "object"), "The state must be an object"
+    )
+    return [*(json_patch_step(operation) for operation in operations), state_object_step]
+
+
+def merge_patch_object(doc: ColumnElement, tokens: list[str], patch: MergePatch) -> ColumnElement:
+    """
+    The RFC 7396 merge of the patch object into the value at the path of the document.
+    Members set to null are removed, objects are merged recursively and other values replaced.
+    The merged members are read from the original document, so it is referenced once per object.
+    """
+
+    target = get_path(doc, tokens)
+    merged = case((func.jsonb_typeof(target) == "object", target), else_=value_literal({}))
+
+    removed_keys = [key for key, value in patch.items() if value is None]
+    if removed_keys:
+        merged = merged.op("-", return_type=JSONB)(tokens_literal(removed_keys))
+
+    replaced = {
+        key: value
+        for key, value in patch.items()
+        if value is not None and not isinstance(value, dict)
+    }
+    if replaced:
+        merged = merged.op("||", return_type=JSONB)(value_literal(replaced))
+
+    merged_objects = [(key, value) for key, value in patch.items() if isinstance(value, dict)]
+    for i in range(0, len(merged_objects), MAX_BUILD_OBJECT_MEMBERS):
+        members = [
+            argument
+            for key, value in merged_objects[i : i + MAX_BUILD_OBJECT_MEMBERS]
+            for argument in (literal(key, Text), merge_patch_object(doc, [*tokens, key], value))
+        ]
+        merged = merged.op("||", return_type=JSONB)(func.jsonb_build_object(*members))
+
+    return merged
+
+
+def merge_patch_steps(patch: MergePatch, tests: list[JsonPatchTest]) -> list[StatePatchStep]:
+    merge_step = StatePatchStep(
+        lambda doc: (merge_patch_object(doc, [], patch), true()), "Cannot merge the patch"
+    )
+    return [*(json_patch_step(test.to_operation()) for test in tests), merge_step]
+
+
+def state_patch_statement(
+    id_column: InstrumentedAttribute,
+    id_: int,
+    state_column: InstrumentedAttribute,
+    version_column: InstrumentedAttribute,
+    steps: list[StatePatchStep],
+    expected_version: int | None = None,
+) -> Select:
+    """
+    A single statement applying the patch steps to the state of a row, one CTE per step,
+    and writing the patched state with an incremented version unless a precondition failed.
+    The row is locked while patched, so concurrent patches are applied one after another.
+    Selects the index of the failed step, if any, with 0 standing for a version other than
+    the expected one, the version and the state after the patch, or the current ones if failed,
+    the changed top-level keys and the state before the patch.
+    """
+
+    if expected_version is None:
+        version_failed = literal(None, Integer)
+    else:
+        version_failed = case((version_column == expected_version, null()), else_=literal(0))
+
+    step = (
+        select(
+            id_column.label("id"),
+            state_column.label("doc"),
+            version_column.label("version"),
+            version_failed.label("failed"),
+        )
+        .where(id_column == id_)
+        .with_for_update()
+        .cte("step_0")
+    )
+    original = step
+
+    for i, patch_step in enumerate(steps, start=1):
+        doc, precondition = patch_step.apply(step.c.doc)
+        failed = func.coalesce(step.c.failed, case((precondition, null()), else_=literal(i)))
+        step = select(step.c.id, doc.label("doc"), failed.label("failed")).cte(f"step_{i}")
+
+    updated = (
+        update(id_column.class_)
+        .where(id_column == step.c.id, step.c.failed.is_(None))
+        .values({state_column: step.c.doc, version_column: version_column + 1})
+        .returning(version_column.label("version"), state_column.label("state"))
+        .cte("updated")
+    )
+
+    key = func.jsonb_object_keys(
+        original.c.doc.op("||", return_type=JSONB)(step.c.doc)
+    ).column_valued("key", Text)
+    changed_keys = (
+        select(func.array_agg(key))
+        .where(
+            original.c.doc.op("->", return_type=JSONB)(key).is_distinct_from(
+                step.c.doc.op("->", return_type=JSONB)(key)
+            )
+        )
+        .scalar_subquery()
+    )
+
+    return (
+        select(
+            step.c.failed,
+            func.coalesce(updated.c.version, original.c.version),
+            changed_keys,
+            func.coalesce(updated.c.state, original.c.doc),
+            original.c.doc,
+        )
+        .select_from(original)
+        .join(step, true())
+        .outerjoin(updated, true())
+    )
@@ -1,11 +1,15 @@
+from collections.abc import Callable
+
 from app.core.database import Session
 
 from .action_condition_operator_repository import ActionConditionOperatorRepository
 from .action_condition_repository import ActionConditionRepository
 from .action_param_repository import ActionParamRepository
 from .action_repository import ActionRepository
+from .agent_message_partition_repository import AgentMessagePartitionRepository
 from .agent_message_repository import AgentMessageRepository
 from .agent_repository import AgentRepository
+from .agent_summary_repository import AgentSummaryRepository
 from .global_state_repository import GlobalStateRepository
 from .player_repository import PlayerRepository
 
@@ -17,11 +21,14 @@ class UnitOfWork:
     messages: AgentMessageRepository
     operators: ActionConditionOperatorRepository
     params: ActionParamRepository
+    partitions: AgentMessagePartitionRepository
     players: PlayerRepository
     state: GlobalStateRepository
+    summaries: AgentSummaryRepository
 
     def __init__(self) -> None:
         self._depth = 0
+        self._commit_callbacks: list[Callable[[], None]] = []
 
     async def __aenter__(self) -> "UnitOfWork":
         """
@@ -44,8 +51,10 @@ class UnitOfWork:
         self.messages = AgentMessageRepository(self._session)
         self.operators = ActionConditionOperatorRepository(self._session)
         self.params = ActionParamRepository(self._session)
+        self.partitions = AgentMessagePartitionRepository(self._session)
         self.players = PlayerRepository(self._session)
         self.state = GlobalStateRepository(self._session)
+        self.summaries = AgentSummaryRepository(self._session)
 
         return self
 
@@ -66,8 +75,24 @@ class UnitOfWork:
 
         await self._session.__aexit__(exc_type, exc_val, exc_tb)
 
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback to run once the changes of the unit of work are committed.
+        The callbacks are discarded on rollback.
+
+        Args:
+            callback (Callable[[], None]): The callback to run after the commit.
+        """
+
+        self._commit_callbacks.append(callback)
+
     async def commit(self) -> None:
         await self._session.commit()
 
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for callback in callbacks:
+            callback()
+
     async def rollback(self) -> None:
         await self._session.rollback()
+        self._commit_callbacks.clear()
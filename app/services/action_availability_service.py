@@ -0,0 +1,100 @@
+from app.core.metrics import condition_evaluations
+from app.core.tracing import traced
+from app.errors.conditions import ConditionEvaluationError
+from app.models.action import Action
+from app.models.action_availability import action_availability
+
+from .action_condition_service import ActionConditionService
+from .base_service import BaseService
+
+
+class ActionAvailabilityService(BaseService):
+    @traced()
+    async def get_available_actions(self, actions: list[Action]) -> list[Action]:
+        """
+        Get the actions whose conditions are met.
+        Only the actions with unknown availability have their conditions evaluated,
+        the availability of the others is read from the materialized availability index.
+
+        Args:
+            actions (list[Action]): The actions to check.
+
+        Returns:
+            list[Action]: The available actions.
+
+        Raises:
+            ConditionEvaluationError: If the conditions of an action cannot be evaluated.
+        """
+
+        availability = {action.id: action_availability.get(action.id) for action in actions}
+
+        unknown_action_ids = [
+            action_id for action_id, available in availability.items() if available is None
+        ]
+        if unknown_action_ids:
+            results, errors = await self._evaluate(unknown_action_ids)
+            if errors:
+                raise next(iter(errors.values()))
+
+            availability |= results
+
+        return [action for action in actions if availability[action.id]]
+
+    async def refresh_stale_actions(self) -> None:
+        """
+        Re-evaluate the availability of the actions invalidated by state changes.
+        Actions whose conditions cannot be evaluated are left unknown,
+        so that the error is raised once they are requested.
+        """
+
+        stale_action_ids = action_availability.pop_stale_action_ids()
+        if stale_action_ids:
+            await self._evaluate(sorted(stale_action_ids))
+
+    async def _evaluate(
+        self, action_ids: list[int]
+    ) -> tuple[dict[int, bool], dict[int, ConditionEvaluationError]]:
+        """
+        Evaluate the conditions of the given actions and store their availability.
+
+        Args:
+            action_ids (list[int]): The IDs of the actions to evaluate.
+
+        Returns:
+            tuple[dict[int, bool], dict[int, ConditionEvaluationError]]:
+                The availability and the evaluation errors by action ID.
+        """
+
+        generation = action_availability.generation
+
+        async with self.unit_of_work as uow:
+            condition_service = ActionConditionService(uow)
+            compiled_trees = await condition_service.get_compiled_condition_trees(action_ids)
+            if compiled_trees:
+                global_state, agent_states = await condition_service.get_condition_states(
+                    compiled_trees.values()
+                )
+
+        results = {}
+        errors = {}
+        for action_id in action_ids:
+            compiled_tree = compiled_trees.get(action_id)
+            if compiled_tree is None:
+                results[action_id] = True
+                action_availability.store(action_id, True, set(), generation)
+                continue
+
+            try:
+                available = compiled_tree.evaluator(global_state, agent_states)
+            except ConditionEvaluationError as e:
+                condition_evaluations.inc("error")
+                errors[action_id] = e
+                continue
+
+            condition_evaluations.inc("available" if available else "unavailable")
+            results[action_id] = available
+            action_availability.store(
+                action_id, available, compiled_tree.state_keys, generation, compiled_tree.root_id
+            )
+
+        return results, errors
@@ -1,6 +1,16 @@
+import os
+from collections import defaultdict
+from collections.abc import Iterable
+
+from dotenv import load_dotenv
+from sqlmodel import SQLModel
+
+from app.core.cache import LRUCache
+from app.core.tracing import traced
 from app.errors.api import ConflictError, NotFoundError
 from app.errors.conditions import ConditionEvaluationError
 from app.models.action import Action, ActionEvaluationResult
+from app.models.action_availability import action_availability
 from app.models.action_condition import (
     ActionCondition,
     ActionConditionRequest,
@@ -10,14 +20,33 @@ from app.models.action_condition_operator import (
     ActionConditionOperator,
     ActionConditionOperatorRequest,
     ActionConditionOperatorUpdateRequest,
+    ConditionTreeConditionRequest,
+    ConditionTreeRequest,
+    ConditionTreeResponse,
     NewConditionTreeRequest,
 )
-from app.models.action_condition_tree import ActionConditionTree, ActionConditionTreeNode
+from app.models.action_condition_tree import (
+    ActionConditionTree,
+    ActionConditionTreeNode,
+    AgentStates,
+    CompiledActionConditionTree,
+)
+from app.models.global_state import State
+from app.repositories.base_repository import BaseRepository
 
 from .agent_service import AgentService
 from .base_service import BaseService
 from .global_state_service import GlobalStateService
 
+load_dotenv()
+
+CONDITION_TREE_CACHE_SIZE = int(os.getenv("CONDITION_TREE_CACHE_SIZE", "1024"))
+
+# Compiled condition trees by action ID
+condition_tree_cache: LRUCache[int, CompiledActionConditionTree] = LRUCache(
+    CONDITION_TREE_CACHE_SIZE
+)
+
 
 class ActionConditionService(BaseService):
     async def get_root_operator_for_action_id(
@@ -36,6 +65,7 @@ class ActionConditionService(BaseService):
         async with self.unit_of_work as uow:
             return await uow.operators.find_root_by_action_id(action_id)
 
+    @traced()
     async def get_condition_tree(self, action_id: int) -> ActionConditionTree | None:
         """
         Get the condition tree for a given action ID.
@@ -48,25 +78,114 @@ class ActionConditionService(BaseService):
         """
 
         async with self.unit_of_work as uow:
-            root = await self.get_root_operator_for_action_id(action_id)
-            if root is None:
+            compiled_tree = await self.get_compiled_condition_tree(action_id)
+            if compiled_tree is None:
                 return None
 
-            conditions = await uow.conditions.find_all_by_root_id(root.id)
-            operators = await uow.operators.find_all_by_root_id(root.id)
-
             global_state = await GlobalStateService(uow).get_state()
+            agents = await uow.agents.find_all_by_ids(compiled_tree.state_agent_ids)
 
-            agent_ids = [
-                condition.state_agent_id
-                for condition in conditions
-                if condition.state_agent_id is not None
-            ]
-            agents = await uow.agents.find_all_by_ids(agent_ids)
+            return ActionConditionTree(compiled_tree, global_state, agents)
+
+    async def get_compiled_condition_tree(
+        self, action_id: int
+    ) -> CompiledActionConditionTree | None:
+        """
+        Get the compiled condition tree for a given action ID.
+        Compiled trees are cached until a condition or operator of the tree changes.
+
+        Args:
+            action_id (int): The action ID.
+
+        Returns:
+            CompiledActionConditionTree | None: The compiled tree, or None if not found.
+        """
+
+        compiled_trees = await self.get_compiled_condition_trees([action_id])
+        return compiled_trees.get(action_id)
+
+    @traced()
+    async def get_compiled_condition_trees(
+        self, action_ids: list[int]
+    ) -> dict[int, CompiledActionConditionTree]:
+        """
+        Get the compiled condition trees for the given action IDs.
+        Trees missing from the cache are loaded together in a constant number of queries.
+
+        Args:
+            action_ids (list[int]): The action IDs.
+
+        Returns:
+            dict[int, CompiledActionConditionTree]:
+                The compiled trees by action ID. Actions without a tree are omitted.
+        """
+
+        compiled_trees = {}
+        missing_action_ids = []
+        for action_id in action_ids:
+            compiled_tree = condition_tree_cache.get(action_id)
+            if compiled_tree is None:
+                missing_action_ids.append(action_id)
+            else:
+                compiled_trees[action_id] = compiled_tree
+
+        if not missing_action_ids:
+            return compiled_trees
+
+        # A tree invalidated while it is loaded is not cached, as it might be outdated
+        generation = condition_tree_cache.generation
+        async with self.unit_of_work as uow:
+            roots = await uow.operators.find_roots_by_action_ids(missing_action_ids)
+            root_ids = [root.id for root in roots]
+            conditions = await uow.conditions.find_all_by_root_ids(root_ids)
+            operators = await uow.operators.find_all_by_root_ids(root_ids)
+
+        conditions_by_root = defaultdict(list)
+        for condition in conditions:
+            conditions_by_root[condition.root_id].append(condition)
+
+        operators_by_root = defaultdict(list)
+        for operator in operators:
+            operators_by_root[operator.root_id].append(operator)
+
+        for root in roots:
+            if root.action_id in compiled_trees:
+                continue
 
             empty_root_node = ActionConditionTreeNode.from_operator(root)
-            root_node = ActionConditionTreeNode.build(empty_root_node, conditions, operators)
-            return ActionConditionTree(root_node, global_state, agents)
+            root_node = ActionConditionTreeNode.build(
+                empty_root_node, conditions_by_root[root.id], operators_by_root[root.id]
+            )
+            compiled_tree = CompiledActionConditionTree(root_node)
+
+            condition_tree_cache.set(root.action_id, compiled_tree, generation)
+            compiled_trees[root.action_id] = compiled_tree
+
+        return compiled_trees
+
+    def _invalidate_condition_tree(self, root_id: int | None, *action_ids: int | None) -> None:
+        """
+        Drop the cached compiled tree of the given root and the materialized availability
+        of its actions, both now and after the commit, so that nothing computed from the
+        uncommitted state is kept either.
+
+        Args:
+            root_id (int | None): The root operator ID.
+            *action_ids (int | None): Other actions the tree now belongs to, such as a new action
+                of the tree, whose availability was evaluated without it.
+        """
+
+        if root_id is None:
+            return
+
+        action_ids = [action_id for action_id in action_ids if action_id is not None]
+
+        def invalidate() -> None:
+            condition_tree_cache.pop_where(lambda _, tree: tree.root_id == root_id)
+            action_availability.invalidate_root(root_id, action_ids)
+
+        invalidate()
+        self.unit_of_work.on_commit(invalidate)
 
     async def create_condition_operator(
         self, operator_request: ActionConditionOperatorRequest
@@ -85,6 +204,7 @@ class ActionConditionService(BaseService):
 
         async with self.unit_of_work as uow:
             await self._validate_operator_ids(condition_operator)
+            self._invalidate_condition_tree(condition_operator.root_id)
             return await uow.operators.create(condition_operator)
 
     async def _validate_operator_ids(
@@ -138,8 +258,196 @@ class ActionConditionService(BaseService):
 
             operator = await uow.operators.create(operator)
             operator.root_id = operator.id
+            self._invalidate_condition_tree(operator.root_id, operator.action_id)
             return await uow.operators.update(operator)
 
+    async def replace_condition_tree(
+        self, action_id: int, tree_request: ConditionTreeRequest
+    ) -> ConditionTreeResponse:
+        """
+        Replace the condition tree of an action with the given tree, creating it if needed.
+        The tree is validated in memory and diffed against the existing nodes, which are then
+        inserted, updated and deleted with a single statement each, in one transaction.
+
+        Args:
+            action_id (int): The action ID.
+            tree_request (ConditionTreeRequest): The root operator with all its children.
+
+        Returns:
+            ConditionTreeResponse: The operators and conditions of the saved tree.
+
+        Raises:
+            NotFoundError: If the action, a state agent or a node of the tree does not exist.
+            ConflictError: If a node is given twice or a condition logic is invalid.
+        """
+
+        async with self.unit_of_work as uow:
+            action = await uow.actions.find_by_id(action_id)
+            if action is None:
+                raise NotFoundError(f"Action with id {action_id} not found")
+
+            root = await uow.operators.find_root_by_action_id(action_id)
+            existing_operators, existing_conditions = {}, {}
+            if root is not None:
+                operators = await uow.operators.find_all_by_root_id(root.id)
+                conditions = await uow.conditions.find_all_by_root_id(root.id)
+                existing_operators = {operator.id: operator for operator in operators}
+                existing_conditions = {condition.id: condition for condition in conditions}
+
+            if tree_request.id is not None and (root is None or tree_request.id != root.id):
+                raise ConflictError(
+                    f"Operator with id {tree_request.id} is not the root of action {action_id}"
+                )
+
+            operator_requests, condition_requests = self._flatten_tree_request(tree_request)
+
+            operator_ids = [request.id for request, _ in operator_requests]
+            operator_ids[0] = root.id if root is not None else None
+            self._validate_tree_node_ids(operator_ids, existing_operators, "Operator")
+            new_operator_ids = iter(await uow.operators.allocate_ids(operator_ids.count(None)))
+            operator_ids = [
+                id_ if id_ is not None else next(new_operator_ids) for id_ in operator_ids
+            ]
+
+            condition_ids = [request.id for request, _ in condition_requests]
+            self._validate_tree_node_ids(condition_ids, existing_conditions, "Condition")
+            new_condition_ids = iter(await uow.conditions.allocate_ids(condition_ids.count(None)))
+            condition_ids = [
+                id_ if id_ is not None else next(new_condition_ids) for id_ in condition_ids
+            ]
+
+            root_id = operator_ids[0]
+            operators = [
+                ActionConditionOperator(
+                    id=operator_id,
+                    logical_operator=request.logical_operator,
+                    action_id=action_id,
+                    parent_id=operator_ids[parent] if parent is not None else None,
+                    root_id=root_id,
+                )
+                for operator_id, (request, parent) in zip(
+                    operator_ids, operator_requests, strict=True
+                )
+            ]
+            conditions = [
+                ActionCondition(
+                    **request.model_dump(exclude={"id"}),
+                    id=condition_id,
+                    parent_id=operator_ids[parent],
+                    root_id=root_id,
+                )
+                for condition_id, (request, parent) in zip(
+                    condition_ids, condition_requests, strict=True
+                )
+            ]
+
+            await self._validate_tree_conditions_logic(conditions)
+
+            self._invalidate_condition_tree(root_id, action_id)
+            await self._save_tree_nodes(uow.operators, operators, existing_operators)
+            await self._save_tree_nodes(uow.conditions, conditions, existing_conditions)
+            await uow.conditions.delete_all_by_ids(
+                list(existing_conditions.keys() - set(condition_ids))
+            )
+            await uow.operators.delete_all_by_ids(
+                list(existing_operators.keys() - set(operator_ids))
+            )
+
+            return ConditionTreeResponse(
+                root_id=root_id, operators=operators, conditions=conditions
+            )
+
+    @staticmethod
+    def _flatten_tree_request(
+        tree_request: ConditionTreeRequest,
+    ) -> tuple[
+        list[tuple[ConditionTreeRequest, int | None]],
+        list[tuple[ConditionTreeConditionRequest, int]],
+    ]:
+        """
+        Flatten the tree request into its operators and conditions with the indices
+        of their parent operators. The operators are ordered parents first, from the root.
+        """
+
+        operator_requests: list[tuple[ConditionTreeRequest, int | None]] = [(tree_request, None)]
+        condition_requests = []
+        for index, (operator_request, _) in enumerate(operator_requests):
+            operator_requests.extend((child, index) for child in operator_request.operators)
+            condition_requests.extend((child, index) for child in operator_request.conditions)
+
+        return operator_requests, condition_requests
+
+    @staticmethod
+    def _validate_tree_node_ids(
+        ids: list[int | None], existing_nodes: dict[int, SQLModel], node_name: str
+    ) -> None:
+        """
+        Validate that the given node IDs are existing nodes of the tree, each given only once.
+
+        Raises:
+            NotFoundError: If a node is not part of the tree.
+            ConflictError: If a node is given more than once.
+        """
+
+        seen_ids = set()
+        for id_ in ids:
+            if id_ is None:
+                continue
+
+            if id_ not in existing_nodes:
+                raise NotFoundError(f"{node_name} with id {id_} not found in the tree")
+
+            if id_ in seen_ids:
+                raise ConflictError(f"{node_name} with id {id_} is given more than once")
+
+            seen_ids.add(id_)
+
+    async def _validate_tree_conditions_logic(self, conditions: list[ActionCondition]) -> None:
+        """
+        Validate the logic of the given conditions, loading the states they read once.
+
+        Args:
+            conditions (list[ActionCondition]): The conditions to validate.
+
+        Raises:
+            NotFoundError: If a state agent does not exist.
+            ConflictError: If a condition logic is invalid.
+        """
+
+        async with self.unit_of_work as uow:
+            global_state = await GlobalStateService(uow).get_state()
+            agent_ids = {c.state_agent_id for c in conditions if c.state_agent_id is not None}
+            agents = await uow.agents.find_all_by_ids(sorted(agent_ids))
+            agent_states = {agent.id: agent.combined_state for agent in agents}
+
+        missing_agent_ids = agent_ids - agent_states.keys()
+        if missing_agent_ids:
+            raise NotFoundError(f"Agent with id {min(missing_agent_ids)} not found")
+
+        for condition in conditions:
+            try:
+                ActionConditionTreeNode.from_condition(condition).evaluate(
+                    global_state.state, agent_states
+                )
+            except ConditionEvaluationError as e:
+                raise ConflictError(str(e)) from e
+
+    @staticmethod
+    async def _save_tree_nodes(
+        repository: BaseRepository, nodes: list[SQLModel], existing_nodes: dict[int, SQLModel]
+    ) -> None:
+        """Insert the new nodes of the tree and update the changed ones."""
+
+        await repository.create_all([node for node in nodes if node.id not in existing_nodes])
+        await repository.update_all(
+            [
+                node
+                for node in nodes
+                if node.id in existing_nodes
+                and node.model_dump() != existing_nodes[node.id].model_dump()
+            ]
+        )
+
     async def create_condition(self, condition_request: ActionConditionRequest) -> ActionCondition:
         """
         Create a new condition.
@@ -156,6 +464,7 @@ class ActionConditionService(BaseService):
         async with self.unit_of_work as uow:
             await self._validate_condition_ids(condition)
             await self._validate_condition_logic(condition)
+            self._invalidate_condition_tree(condition.root_id)
             return await uow.conditions.create(condition)
 
     async def _validate_condition_ids(
@@ -283,10 +592,8 @@ class ActionConditionService(BaseService):
             if action is None:
                 raise NotFoundError(f"Action with id {action_id} not found")
 
-            operators = await uow.operators.find_all_by_root_id(root_id)
-            for operator in operators:
-                operator.action_id = action.id
-                await uow.operators.update(operator)
+            self._invalidate_condition_tree(root_id, action_id)
+            await uow.operators.update_action_id_by_root_id(root_id, action.id)
 
             return root_id, action_id
 
@@ -310,11 +617,13 @@ class ActionConditionService(BaseService):
                 raise NotFoundError(f"Condition with id {condition_id} not found")
 
             await self._validate_condition_ids(condition_update)
+            self._invalidate_condition_tree(condition.root_id)
 
             condition_update_data = condition_update.model_dump(exclude_unset=True)
             condition.sqlmodel_update(condition_update_data)
 
             await self._validate_condition_logic(condition)
+            self._invalidate_condition_tree(condition.root_id)
             return await uow.conditions.update(condition)
 
     async def update_condition_operator(
@@ -337,22 +646,35 @@ class ActionConditionService(BaseService):
                 raise NotFoundError(f"Operator with id {operator_id} not found")
 
             await self._validate_operator_ids(operator_update)
+            self._invalidate_condition_tree(operator.root_id)
 
             operator_update_data = operator_update.model_dump(exclude_unset=True)
             operator.sqlmodel_update(operator_update_data)
 
+            self._invalidate_condition_tree(operator.root_id, operator.action_id)
             return await uow.operators.update(operator)
 
     async def delete_condition_operator(self, operator_id: int) -> None:
         """
         Delete a condition operator by its ID. This cascades to delete all children.
+        A whole tree is deleted by its root ID in constant statements, rather than
+        by cascading level by level.
 
         Args:
             operator_id (int): The operator ID.
         """
 
         async with self.unit_of_work as uow:
-            await uow.operators.delete_by_id(operator_id)
+            operator = await uow.operators.find_by_id(operator_id)
+            if operator is None:
+                return None
+
+            self._invalidate_condition_tree(operator.root_id)
+            if operator.is_root():
+                await uow.conditions.delete_all_by_root_id(operator.id)
+                await uow.operators.delete_all_by_root_id(operator.id)
+            else:
+                await uow.operators.delete(operator)
 
     async def delete_condition(self, condition_id: int) -> None:
         """
@@ -363,7 +685,12 @@ class ActionConditionService(BaseService):
         """
 
         async with self.unit_of_work as uow:
-            await uow.conditions.delete_by_id(condition_id)
+            condition = await uow.conditions.find_by_id(condition_id)
+            if condition is None:
+                return None
+
+            self._invalidate_condition_tree(condition.root_id)
+            await uow.conditions.delete(condition)
 
     async def evaluate_action_conditions(self, action_id: int) -> ActionEvaluationResult:
         """
@@ -402,6 +729,62 @@ class ActionConditionService(BaseService):
         tree = await self.get_condition_tree(action.id)
         return tree.evaluate() if tree else True
 
+    async def evaluate_conditions_for_actions(self, actions: list[Action]) -> dict[int, bool]:
+        """
+        Evaluate the conditions for multiple actions at once.
+        The condition trees, the global state and the states of the agents read by the trees
+        are loaded once for all the actions.
+
+        Args:
+            actions (list[Action]): The actions to evaluate.
+
+        Returns:
+            dict[int, bool]: The results of the condition evaluation by action ID.
+        """
+
+        async with self.unit_of_work:
+            action_ids = [action.id for action in actions]
+            compiled_trees = await self.get_compiled_condition_trees(action_ids)
+            if not compiled_trees:
+                return dict.fromkeys(action_ids, True)
+
+            global_state, agent_states = await self.get_condition_states(compiled_trees.values())
+
+        return {
+            action_id: (
+                compiled_trees[action_id].evaluator(global_state, agent_states)
+                if action_id in compiled_trees
+                else True
+            )
+            for action_id in action_ids
+        }
+
+    async def get_condition_states(
+        self, compiled_trees: Iterable[CompiledActionConditionTree]
+    ) -> tuple[State, AgentStates]:
+        """
+        Get the states read by the given condition trees.
+        The global state is loaded once and every agent read by any of the trees only once.
+
+        Args:
+            compiled_trees (Iterable[CompiledActionConditionTree]): The compiled trees.
+
+        Returns:
+            tuple[State, AgentStates]: The global state and the agent states by agent ID.
+        """
+
+        async with self.unit_of_work as uow:
+            global_state = await GlobalStateService(uow).get_state()
+
+            agent_ids = {
+                agent_id
+                for compiled_tree in compiled_trees
+                for agent_id in compiled_tree.state_agent_ids
+            }
+            agents = await uow.agents.find_all_by_ids(list(agent_ids))
+
+        return global_state.state, {agent.id: agent.combined_state for agent in agents}
+
     async def _validate_parent_and_root(self, parent_id: int | None, root_id: int | None) -> None:
         """
         Validate parent and root operator IDs.
@@ -4,6 +4,7 @@ from app.models.action_param import (
     ActionParamRequest,
     ActionParamUpdateRequest,
 )
+from app.models.structured_output import invalidate_structured_outputs
 
 from .action_service import ActionService
 from .base_service import BaseService
@@ -28,6 +29,8 @@ class ActionParamService(BaseService):
             if action is None:
                 raise NotFoundError(f"Action with id {param.action_id} not found")
 
+            uow.on_commit(lambda: invalidate_structured_outputs(param.action_id))
+
             return await uow.params.create(param)
 
     async def get_action_param_by_id(self, action_param_id: int) -> ActionParam | None:
@@ -68,8 +71,16 @@ class ActionParamService(BaseService):
                 if action is None:
                     raise NotFoundError(f"Action with id {action_param_update.action_id} not found")
 
+            previous_action_id = param.action_id
             param_update_data = action_param_update.model_dump(exclude_unset=True)
             param.sqlmodel_update(param_update_data)
+            action_ids = {previous_action_id, param.action_id}
+
+            def invalidate() -> None:
+                for action_id in action_ids:
+                    invalidate_structured_outputs(action_id)
+
+            uow.on_commit(invalidate)
 
             return await uow.params.update(param)
 
@@ -82,4 +93,10 @@ class ActionParamService(BaseService):
         """
 
         async with self.unit_of_work as uow:
-            await uow.params.delete_by_id(action_param_id)
+            param = await self.get_action_param_by_id(action_param_id)
+            if param is None:
+                return None
+
+            action_id = param.action_id
+            await uow.params.delete(param)
+            uow.on_commit(lambda: invalidate_structured_outputs(action_id))
@@ -2,6 +2,7 @@ from sqlalchemy.exc import IntegrityError
 
 from app.errors.api import ConflictError, NotFoundError
 from app.models.action import Action, ActionRequest, ActionUpdateRequest
+from app.models.structured_output import invalidate_structured_outputs
 
 from .action_condition_service import ActionConditionService
 from .base_service import BaseService
@@ -90,6 +91,7 @@ class ActionService(BaseService):
                     )
 
             action.sqlmodel_update(action_update_data)
+            uow.on_commit(lambda: invalidate_structured_outputs(action_id))
 
             try:
                 return await uow.actions.update(action)
@@ -116,3 +118,4 @@ class ActionService(BaseService):
                 await condition_service.delete_condition_operator(root_operator.id)
 
             await uow.actions.delete(action)
+            uow.on_commit(lambda: invalidate_structured_outputs(action_id))
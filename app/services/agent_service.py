@@ -1,6 +1,16 @@
+from collections.abc import AsyncIterator
+
+from app.core.tracing import traced
 from app.errors.api import ConflictError, NotFoundError
+from app.errors.state import StatePatchError, StateVersionConflictError
+from app.models.action_availability import action_availability
 from app.models.agent import Agent, AgentRequest, AgentUpdateRequest
-from app.models.agent_message import AgentMessage
+from app.models.agent_message import AgentMessage, MessagePosition
+from app.models.agent_summary import AgentSummary
+from app.models.global_state import State, changed_state_keys
+from app.models.state_patch import JsonPatchOperation, JsonPatchTest, MergePatch
+from app.models.state_subscriptions import state_subscriptions
+from app.repositories.state_patch import StatePatchStep, json_patch_steps, merge_patch_steps
 
 from .base_service import BaseService
 
@@ -33,7 +43,8 @@ class AgentService(BaseService):
 
     async def get_populated_agent(self, agent_id: int) -> Agent | None:
         """
-        Get an agent with its conversation history and actions relationships fully populated.
+        Get an agent with its actions relationship fully populated.
+        The conversation history is not loaded, as it is only ever needed partially.
 
         Args:
             agent_id (int): The ID of the agent to retrieve.
@@ -134,11 +145,161 @@ class AgentService(BaseService):
             if agent is None:
                 raise NotFoundError(f"Agent with id {agent_id} not found")
 
+            # The history settings are not nullable, so null values leave them unchanged
             agent_update_data = agent_update_request.model_dump(exclude_unset=True)
+            for key in ("history_strategy", "history_limit"):
+                if agent_update_data.get(key, ...) is None:
+                    del agent_update_data[key]
+
             agent.sqlmodel_update(agent_update_data)
 
             return await uow.agents.update(agent)
 
+    async def update_agent_state(
+        self, agent_id: int, state: State, internal: bool, expected_version: int | None = None
+    ) -> int:
+        """
+        Replace the internal or external state of an agent. The state is written only if
+        its version did not change since it was read, so concurrent updates never overwrite
+        each other unnoticed, without locking the agent.
+
+        Args:
+            agent_id (int): The ID of the agent to update.
+            state (State): The new state.
+            internal (bool): Whether to replace the internal or the external state.
+            expected_version (int | None): The state version to replace, any if None.
+
+        Returns:
+            int: The new state version of the agent.
+
+        Raises:
+            NotFoundError: If the agent does not exist.
+            StateVersionConflictError: If the state version is not the expected one.
+        """
+
+        async with self.unit_of_work as uow:
+            while True:
+                agent = await self.get_agent_by_id(agent_id)
+                if agent is None:
+                    raise NotFoundError(f"Agent with id {agent_id} not found")
+
+                version = agent.state_version
+                replaced_state = agent.internal_state if internal else agent.external_state
+                if expected_version is not None and version != expected_version:
+                    raise StateVersionConflictError(version, replaced_state)
+
+                # Read before the update, which writes the new state into the agent
+                previous_state = agent.external_state | agent.internal_state
+                if internal:
+                    current_state = agent.external_state | state
+                else:
+                    current_state = state | agent.internal_state
+
+                if await uow.agents.update_state(agent_id, internal, state, version):
+                    break
+
+                # The state changed since it was read, so it is read again
+
+            changed_keys = changed_state_keys(previous_state, current_state)
+            uow.on_commit(lambda: action_availability.invalidate_state_keys(agent_id, changed_keys))
+            uow.on_commit(
+                lambda: state_subscriptions.record_change(
+                    (agent_id, internal), replaced_state, state, version + 1
+                )
+            )
+
+            return version + 1
+
+    async def patch_agent_state(
+        self,
+        agent_id: int,
+        internal: bool,
+        operations: list[JsonPatchOperation],
+        expected_version: int | None = None,
+    ) -> int:
+        """
+        Apply an RFC 6902 JSON Patch to the internal or external state of an agent
+        in a single statement. Either all operations are applied or none is.
+
+        Args:
+            agent_id (int): The ID of the agent to update.
+            internal (bool): Whether to patch the internal or the external state.
+            operations (list[JsonPatchOperation]): The patch operations.
+            expected_version (int | None): The state version to patch, any if None.
+
+        Returns:
+            int: The new state version of the agent.
+
+        Raises:
+            NotFoundError: If the agent does not exist.
+            StatePatchError: If an operation cannot be applied or a test fails.
+            StateVersionConflictError: If the state version is not the expected one.
+        """
+
+        return await self._patch_agent_state(
+            agent_id, internal, json_patch_steps(operations), expected_version
+        )
+
+    async def merge_patch_agent_state(
+        self,
+        agent_id: int,
+        internal: bool,
+        patch: MergePatch,
+        tests: list[JsonPatchTest],
+        expected_version: int | None = None,
+    ) -> int:
+        """
+        Apply an RFC 7396 JSON merge patch to the internal or external state of an agent
+        in a single statement.
+
+        Args:
+            agent_id (int): The ID of the agent to update.
+            internal (bool): Whether to patch the internal or the external state.
+            patch (MergePatch): The merge patch.
+            tests (list[JsonPatchTest]): The preconditions the state has to meet.
+            expected_version (int | None): The state version to patch, any if None.
+
+        Returns:
+            int: The new state version of the agent.
+
+        Raises:
+            NotFoundError: If the agent does not exist.
+            StatePatchError: If a test fails.
+            StateVersionConflictError: If the state version is not the expected one.
+        """
+
+        return await self._patch_agent_state(
+            agent_id, internal, merge_patch_steps(patch, tests), expected_version
+        )
+
+    async def _patch_agent_state(
+        self,
+        agent_id: int,
+        internal: bool,
+        steps: list[StatePatchStep],
+        expected_version: int | None,
+    ) -> int:
+        async with self.unit_of_work as uow:
+            result = await uow.agents.patch_state(agent_id, internal, steps, expected_version)
+            if result is None:
+                raise NotFoundError(f"Agent with id {agent_id} not found")
+
+            if result.failed_step == 0:
+                raise StateVersionConflictError(result.version, result.state)
+
+            if result.failed_step is not None:
+                raise StatePatchError(steps[result.failed_step - 1].error)
+
+            changed_keys = result.changed_keys
+            uow.on_commit(lambda: action_availability.invalidate_state_keys(agent_id, changed_keys))
+            uow.on_commit(
+                lambda: state_subscriptions.record_change(
+                    (agent_id, internal), result.previous_state, result.state, result.version
+                )
+            )
+
+            return result.version
+
     async def delete_agent(self, agent_id: int) -> None:
         """
         Delete an agent by its ID.
@@ -157,6 +318,7 @@ class AgentService(BaseService):
 
             await uow.agents.delete(agent)
 
+    @traced()
     async def add_agent_message(self, message: AgentMessage) -> AgentMessage:
         """
         Add a message to an agent's conversation history.
@@ -182,25 +344,104 @@ class AgentService(BaseService):
             list[AgentMessage]: A list of messages from the agent's conversation history.
         """
 
-        agent = await self.get_populated_agent(agent_id)
-        if agent is None:
-            raise NotFoundError(f"Agent with id {agent_id} not found")
+        async with self.unit_of_work as uow:
+            agent = await self.get_agent_by_id(agent_id)
+            if agent is None:
+                raise NotFoundError(f"Agent with id {agent_id} not found")
 
-        return agent.conversation_history
+            return await uow.messages.find_all_by_agent_id(agent_id)
 
-    async def delete_agent_messages(self, agent_id: int) -> None:
+    async def get_agent_messages_page(
+        self,
+        agent_id: int,
+        limit: int,
+        before: MessagePosition | None = None,
+        after: MessagePosition | None = None,
+    ) -> list[AgentMessage]:
         """
-        Delete all messages from an agent's conversation history.
+        Get a page of messages from an agent's conversation history.
 
         Args:
-            agent_id (int): The ID of the agent whose messages to delete.
+            agent_id (int): The ID of the agent whose messages to retrieve.
+            limit (int): The maximum number of messages in the page.
+            before (MessagePosition | None): The position before which to select
+                the newest messages.
+            after (MessagePosition | None): The position after which to select
+                the oldest messages.
+
+        Returns:
+            list[AgentMessage]: The messages of the page, in chronological order.
+
+        Raises:
+            NotFoundError: If the agent does not exist.
         """
 
         async with self.unit_of_work as uow:
-            agent = await self.get_populated_agent(agent_id)
+            agent = await self.get_agent_by_id(agent_id)
             if agent is None:
-                return None
+                raise NotFoundError(f"Agent with id {agent_id} not found")
+
+            return await uow.messages.find_page_by_agent_id(agent_id, limit, before, after)
+
+    async def stream_agent_messages(self, agent_id: int) -> AsyncIterator[AgentMessage]:
+        """
+        Stream all messages from an agent's conversation history, in chronological order,
+        without loading them all in memory.
+
+        Args:
+            agent_id (int): The ID of the agent whose messages to stream.
+
+        Yields:
+            AgentMessage: The messages from the agent's conversation history.
+        """
+
+        async with self.unit_of_work as uow:
+            async for message in uow.messages.stream_all_by_agent_id(agent_id):
+                yield message
+
+    async def get_conversation_history(
+        self, agent: Agent, max_messages: int, after: MessagePosition | None = None
+    ) -> list[AgentMessage]:
+        """
+        Get the part of an agent's conversation history selected by its history strategy.
+
+        Args:
+            agent (Agent): The agent whose conversation history to retrieve.
+            max_messages (int): The maximum number of messages to retrieve, whatever the strategy.
+            after (MessagePosition | None): The position after which to select messages,
+                such as the last summarized message.
+
+        Returns:
+            list[AgentMessage]: The selected messages, in chronological order.
+        """
+
+        async with self.unit_of_work as uow:
+            return await uow.messages.find_conversation_history(
+                agent.id, agent.history_strategy, agent.history_limit, max_messages, after
+            )
+
+    async def get_agent_summary(self, agent_id: int) -> AgentSummary | None:
+        """
+        Get the rolling summary of an agent's older conversation history.
+
+        Args:
+            agent_id (int): The ID of the agent.
+
+        Returns:
+            AgentSummary | None: The summary, or None if nothing was summarized yet.
+        """
+
+        async with self.unit_of_work as uow:
+            return await uow.summaries.find_by_agent_id(agent_id)
 
-            agent.conversation_history.clear()
+    async def delete_agent_messages(self, agent_id: int) -> None:
+        """
+        Delete all messages from an agent's conversation history, along with their summary.
 
-            await uow.agents.update(agent)
+        Args:
+            agent_id (int): The ID of the agent whose messages to delete.
+        """
+
+        async with self.unit_of_work as uow:
+            await uow.messages.delete_all_by_agent_id(agent_id)
+            await uow.summaries.delete_by_agent_id(agent_id)
@@ -1,36 +1,187 @@
+import os
+
+from dotenv import load_dotenv
+
+from app.errors.state import StatePatchError, StateVersionConflictError
+from app.models.action_availability import action_availability
 from app.models.global_state import GlobalState
+from app.models.global_state_store import global_state_store
+from app.models.state_patch import JsonPatchOperation, JsonPatchTest, MergePatch
+from app.models.state_subscriptions import GLOBAL_STATE_TOPIC, state_subscriptions
+from app.repositories.state_patch import StatePatchStep, json_patch_steps, merge_patch_steps
+from app.repositories.unit_of_work import UnitOfWork
 
 from .base_service import BaseService
 
+load_dotenv()
+
 STATE_ID = 1
+# Seconds between write-behind flushes of the global state, 0 writes it through on every update
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "1"))
 
 
 class GlobalStateService(BaseService):
     async def get_state(self) -> GlobalState:
         """
-        Get the global state.
+        Get the global state, served from the in-memory store once loaded.
+        The returned state is shared with the store and must not be mutated in place.
 
         Returns:
             GlobalState: The global state object.
         """
 
-        async with self.unit_of_work as uow:
-            state = await uow.state.find_by_id(STATE_ID)
-            if state is None:
-                raise ValueError("Global state not found")
+        if not global_state_store.loaded:
+            async with global_state_store.lock:
+                await self._load_state()
 
-            return state
+        return self._stored_state()
 
-    async def update_state(self, state: GlobalState) -> GlobalState:
+    async def update_state(
+        self, state: GlobalState, expected_version: int | None = None
+    ) -> GlobalState:
         """
-        Update the global state.
+        Update the global state in the in-memory store.
+        The state is written to the database by the next flush,
+        or right away if STATE_FLUSH_INTERVAL is 0.
 
         Args:
             state (GlobalState): The new global state.
+            expected_version (int | None): The version to replace, any if None.
 
         Returns:
             GlobalState: The updated global state.
+
+        Raises:
+            StateVersionConflictError: If the version is not the expected one.
+        """
+
+        async with global_state_store.lock:
+            await self._load_state()
+            if expected_version is not None and global_state_store.version != expected_version:
+                raise StateVersionConflictError(
+                    global_state_store.version, global_state_store.state
+                )
+
+            previous_state = global_state_store.state
+            changed_keys = global_state_store.set(state.state)
+            action_availability.invalidate_state_keys(None, changed_keys)
+            state_subscriptions.record_change(
+                GLOBAL_STATE_TOPIC,
+                previous_state,
+                global_state_store.state,
+                global_state_store.version,
+            )
+
+            if STATE_FLUSH_INTERVAL == 0:
+                async with self.unit_of_work as uow:
+                    await self._flush_state(uow)
+
+            return self._stored_state()
+
+    async def flush_state(self) -> bool:
+        """
+        Write the global state to the database if it changed since the last flush.
+
+        Returns:
+            bool: Whether the state was written.
+        """
+
+        async with global_state_store.lock:
+            async with self.unit_of_work as uow:
+                return await self._flush_state(uow)
+
+    async def patch_state(
+        self, operations: list[JsonPatchOperation], expected_version: int | None = None
+    ) -> int:
+        """
+        Apply an RFC 6902 JSON Patch to the global state in a single statement.
+        Either all operations are applied or none is.
+
+        Args:
+            operations (list[JsonPatchOperation]): The patch operations.
+            expected_version (int | None): The version to patch, any if None.
+
+        Returns:
+            int: The new version of the global state.
+
+        Raises:
+            StatePatchError: If an operation cannot be applied or a test fails.
+            StateVersionConflictError: If the version is not the expected one.
+        """
+
+        return await self._patch_state(json_patch_steps(operations), expected_version)
+
+    async def merge_patch_state(
+        self, patch: MergePatch, tests: list[JsonPatchTest], expected_version: int | None = None
+    ) -> int:
         """
+        Apply an RFC 7396 JSON merge patch to the global state in a single statement.
+
+        Args:
+            patch (MergePatch): The merge patch.
+            tests (list[JsonPatchTest]): The preconditions the state has to meet.
+            expected_version (int | None): The version to patch, any if None.
+
+        Returns:
+            int: The new version of the global state.
+
+        Raises:
+            StatePatchError: If a test fails.
+            StateVersionConflictError: If the version is not the expected one.
+        """
+
+        return await self._patch_state(merge_patch_steps(patch, tests), expected_version)
+
+    async def _patch_state(self, steps: list[StatePatchStep], expected_version: int | None) -> int:
+        # The patch is applied to the persisted state, so the pending writes are flushed first
+        async with global_state_store.lock:
+            async with self.unit_of_work as uow:
+                await self._flush_state(uow)
+                result = await uow.state.patch_state(STATE_ID, steps, expected_version)
+                if result is None:
+                    raise ValueError("Global state not found")
+
+                if result.failed_step == 0:
+                    raise StateVersionConflictError(result.version, result.state)
+
+                if result.failed_step is not None:
+                    raise StatePatchError(steps[result.failed_step - 1].error)
+
+                # The patched state is only served and published once it is committed
+                def apply_patch() -> None:
+                    global_state_store.update(result.state, result.version)
+                    global_state_store.mark_persisted(result.version)
+                    action_availability.invalidate_state_keys(None, result.changed_keys)
+                    state_subscriptions.record_change(
+                        GLOBAL_STATE_TOPIC, result.previous_state, result.state, result.version
+                    )
+
+                uow.on_commit(apply_patch)
+
+                return result.version
+
+    async def _load_state(self) -> None:
+        if global_state_store.loaded:
+            return
 
         async with self.unit_of_work as uow:
-            return await uow.state.update(state)
+            state = await uow.state.find_by_id(STATE_ID)
+            if state is None:
+                raise ValueError("Global state not found")
+
+            global_state_store.load(state.state, state.version)
+
+    async def _flush_state(self, uow: UnitOfWork) -> bool:
+        if not global_state_store.dirty:
+            return False
+
+        version = global_state_store.version
+        await uow.state.save_state(STATE_ID, global_state_store.state, version)
+        uow.on_commit(lambda: global_state_store.mark_persisted(version))
+        return True
+
+    @staticmethod
+    def _stored_state() -> GlobalState:
+        return GlobalState(
+            id=STATE_ID, state=global_state_store.state, version=global_state_store.version
+        )
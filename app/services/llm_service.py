@@ -1,40 +1,178 @@
 import os
+import time
+from collections.abc import Awaitable, Callable
 
+import httpx
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_openai import ChatOpenAI
 
+from app.core.cache import LRUCache
+from app.core.metrics import llm_request_duration, llm_tokens
+from app.core.tracing import span, traced
+from app.errors.llm import LLMResponseError
+from app.llm.fake_chat_model import FakeChatModel
 from app.llm.models import ChainInput, ChainOutput
+from app.llm.streaming import ResponseTextStream
 from app.llm.system_message import SYSTEM_MESSAGE_TEMPLATE
-from app.models import Agent, AgentMessage, Player
+from app.models import Action, Agent, AgentMessage, Player
 from app.models.global_state import State
+from app.models.structured_output import ActionsFingerprint, fingerprint_actions
 
-from .action_condition_service import ActionConditionService
+from .action_availability_service import ActionAvailabilityService
+from .agent_service import AgentService
 from .base_service import BaseService
 
 load_dotenv()
 
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.8,0.5")
+FAKE_LLM_ACTION_PROBABILITY = float(os.getenv("FAKE_LLM_ACTION_PROBABILITY", "0.3"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+AGENT_CHAIN_CACHE_SIZE = int(os.getenv("AGENT_CHAIN_CACHE_SIZE", "256"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "200"))
+
+AgentChain = Runnable[ChainInput, ChainOutput]
+ResponseDeltaCallback = Callable[[str], Awaitable[None]]
+
+AGENT_PROMPT = ChatPromptTemplate(
+    [
+        ("system", SYSTEM_MESSAGE_TEMPLATE),
+        MessagesPlaceholder("conversation_history"),
+        ("human", "{query}"),
+    ]
+)
+
+
+class ChatModelRegistry:
+    """
+    Process-wide chat models by model name, sharing one pooled HTTP client.
+    Chat models of the configured provider are created on first use: OpenAI chat models,
+    or with the fake provider, local fakes answering without any LLM for load tests.
+    Other chat models can be registered under a model name.
+    """
+
+    def __init__(self) -> None:
+        self._chat_models: dict[str, BaseChatModel] = {}
+        self._http_client: httpx.AsyncClient | None = None
+
+    def get(self, model: str) -> BaseChatModel:
+        """
+        Get the chat model for the given model name, creating it on first use.
+
+        Args:
+            model (str): The name of the model.
+
+        Returns:
+            BaseChatModel: The shared chat model.
+        """
+
+        chat_model = self._chat_models.get(model)
+        if chat_model is not None:
+            return chat_model
+
+        if LLM_PROVIDER == "fake":
+            chat_model = FakeChatModel(
+                model_name=model,
+                latency=FAKE_LLM_LATENCY,
+                action_probability=FAKE_LLM_ACTION_PROBABILITY,
+                seed=FAKE_LLM_SEED,
+            )
+            self._chat_models[model] = chat_model
+            return chat_model
+
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=LLM_REQUEST_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+
+        chat_model = ChatOpenAI(
+            model=model, timeout=LLM_REQUEST_TIMEOUT, http_async_client=self._http_client
+        )
+        self._chat_models[model] = chat_model
+        return chat_model
+
+    def register(self, model: str, chat_model: BaseChatModel) -> None:
+        """
+        Register the chat model to use for the given model name.
+
+        Args:
+            model (str): The name of the model.
+            chat_model (BaseChatModel): The chat model to use.
+        """
+
+        self._chat_models[model] = chat_model
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and forget the chat models."""
+
+        self._chat_models.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+
+chat_models = ChatModelRegistry()
+
+# Compiled chains by agent ID, fingerprint of the available actions, model name and identity
+# of the chat model, so that chains of chat models since registered or closed are not reused
+agent_chain_cache: LRUCache[tuple[int, ActionsFingerprint, str, int], AgentChain] = LRUCache(
+    AGENT_CHAIN_CACHE_SIZE
+)
 
 
 class LLMService(BaseService):
+    @traced()
     async def query_agent(
-        self, agent: Agent, query: str, caller: Player | Agent, global_state: State
+        self,
+        agent: Agent,
+        query: str,
+        caller: Player | Agent,
+        global_state: State,
+        on_response_delta: ResponseDeltaCallback | None = None,
     ) -> ChainOutput:
         """
         Queries an agent.
+        All database reads are finished before the LLM is invoked, so the service should be
+        used outside of an open unit of work to not hold a connection while waiting for the LLM.
 
         Args:
             agent (Agent): The agent to query.
             query (str): The query to send to the agent.
             caller (Player | Agent): The caller of the agent.
             global_state (State): The current global state.
+            on_response_delta (ResponseDeltaCallback | None):
+                Called with the text added to the response as the LLM streams it, if given.
 
         Returns:
             ChainOutput: The response from the agent.
         """
 
+        async with self.unit_of_work as uow:
+            available_actions = await ActionAvailabilityService(uow).get_available_actions(
+                agent.actions
+            )
+            agent_service = AgentService(uow)
+            summary = await agent_service.get_agent_summary(agent.id)
+            conversation_history = await agent_service.get_conversation_history(
+                agent,
+                HISTORY_MAX_MESSAGES,
+                after=summary.last_message_position if summary is not None else None,
+            )
+            conversation_history_messages = await self.to_llm_messages(conversation_history)
+
         chain_input = ChainInput(
             query=str({"caller": caller.to_details(), "query": query}),
             instructions=agent.instructions or "",
@@ -46,52 +184,120 @@ class LLMService(BaseService):
                 for action in agent.actions
                 if action.triggered_agent is not None
             },
+            conversation_summary=summary.summary if summary is not None else "",
+            conversation_history=conversation_history_messages,
         )
 
-        chain = await self._create_agent_chain(agent)
-        return await chain.ainvoke(chain_input)
+        chain = self._get_agent_chain(agent, available_actions)
+        usage = UsageMetadataCallbackHandler()
+        config = RunnableConfig(callbacks=[usage])
+
+        start = time.perf_counter()
+        try:
+            with span("llm", agent_id=agent.id, stream=on_response_delta is not None):
+                if on_response_delta is None:
+                    return await chain.ainvoke(chain_input, config)
+
+                return await self._stream_agent_chain(chain, chain_input, config, on_response_delta)
+        finally:
+            llm_request_duration.observe(time.perf_counter() - start, agent.id)
+            for model_usage in usage.usage_metadata.values():
+                llm_tokens.inc(agent.id, "input", amount=model_usage["input_tokens"])
+                llm_tokens.inc(agent.id, "output", amount=model_usage["output_tokens"])
 
-    async def _create_agent_chain(self, agent: Agent) -> Runnable[ChainInput, ChainOutput]:
+    async def _stream_agent_chain(
+        self,
+        chain: AgentChain,
+        chain_input: ChainInput,
+        config: RunnableConfig,
+        on_response_delta: ResponseDeltaCallback,
+    ) -> ChainOutput:
         """
-        Creates an LLM chain for the given agent.
+        Runs the chain streaming the tokens of the chat model, whose structured output parser
+        only parses the complete response, and passes the response text on as it is generated.
 
         Args:
-            agent (Agent): The agent to create the chain for.
+            chain (AgentChain): The chain to run.
+            chain_input (ChainInput): The input of the chain.
+            config (RunnableConfig): The config of the run.
+            on_response_delta (ResponseDeltaCallback): Called with the text added to the response.
 
         Returns:
-            Runnable[ChainInput, ChainOutput]: The created chain.
+            ChainOutput: The parsed response of the chain.
+
+        Raises:
+            LLMResponseError: If the stream ended without the parsed response of the chain.
         """
 
-        async with self.unit_of_work as uow:
-            chat_model = ChatOpenAI(model=OPENAI_MODEL)
-
-            players, agents = await self._get_agent_conversation_history_callers(agent)
-
-            prompt = ChatPromptTemplate(
-                [
-                    ("system", SYSTEM_MESSAGE_TEMPLATE),
-                    *[
-                        message
-                        for agent_message in agent.conversation_history
-                        for message in agent_message.to_llm_messages(
-                            caller=self._find_message_caller(agent_message, players, agents)
-                        )
-                    ],
-                    ("human", "{query}"),
-                ]
-            )
+        response_stream = ResponseTextStream()
+        output = None
 
-            available_actions = [
-                action
-                for action in agent.actions
-                if await ActionConditionService(uow).evaluate_conditions(action)
-            ]
+        async for event in chain.astream_events(chain_input, config, version="v2"):
+            if event["event"] == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                delta = response_stream.feed(content) if isinstance(content, str) else ""
+                if delta:
+                    await on_response_delta(delta)
+            elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                output = event["data"]["output"]
 
-            chat_model = chat_model.with_structured_output(
-                agent.to_structured_output(available_actions), method="json_schema", strict=True
+        if not isinstance(output, ChainOutput):
+            raise LLMResponseError(
+                "The response stream of the chain ended without a parsed response, "
+                f"got {type(output).__name__}"
             )
 
-            return prompt | chat_model
+        return output
+
+    @traced()
+    def _get_agent_chain(self, agent: Agent, available_actions: list[Action]) -> AgentChain:
+        """
+        Gets the LLM chain for the given agent and available actions.
+        The chains only depend on the chat model and the structured output, as everything
+        else is passed in the chain input, so they are compiled once and cached.
+
+        Args:
+            agent (Agent): The agent to get the chain for.
+            available_actions (list[Action]): The actions available to the agent.
+
+        Returns:
+            AgentChain: The compiled chain.
+        """
+
+        chat_model = chat_models.get(OPENAI_MODEL)
+        key = (agent.id, fingerprint_actions(available_actions), OPENAI_MODEL, id(chat_model))
+        chain = agent_chain_cache.get(key)
+        if chain is not None:
+            return chain
+
+        structured_chat_model = chat_model.with_structured_output(
+            agent.to_structured_output(available_actions), method="json_schema", strict=True
+        )
+        chain = AGENT_PROMPT | structured_chat_model
+        agent_chain_cache.set(key, chain)
+
+        return chain
+
+    async def to_llm_messages(self, conversation_history: list[AgentMessage]) -> list[BaseMessage]:
+        """
+        Converts the given conversation history messages to LLM messages.
+
+        Args:
+            conversation_history (list[AgentMessage]): The messages to convert.
+
+        Returns:
+            list[BaseMessage]: The LLM messages, a query and a response for each message.
+        """
+
+        players, agents = await self._get_conversation_history_callers(conversation_history)
+
+        return [
+            message
+            for agent_message in conversation_history
+            for message in agent_message.to_llm_messages(
+                caller=self._find_message_caller(agent_message, players, agents)
+            )
+        ]
 
     def _find_message_caller(
         self, message: AgentMessage, players: list[Player], agents: list[Agent]
@@ -114,28 +320,27 @@ class LLMService(BaseService):
             return next((a for a in agents if a.id == message.caller_agent_id), None)
         return None
 
-    async def _get_agent_conversation_history_callers(
-        self, agent: Agent
+    async def _get_conversation_history_callers(
+        self, conversation_history: list[AgentMessage]
     ) -> tuple[list[Player], list[Agent]]:
         """
-        Gets the players and agents that have interacted with the given agent.
+        Gets the players and agents that have sent the given messages.
 
         Args:
-            agent (Agent): The agent to get the conversation history callers for.
+            conversation_history (list[AgentMessage]): The messages to get the callers for.
 
         Returns:
-            tuple[list[Player], list[Agent]]:
-                The players and agents that have interacted with the agent.
+            tuple[list[Player], list[Agent]]: The players and agents that have sent the messages.
         """
 
         agent_ids = [
             message.caller_agent_id
-            for message in agent.conversation_history
+            for message in conversation_history
             if message.caller_agent_id is not None
         ]
         player_ids = [
             message.caller_player_id
-            for message in agent.conversation_history
+            for message in conversation_history
             if message.caller_player_id is not None
         ]
 
@@ -0,0 +1,223 @@
+import asyncio
+import gzip
+import os
+from datetime import UTC, datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from app.models.agent_message_partition import (
+    PARTITION_NAME_PATTERN,
+    PARTITIONED_TABLE,
+    AgentMessagePartition,
+)
+
+from .base_service import BaseService
+
+load_dotenv()
+
+MESSAGE_RETENTION_DAYS = (
+    int(os.environ["MESSAGE_RETENTION_DAYS"]) if os.getenv("MESSAGE_RETENTION_DAYS") else None
+)
+MESSAGE_ARCHIVE_DIR = Path(os.getenv("MESSAGE_ARCHIVE_DIR", "archive"))
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "2"))
+
+ARCHIVE_SUFFIX = ".jsonl.gz"
+ARCHIVE_BATCH_SIZE = 1000
+
+
+class MessageArchiveService(BaseService):
+    async def create_upcoming_partitions(
+        self, now: datetime | None = None
+    ) -> list[AgentMessagePartition]:
+        """
+        Create the missing monthly partitions of the agent message table, from the current
+        month up to the configured number of months ahead, so that new messages never
+        land in the default partition.
+
+        Args:
+            now (datetime | None): The current time, defaults to now.
+
+        Returns:
+            list[AgentMessagePartition]: The created partitions.
+        """
+
+        partition = AgentMessagePartition.of(now or datetime.now(UTC))
+        upcoming = [partition]
+        for _ in range(MESSAGE_PARTITIONS_AHEAD):
+            partition = partition.next()
+            upcoming.append(partition)
+
+        async with self.unit_of_work as uow:
+            existing = set(await uow.partitions.find_all())
+            created = [partition for partition in upcoming if partition not in existing]
+            for partition in created:
+                await uow.partitions.create(partition)
+
+        return created
+
+    async def find_expired_partitions(
+        self, now: datetime | None = None
+    ) -> list[AgentMessagePartition]:
+        """
+        Find the partitions whose messages all outlived their retention. A message is kept
+        for the longest retention of the agents of its conversation, either their own
+        or the default one, and forever if neither is set.
+
+        Args:
+            now (datetime | None): The current time, defaults to now.
+
+        Returns:
+            list[AgentMessagePartition]: The expired partitions, oldest first.
+        """
+
+        now = now or datetime.now(UTC)
+
+        async with self.unit_of_work as uow:
+            partitions = await uow.partitions.find_all()
+            retention_days_by_partition = await uow.partitions.find_retention_days_by_partition(
+                AgentMessagePartition.of(now).start
+            )
+
+        expired = []
+        for partition in partitions:
+            if partition.end > now:
+                break
+
+            retention_days = [
+                days if days is not None else MESSAGE_RETENTION_DAYS
+                for days in retention_days_by_partition.get(partition, [])
+            ] or [MESSAGE_RETENTION_DAYS]
+            if None in retention_days:
+                continue
+
+            if partition.end + timedelta(days=max(retention_days)) <= now:
+                expired.append(partition)
+
+        return expired
+
+    async def archive_partition(
+        self, partition: AgentMessagePartition, archive_dir: Path = MESSAGE_ARCHIVE_DIR
+    ) -> Path:
+        """
+        Move the messages of a partition to a compressed JSONL file and drop the partition.
+        The partition is only dropped once the file is complete.
+
+        Args:
+            partition (AgentMessagePartition): The partition to archive.
+            archive_dir (Path): The directory of the archive files.
+
+        Returns:
+            Path: The archive file.
+        """
+
+        path = archive_dir / f"{partition.name}{ARCHIVE_SUFFIX}"
+        incomplete_path = path.with_name(f"{path.name}.part")
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+        async with self.unit_of_work as uow:
+            with gzip.open(incomplete_path, "wt", encoding="utf-8") as file:
+                batch = []
+                async for row in uow.partitions.stream_rows(partition):
+                    batch.append(f"{row}\n")
+                    if len(batch) == ARCHIVE_BATCH_SIZE:
+                        await asyncio.to_thread(file.writelines, batch)
+                        batch = []
+
+                await asyncio.to_thread(file.writelines, batch)
+
+        incomplete_path.replace(path)
+
+        # Dropped in a new transaction, as the partition is in use until its cursor is closed
+        async with self.unit_of_work as uow:
+            await uow.partitions.drop(partition)
+
+        return path
+
+    async def archive_expired_partitions(
+        self, now: datetime | None = None, archive_dir: Path = MESSAGE_ARCHIVE_DIR
+    ) -> list[Path]:
+        """
+        Archive the partitions whose messages all outlived their retention.
+
+        Args:
+            now (datetime | None): The current time, defaults to now.
+            archive_dir (Path): The directory of the archive files.
+
+        Returns:
+            list[Path]: The archive files.
+        """
+
+        return [
+            await self.archive_partition(partition, archive_dir)
+            for partition in await self.find_expired_partitions(now)
+        ]
+
+    async def archive_expired_messages(
+        self, now: datetime | None = None, archive_dir: Path = MESSAGE_ARCHIVE_DIR
+    ) -> Path | None:
+        """
+        Move the messages which outlived their retention out of the partitions which are kept,
+        as an agent with a shorter retention than the others of a partition would otherwise
+        keep its messages until the whole partition expires.
+        The messages are deleted once the file is complete.
+
+        Args:
+            now (datetime | None): The current time, defaults to now.
+            archive_dir (Path): The directory of the archive files.
+
+        Returns:
+            Path | None: The archive file, or None if no message expired.
+        """
+
+        now = now or datetime.now(UTC)
+        path = archive_dir / f"{PARTITIONED_TABLE}_expired_{now:%Y%m%dT%H%M%S}{ARCHIVE_SUFFIX}"
+        incomplete_path = path.with_name(f"{path.name}.part")
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = 0
+        async with self.unit_of_work as uow:
+            with gzip.open(incomplete_path, "wt", encoding="utf-8") as file:
+                while rows := await uow.partitions.delete_expired_rows(
+                    now, MESSAGE_RETENTION_DAYS, ARCHIVE_BATCH_SIZE
+                ):
+                    await asyncio.to_thread(file.writelines, [f"{row}\n" for row in rows])
+                    archived += len(rows)
+
+        if not archived:
+            incomplete_path.unlink()
+            return None
+
+        incomplete_path.replace(path)
+        return path
+
+    async def restore_archive(self, path: Path) -> int:
+        """
+        Load the messages of an archive file back, recreating their partition if the file
+        is the archive of a partition. Messages already present, or of agents and players
+        deleted since, are skipped.
+
+        Args:
+            path (Path): The archive file, of a partition or of expired messages.
+
+        Returns:
+            int: The number of restored messages.
+        """
+
+        name = path.name.removesuffix(ARCHIVE_SUFFIX)
+
+        async with self.unit_of_work as uow:
+            if PARTITION_NAME_PATTERN.match(name):
+                partition = AgentMessagePartition.from_name(name)
+                if partition not in await uow.partitions.find_all():
+                    await uow.partitions.create(partition)
+
+            restored = 0
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                while rows := await asyncio.to_thread(
+                    lambda: [line for line in islice(file, ARCHIVE_BATCH_SIZE) if line.strip()]
+                ):
+                    restored += await uow.partitions.insert_rows(rows)
+
+        return restored
@@ -0,0 +1,73 @@
+import os
+from datetime import UTC, datetime
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.llm.system_message import SUMMARY_SYSTEM_MESSAGE_TEMPLATE
+from app.models.agent_summary import AgentSummary
+
+from .base_service import BaseService
+from .llm_service import OPENAI_MODEL, LLMService, chat_models
+
+load_dotenv()
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", OPENAI_MODEL)
+SUMMARY_TOKEN_THRESHOLD = int(os.getenv("SUMMARY_TOKEN_THRESHOLD", "4000"))
+SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "10"))
+
+
+class SummaryService(BaseService):
+    async def summarize_conversation(self, agent_id: int) -> AgentSummary | None:
+        """
+        Fold the older messages of an agent's conversation history into its rolling summary,
+        once the messages which are not summarized yet exceed the token threshold.
+        The newest messages are kept out of the summary, to be put into the prompt as they are.
+        The LLM is invoked outside of any open unit of work.
+
+        Args:
+            agent_id (int): The ID of the agent.
+
+        Returns:
+            AgentSummary | None: The updated summary, or None if no summarization was needed.
+        """
+
+        async with self.unit_of_work as uow:
+            summary = await uow.summaries.find_by_agent_id(agent_id)
+            after = summary.last_message_position if summary is not None else None
+
+            tokens = await uow.messages.sum_estimated_tokens(agent_id, after)
+            if tokens < SUMMARY_TOKEN_THRESHOLD:
+                return None
+
+            messages = await uow.messages.find_all_by_agent_id(agent_id, after)
+            messages = messages[:-SUMMARY_KEEP_MESSAGES] if SUMMARY_KEEP_MESSAGES else messages
+            if not messages:
+                return None
+
+            conversation = await LLMService(uow).to_llm_messages(messages)
+
+        previous_summary = summary.summary if summary is not None else ""
+        response = await chat_models.get(SUMMARY_MODEL).ainvoke(
+            [
+                SystemMessage(SUMMARY_SYSTEM_MESSAGE_TEMPLATE.format(summary=previous_summary)),
+                *conversation,
+                HumanMessage("Update the summary with the conversation above."),
+            ]
+        )
+
+        last_message = messages[-1]
+        summary_update = {
+            "summary": response.text(),
+            "last_message_id": last_message.id,
+            "last_message_timestamp": last_message.timestamp,
+            "updated_at": datetime.now(UTC),
+        }
+
+        async with self.unit_of_work as uow:
+            summary = await uow.summaries.find_by_agent_id(agent_id)
+            if summary is None:
+                return await uow.summaries.create(AgentSummary(agent_id=agent_id, **summary_update))
+
+            summary.sqlmodel_update(summary_update)
+            return await uow.summaries.update(summary)
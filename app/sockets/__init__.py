@@ -1,4 +1,4 @@
-from . import agent, auth, state
+from . import agent, auth, state, subscriptions
 from .server import sio
 
-__all__ = ("sio", "agent", "auth", "state")
+__all__ = ("sio", "agent", "auth", "state", "subscriptions")
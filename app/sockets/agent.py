@@ -1,33 +1,148 @@
+import asyncio
 import logging
+import os
+from contextlib import nullcontext
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
 import pydantic
+from dotenv import load_dotenv
 
+from app.core.tracing import TRACING_ENABLED, export_trace, span, start_trace, traced
 from app.errors.conditions import ConditionEvaluationError
-from app.models import Agent, GlobalState
+from app.models import Agent, GlobalState, Player
 from app.models.agent_message import AgentMessage
 from app.repositories.unit_of_work import UnitOfWork
 from app.services.agent_service import AgentService
 from app.services.global_state_service import GlobalStateService
 from app.services.llm_service import LLMService
 from app.services.player_service import PlayerService
+from app.workers.summarization_worker import summarization_worker
 
-from .models import AgentQueryRequest, AgentQueryResponse
+from .models import (
+    ActionQueryResponse,
+    AgentQueryRequest,
+    AgentQueryResponse,
+    AgentResponseDeltaEvent,
+    AgentResponseTimingEvent,
+    SpectateAgentRequest,
+    SpectatePlayerRequest,
+)
 from .server import sio
 
+load_dotenv()
+
+TRIGGER_AGENTS_CONCURRENCY = int(os.getenv("TRIGGER_AGENTS_CONCURRENCY", "4"))
+
 logger = logging.getLogger(__name__)
 
 
+def agent_room(agent_id: int) -> str:
+    """The Socket.IO room of the clients spectating the agent."""
+
+    return f"agent:{agent_id}"
+
+
+def player_room(player_id: int) -> str:
+    """The Socket.IO room of the clients spectating the player."""
+
+    return f"player:{player_id}"
+
+
+def query_recipients(sid: str, agent: Agent, player: Player) -> list[str]:
+    """The caller of the query and the spectators of the queried agent and of the player."""
+
+    return [sid, agent_room(agent.id), player_room(player.id)]
+
+
+@sio.on("spectate_agent")
+async def spectate_agent(sid: str, data: Any) -> dict[str, Any]:
+    """Joins the room receiving the responses of an agent to any caller."""
+
+    try:
+        request = SpectateAgentRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await sio.enter_room(sid, agent_room(request.agent_id))
+    return request.model_dump()
+
+
+@sio.on("stop_spectating_agent")
+async def stop_spectating_agent(sid: str, data: Any) -> dict[str, Any]:
+    """Leaves the room receiving the responses of an agent."""
+
+    try:
+        request = SpectateAgentRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await sio.leave_room(sid, agent_room(request.agent_id))
+    return request.model_dump()
+
+
+@sio.on("spectate_player")
+async def spectate_player(sid: str, data: Any) -> dict[str, Any]:
+    """Joins the room receiving the responses to the queries of a player."""
+
+    try:
+        request = SpectatePlayerRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await sio.enter_room(sid, player_room(request.player_id))
+    return request.model_dump()
+
+
+@sio.on("stop_spectating_player")
+async def stop_spectating_player(sid: str, data: Any) -> dict[str, Any]:
+    """Leaves the room receiving the responses to the queries of a player."""
+
+    try:
+        request = SpectatePlayerRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await sio.leave_room(sid, player_room(request.player_id))
+    return request.model_dump()
+
+
 @sio.on("query_agent")
 async def query_agent(sid: str, data: Any) -> dict[str, Any]:
-    """Queries an agent."""
+    """
+    Queries an agent.
+    The query is split into short read and write transactions around the LLM calls,
+    so that no database connection is held while waiting for the LLM.
+    Responses are sent to the caller and to the spectators of the agents and of the player only.
+    If requested, the text of the queried agent's response is streamed as agent_response_delta
+    events while it is generated, before the complete agent_response with the actions.
+    The query is traced if a trace export is configured, or if its caller requested
+    the time spent in each step as an agent_response_timing event.
+    """
 
     try:
         request = AgentQueryRequest.model_validate(data)
     except pydantic.ValidationError:
         return {"error": "Validation error."}
 
+    query_id = uuid4()
+    tracing = TRACING_ENABLED or request.timing
+
+    with start_trace(query_id) if tracing else nullcontext() as trace:
+        with span("query_agent", agent_id=request.agent_id, player_id=request.player_id):
+            result = await _query_agent(sid, request, query_id)
+
+    if trace is not None:
+        await export_trace(trace)
+
+    if request.timing:
+        timing = AgentResponseTimingEvent(query_id=query_id, spans=trace.to_tree())
+        await sio.emit("agent_response_timing", timing.model_dump(), to=sid)
+
+    return result
+
+
+async def _query_agent(sid: str, request: AgentQueryRequest, query_id: UUID) -> dict[str, Any]:
     async with UnitOfWork() as uow:
         agent = await AgentService(uow).get_populated_agent(request.agent_id)
         if agent is None:
@@ -39,93 +154,177 @@ async def query_agent(sid: str, data: Any) -> dict[str, Any]:
 
         global_state = await GlobalStateService(uow).get_state()
 
-        try:
-            llm_response = await LLMService(uow).query_agent(
-                agent, request.query, player, global_state.state
-            )
-        except ConditionEvaluationError as e:
-            await sio.emit("agent_response_error", {"error": f"Condition evaluation error: {e}"})
-            return {"success": False}
-        except Exception as e:
-            logger.exception(e)
-            await sio.emit("agent_response_error", {"error": f"Internal server error: {e}"})
-            return {"success": False}
-
-        response = AgentQueryResponse.from_llm_response(agent, llm_response)
-
-        await sio.emit("agent_response", response.model_dump())
-        message = AgentMessage(
-            agent_id=agent.id,
-            caller_player_id=player.id,
-            query=request.query,
-            response=response.to_message_response(),
+    recipients = query_recipients(sid, agent, player)
+
+    async def emit_response_delta(delta: str) -> None:
+        event = AgentResponseDeltaEvent(query_id=query_id, agent_id=agent.id, delta=delta)
+        await sio.emit("agent_response_delta", event.model_dump(), to=recipients)
+
+    try:
+        llm_response = await LLMService().query_agent(
+            agent,
+            request.query,
+            player,
+            global_state.state,
+            on_response_delta=emit_response_delta if request.stream else None,
+        )
+    except ConditionEvaluationError as e:
+        await sio.emit(
+            "agent_response_error",
+            {"error": f"Condition evaluation error: {e}"},
+            to=recipients,
         )
+        return {"success": False}
+    except Exception as e:
+        logger.exception(e)
+        await sio.emit(
+            "agent_response_error", {"error": f"Internal server error: {e}"}, to=recipients
+        )
+        return {"success": False}
+
+    response = AgentQueryResponse.from_llm_response(agent, llm_response)
+    response.query_id = query_id
 
-        await AgentService(uow).add_agent_message(message)
+    await sio.emit("agent_response", response.model_dump(), to=recipients)
+    message = AgentMessage(
+        agent_id=agent.id,
+        caller_player_id=player.id,
+        query=request.query,
+        response=response.to_message_response(),
+    )
 
-        result = await _trigger_agents(response.query_id, agent, global_state, response, uow)
+    await AgentService().add_agent_message(message)
+    summarization_worker.enqueue(agent.id)
 
-    await sio.emit("agent_response_end", {"query_id": str(response.query_id)})
+    result = await _trigger_agents(response.query_id, agent, global_state, response, recipients)
+
+    await sio.emit("agent_response_end", {"query_id": str(response.query_id)}, to=recipients)
     return {"success": result}
 
 
+@traced()
 async def _trigger_agents(
     query_id: UUID,
     agent: Agent,
     global_state: GlobalState,
     response: AgentQueryResponse,
-    uow: UnitOfWork,
+    recipients: list[str],
 ) -> bool:
     """
-    Triggers agents recursively.
+    Triggers agents level by level, querying the sibling agents of each level concurrently.
+    Responses of a level are emitted in the order of the actions which triggered them,
+    before any response of the next level. A failed agent does not stop its siblings.
+    The responses are emitted to the recipients of the query and the spectators of their agent.
     Returns whether all agents were triggered successfully.
     """
 
-    agents_to_trigger = []
-    for action_response in response.actions:
-        action = next(a for a in agent.actions if a.name == action_response.name)
-        if action.triggered_agent_id is None:
-            continue
+    semaphore = asyncio.Semaphore(TRIGGER_AGENTS_CONCURRENCY)
+    success = True
+
+    level = [(agent, response)]
+    while level:
+        triggers = [
+            (caller, action_response)
+            for caller, caller_response in level
+            for action_response in caller_response.actions
+            if action_response.triggered_agent_id is not None
+        ]
+        results = await asyncio.gather(
+            *(
+                _query_triggered_agent(query_id, caller, action_response, global_state, semaphore)
+                for caller, action_response in triggers
+            ),
+            return_exceptions=True,
+        )
+
+        # A cancelled branch, like any exception which is not an error, cancels the cascade
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+
+        level = []
+        messages = []
+        for (caller, action_response), result in zip(triggers, results, strict=True):
+            if isinstance(result, ConditionEvaluationError):
+                await sio.emit(
+                    "agent_response_error",
+                    {"error": f"Condition evaluation error: {result}"},
+                    to=recipients,
+                )
+                success = False
+                continue
 
-        triggered_agent = await AgentService(uow).get_populated_agent(action.triggered_agent_id)
+            if isinstance(result, Exception):
+                logger.exception(result)
+                await sio.emit(
+                    "agent_response_error",
+                    {"error": f"Internal server error: {result}"},
+                    to=recipients,
+                )
+                success = False
+                continue
+
+            if result is None:
+                continue
+
+            triggered_agent, triggered_response = result
+
+            await sio.emit(
+                "agent_response",
+                triggered_response.model_dump(),
+                to=[*recipients, agent_room(triggered_agent.id)],
+            )
+            messages.append(
+                AgentMessage(
+                    agent_id=triggered_agent.id,
+                    caller_agent_id=caller.id,
+                    query=str(action_response.params),
+                    response=triggered_response.to_message_response(),
+                )
+            )
+            level.append((triggered_agent, triggered_response))
+
+        async with UnitOfWork() as uow:
+            for message in messages:
+                await AgentService(uow).add_agent_message(message)
+
+        for message in messages:
+            summarization_worker.enqueue(message.agent_id)
+            summarization_worker.enqueue(message.caller_agent_id)
+
+    return success
+
+
+@traced()
+async def _query_triggered_agent(
+    query_id: UUID,
+    caller: Agent,
+    action_response: ActionQueryResponse,
+    global_state: GlobalState,
+    semaphore: asyncio.Semaphore,
+) -> tuple[Agent, AgentQueryResponse] | None:
+    """
+    Queries the agent triggered by the given action response.
+    Returns the triggered agent with its response, or None if the agent was not found.
+    """
+
+    async with semaphore:
+        triggered_agent = await AgentService().get_populated_agent(
+            action_response.triggered_agent_id
+        )
         if triggered_agent is None:
             logger.warning(
-                f"Triggered agent with id {action.triggered_agent_id} not found. "
+                f"Triggered agent with id {action_response.triggered_agent_id} not found. "
                 f"This should never happen."
             )
-            continue
+            return None
 
-        logger.debug(f"Triggering agent {triggered_agent.name} from action {action.name}")
+        logger.debug(f"Triggering agent {triggered_agent.name} from action {action_response.name}")
 
-        try:
-            llm_response = await LLMService(uow).query_agent(
-                triggered_agent, str(action_response.params), agent, global_state.state
-            )
-        except ConditionEvaluationError as e:
-            await sio.emit("agent_response_error", {"error": f"Condition evaluation error: {e}"})
-            return False
-        except Exception as e:
-            logger.exception(e)
-            await sio.emit("agent_response_error", {"error": f"Internal server error: {e}"})
-            return False
-
-        response = AgentQueryResponse.from_llm_response(triggered_agent, llm_response)
-        response.query_id = query_id
-
-        await sio.emit("agent_response", response.model_dump())
-        message = AgentMessage(
-            agent_id=triggered_agent.id,
-            caller_agent_id=agent.id,
-            query=str(action_response.params),
-            response=response.to_message_response(),
+        llm_response = await LLMService().query_agent(
+            triggered_agent, str(action_response.params), caller, global_state.state
         )
 
-        await AgentService(uow).add_agent_message(message)
-
-        agents_to_trigger.append((triggered_agent, response))
-
-    results = [
-        await _trigger_agents(query_id, agent, global_state, response, uow)
-        for agent, response in agents_to_trigger
-    ]
-    return all(results)
+    response = AgentQueryResponse.from_llm_response(triggered_agent, llm_response)
+    response.query_id = query_id
+    return triggered_agent, response
@@ -1,18 +1,45 @@
 from typing import Any
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel, field_serializer
+from pydantic import BaseModel, field_serializer, field_validator
 
 from app.llm.models import ChainOutput
 from app.models import Agent
 from app.models.agent_message import ActionResponseDict, QueryResponseDict
 from app.models.global_state import State
+from app.models.state_patch import (
+    JsonPatchOperation,
+    JsonPatchTest,
+    MergePatch,
+    parse_json_pointer,
+)
 
 
 class AgentQueryRequest(BaseModel):
     agent_id: int
     player_id: int
     query: str
+    stream: bool = False
+    timing: bool = False
+
+
+class AgentResponseDeltaEvent(BaseModel):
+    query_id: UUID
+    agent_id: int
+    delta: str
+
+    @field_serializer("query_id")
+    def serialize_query_id(self, value: UUID) -> str:
+        return str(value)
+
+
+class AgentResponseTimingEvent(BaseModel):
+    query_id: UUID
+    spans: list[dict[str, Any]]
+
+    @field_serializer("query_id")
+    def serialize_query_id(self, value: UUID) -> str:
+        return str(value)
 
 
 class ActionQueryResponse(BaseModel):
@@ -67,12 +94,48 @@ class AgentQueryResponse(BaseModel):
 
 class UpdateStateRequest(BaseModel):
     state: State
+    expected_version: int | None = None
 
 
 class UpdateAgentStateRequest(BaseModel):
     agent_id: int
     state: State
     internal: bool
+    expected_version: int | None = None
+
+
+class PatchStateRequest(BaseModel):
+    operations: list[JsonPatchOperation]
+    expected_version: int | None = None
+
+
+class MergePatchStateRequest(BaseModel):
+    patch: MergePatch
+    test: list[JsonPatchTest] = []
+    expected_version: int | None = None
+
+
+class PatchAgentStateRequest(PatchStateRequest):
+    agent_id: int
+    internal: bool
+
+
+class MergePatchAgentStateRequest(MergePatchStateRequest):
+    agent_id: int
+    internal: bool
+
+
+class StateVersionResponse(BaseModel):
+    version: int
+
+
+class VersionedStateResponse(BaseModel):
+    state: State
+    version: int
+
+
+class StateVersionConflictResponse(VersionedStateResponse):
+    error: str
 
 
 class AgentStateRequest(BaseModel):
@@ -84,5 +147,36 @@ class AgentCombinedStateRequest(BaseModel):
     agent_id: int
 
 
+class SpectateAgentRequest(BaseModel):
+    agent_id: int
+
+
+class SpectatePlayerRequest(BaseModel):
+    player_id: int
+
+
+class SubscribeStateRequest(BaseModel):
+    path: str = ""
+
+    @field_validator("path")
+    @classmethod
+    def validate_pointer(cls, pointer: str) -> str:
+        parse_json_pointer(pointer)
+        return pointer
+
+
+class SubscribeAgentStateRequest(SubscribeStateRequest):
+    agent_id: int
+    internal: bool
+
+
+class StateChangedEvent(BaseModel):
+    agent_id: int | None
+    internal: bool
+    path: str
+    version: int
+    operations: list[dict]
+
+
 class AuthPayload(BaseModel):
     access_token: str
@@ -1,3 +1,36 @@
+import functools
+import time
+from collections.abc import Callable
+from typing import Any
+
 import socketio
 
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+from app.core.metrics import count_statements, record_statements, socketio_event_duration
+
+
+class MeasuredServer(socketio.AsyncServer):
+    """
+    A Socket.IO server measuring the duration and SQL statements of its event handlers.
+    The decorated handlers are replaced by the measured ones, so they are also measured
+    when called directly.
+    """
+
+    def on(self, event: str, handler: Callable | None = None, namespace: str | None = None) -> Any:
+        if handler is None:
+            return lambda handler: self.on(event, handler, namespace)
+
+        @functools.wraps(handler)
+        async def measured_handler(*args: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                with count_statements() as statements:
+                    return await handler(*args)
+            finally:
+                socketio_event_duration.observe(time.perf_counter() - start, event)
+                record_statements(f"socketio {event}", statements)
+
+        super().on(event, measured_handler, namespace)
+        return measured_handler
+
+
+sio = MeasuredServer(async_mode="asgi", cors_allowed_origins="*")
@@ -2,17 +2,34 @@ from typing import Any
 
 import pydantic
 
+from app.errors.api import NotFoundError
+from app.errors.state import StatePatchError, StateVersionConflictError
 from app.repositories.unit_of_work import UnitOfWork
+from app.services.action_availability_service import ActionAvailabilityService
 from app.services.agent_service import AgentService
 from app.services.global_state_service import GlobalStateService
 
 from .models import (
     AgentCombinedStateRequest,
     AgentStateRequest,
+    MergePatchAgentStateRequest,
+    MergePatchStateRequest,
+    PatchAgentStateRequest,
+    PatchStateRequest,
+    StateVersionConflictResponse,
+    StateVersionResponse,
     UpdateAgentStateRequest,
     UpdateStateRequest,
+    VersionedStateResponse,
 )
 from .server import sio
+from .subscriptions import broadcast_state_changes
+
+
+def version_conflict_response(error: StateVersionConflictError) -> dict[str, Any]:
+    return StateVersionConflictResponse(
+        error=str(error), state=error.state, version=error.version
+    ).model_dump()
 
 
 @sio.on("update_global_state")
@@ -24,14 +41,65 @@ async def update_global_state(sid: str, data: Any) -> dict[str, Any]:
     except pydantic.ValidationError:
         return {"error": "Validation error."}
 
-    async with UnitOfWork() as uow:
-        global_state = await GlobalStateService(uow).get_state()
-        global_state.state = request.state
-        await GlobalStateService(uow).update_state(global_state)
-
+    try:
+        async with UnitOfWork() as uow:
+            global_state = await GlobalStateService(uow).get_state()
+            global_state.state = request.state
+            await GlobalStateService(uow).update_state(global_state, request.expected_version)
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
     return request.model_dump()
 
 
+@sio.on("patch_global_state")
+async def patch_global_state(sid: str, data: Any) -> dict[str, Any]:
+    """Applies a JSON Patch to the global state."""
+
+    try:
+        request = PatchStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    try:
+        version = await GlobalStateService().patch_state(
+            request.operations, request.expected_version
+        )
+    except StatePatchError as e:
+        return {"error": str(e)}
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
+    return StateVersionResponse(version=version).model_dump()
+
+
+@sio.on("merge_patch_global_state")
+async def merge_patch_global_state(sid: str, data: Any) -> dict[str, Any]:
+    """Applies a JSON merge patch to the global state."""
+
+    try:
+        request = MergePatchStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    try:
+        version = await GlobalStateService().merge_patch_state(
+            request.patch, request.test, request.expected_version
+        )
+    except StatePatchError as e:
+        return {"error": str(e)}
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
+    return StateVersionResponse(version=version).model_dump()
+
+
 @sio.on("get_global_state")
 async def get_global_state(sid: str) -> dict[str, Any]:
     """Gets the global state."""
@@ -40,6 +108,16 @@ async def get_global_state(sid: str) -> dict[str, Any]:
     return global_state.state
 
 
+@sio.on("get_versioned_global_state")
+async def get_versioned_global_state(sid: str) -> dict[str, Any]:
+    """Gets the global state together with its version, for compare-and-set updates."""
+
+    global_state = await GlobalStateService().get_state()
+    return VersionedStateResponse(
+        state=global_state.state, version=global_state.version
+    ).model_dump()
+
+
 @sio.on("update_agent_state")
 async def update_agent_state(sid: str, data: Any) -> dict[str, Any]:
     """Updates an Agent's state."""
@@ -49,19 +127,68 @@ async def update_agent_state(sid: str, data: Any) -> dict[str, Any]:
     except pydantic.ValidationError:
         return {"error": "Validation error."}
 
-    async with UnitOfWork() as uow:
-        agent = await AgentService(uow).get_agent_by_id(request.agent_id)
-        if agent is None:
-            return {"error": f"Agent with id {request.agent_id} not found"}
+    try:
+        await AgentService().update_agent_state(
+            request.agent_id, request.state, request.internal, request.expected_version
+        )
+    except NotFoundError as e:
+        return {"error": str(e)}
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
+    return request.model_dump()
 
-        if request.internal:
-            agent.internal_state = request.state
-        else:
-            agent.external_state = request.state
 
-        await uow.agents.update(agent)
+@sio.on("patch_agent_state")
+async def patch_agent_state(sid: str, data: Any) -> dict[str, Any]:
+    """Applies a JSON Patch to an Agent's state."""
 
-    return request.model_dump()
+    try:
+        request = PatchAgentStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    try:
+        version = await AgentService().patch_agent_state(
+            request.agent_id, request.internal, request.operations, request.expected_version
+        )
+    except (NotFoundError, StatePatchError) as e:
+        return {"error": str(e)}
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
+    return StateVersionResponse(version=version).model_dump()
+
+
+@sio.on("merge_patch_agent_state")
+async def merge_patch_agent_state(sid: str, data: Any) -> dict[str, Any]:
+    """Applies a JSON merge patch to an Agent's state."""
+
+    try:
+        request = MergePatchAgentStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    try:
+        version = await AgentService().merge_patch_agent_state(
+            request.agent_id,
+            request.internal,
+            request.patch,
+            request.test,
+            request.expected_version,
+        )
+    except (NotFoundError, StatePatchError) as e:
+        return {"error": str(e)}
+    except StateVersionConflictError as e:
+        return version_conflict_response(e)
+
+    await ActionAvailabilityService().refresh_stale_actions()
+    await broadcast_state_changes()
+    return StateVersionResponse(version=version).model_dump()
 
 
 @sio.on("get_agent_state")
@@ -81,6 +208,24 @@ async def get_agent_state(sid: str, data: Any) -> dict[str, Any]:
     return agent.internal_state if request.internal else agent.external_state
 
 
+@sio.on("get_versioned_agent_state")
+async def get_versioned_agent_state(sid: str, data: Any) -> dict[str, Any]:
+    """Gets an Agent's state together with its version, for compare-and-set updates."""
+
+    try:
+        request = AgentStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    async with UnitOfWork() as uow:
+        agent = await AgentService(uow).get_agent_by_id(request.agent_id)
+        if agent is None:
+            return {"error": f"Agent with id {request.agent_id} not found"}
+
+    state = agent.internal_state if request.internal else agent.external_state
+    return VersionedStateResponse(state=state, version=agent.state_version).model_dump()
+
+
 @sio.on("get_combined_agent_state")
 async def get_combined_agent_state(sid: str, data: Any) -> dict[str, Any]:
     """Gets an Agent's combined state."""
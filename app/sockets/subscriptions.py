@@ -0,0 +1,135 @@
+from typing import Any
+
+import pydantic
+
+from app.models.state_subscriptions import (
+    GLOBAL_STATE_TOPIC,
+    StateTopic,
+    state_subscriptions,
+    subscription_room,
+)
+from app.repositories.unit_of_work import UnitOfWork
+from app.services.agent_service import AgentService
+from app.services.global_state_service import GlobalStateService
+
+from .models import (
+    StateChangedEvent,
+    SubscribeAgentStateRequest,
+    SubscribeStateRequest,
+    VersionedStateResponse,
+)
+from .server import sio
+
+
+async def subscribe(sid: str, topic: StateTopic, path: str) -> None:
+    state_subscriptions.subscribe(sid, topic, path)
+    await sio.enter_room(sid, subscription_room(topic, path))
+
+
+async def unsubscribe(sid: str, topic: StateTopic, path: str) -> None:
+    state_subscriptions.unsubscribe(sid, topic, path)
+    await sio.leave_room(sid, subscription_room(topic, path))
+
+
+async def broadcast_state_changes() -> None:
+    """
+    Sends the state changes committed since the last call to the clients subscribed to them,
+    as JSON Patches limited to the subscribed paths.
+    """
+
+    for change in state_subscriptions.pop_changes():
+        agent_id, internal = change.topic
+        event = "global_state_changed" if agent_id is None else "agent_state_changed"
+
+        for path in state_subscriptions.paths(change.topic):
+            operations = change.operations_under(path)
+            if not operations:
+                continue
+
+            data = StateChangedEvent(
+                agent_id=agent_id,
+                internal=internal,
+                path=path,
+                version=change.version,
+                operations=operations,
+            )
+            await sio.emit(event, data.model_dump(), to=subscription_room(change.topic, path))
+
+
+@sio.on("subscribe_global_state")
+async def subscribe_global_state(sid: str, data: Any = None) -> dict[str, Any]:
+    """
+    Subscribes to the changes of the global state under a path, sent as global_state_changed.
+    Returns the current global state to apply the changes to.
+    """
+
+    try:
+        request = SubscribeStateRequest.model_validate(data or {})
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await subscribe(sid, GLOBAL_STATE_TOPIC, request.path)
+
+    global_state = await GlobalStateService().get_state()
+    return VersionedStateResponse(
+        state=global_state.state, version=global_state.version
+    ).model_dump()
+
+
+@sio.on("unsubscribe_global_state")
+async def unsubscribe_global_state(sid: str, data: Any = None) -> dict[str, Any]:
+    """Unsubscribes from the changes of the global state under a path."""
+
+    try:
+        request = SubscribeStateRequest.model_validate(data or {})
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await unsubscribe(sid, GLOBAL_STATE_TOPIC, request.path)
+    return request.model_dump()
+
+
+@sio.on("subscribe_agent_state")
+async def subscribe_agent_state(sid: str, data: Any) -> dict[str, Any]:
+    """
+    Subscribes to the changes of an Agent's state under a path, sent as agent_state_changed.
+    Returns the current state to apply the changes to.
+    """
+
+    try:
+        request = SubscribeAgentStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    topic = (request.agent_id, request.internal)
+    await subscribe(sid, topic, request.path)
+
+    async with UnitOfWork() as uow:
+        agent = await AgentService(uow).get_agent_by_id(request.agent_id)
+
+    if agent is None:
+        await unsubscribe(sid, topic, request.path)
+        return {"error": f"Agent with id {request.agent_id} not found"}
+
+    state = agent.internal_state if request.internal else agent.external_state
+    return VersionedStateResponse(state=state, version=agent.state_version).model_dump()
+
+
+@sio.on("unsubscribe_agent_state")
+async def unsubscribe_agent_state(sid: str, data: Any) -> dict[str, Any]:
+    """Unsubscribes from the changes of an Agent's state under a path."""
+
+    try:
+        request = SubscribeAgentStateRequest.model_validate(data)
+    except pydantic.ValidationError:
+        return {"error": "Validation error."}
+
+    await unsubscribe(sid, (request.agent_id, request.internal), request.path)
+    return request.model_dump()
+
+
+@sio.on("disconnect")
+async def unsubscribe_all(sid: str, reason: str) -> None:
+    """Drops the subscriptions of a disconnected client."""
+
+    state_subscriptions.unsubscribe_all(sid)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from app.services.message_archive_service import MessageArchiveService
+
+load_dotenv()
+
+MESSAGE_ARCHIVE_INTERVAL = int(os.getenv("MESSAGE_ARCHIVE_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+class MessageArchiveWorker:
+    """
+    Periodically creates the upcoming partitions of the agent message table
+    and archives the partitions and then the messages which outlived their retention.
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the periodic maintenance in a background task."""
+
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic maintenance."""
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                archive_service = MessageArchiveService()
+                await archive_service.create_upcoming_partitions()
+                for path in await archive_service.archive_expired_partitions():
+                    logger.info(f"Archived agent messages to {path}")
+
+                path = await archive_service.archive_expired_messages()
+                if path is not None:
+                    logger.info(f"Archived expired agent messages to {path}")
+            except Exception as e:
+                logger.exception(e)
+
+            await asyncio.sleep(MESSAGE_ARCHIVE_INTERVAL)
+
+
+message_archive_worker = MessageArchiveWorker()
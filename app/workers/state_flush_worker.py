@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+from app.services.global_state_service import STATE_FLUSH_INTERVAL, GlobalStateService
+
+logger = logging.getLogger(__name__)
+
+
+class StateFlushWorker:
+    """
+    Periodically writes the in-memory global state to the database,
+    batching the updates made since the previous flush into a single write.
+    The state is flushed once more when the worker stops, so a graceful shutdown loses no updates.
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the periodic flushes in a background task, unless the state is written through."""
+
+        if not self.running and STATE_FLUSH_INTERVAL > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flushes and flush the pending updates."""
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+        await GlobalStateService().flush_state()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(STATE_FLUSH_INTERVAL)
+            try:
+                await GlobalStateService().flush_state()
+            except Exception as e:
+                logger.exception(e)
+
+
+state_flush_worker = StateFlushWorker()
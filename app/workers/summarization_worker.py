@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from app.services.summary_service import SummaryService
+
+logger = logging.getLogger(__name__)
+
+
+class SummarizationWorker:
+    """
+    Summarizes the conversation histories of agents in the background, one agent at a time,
+    so that summarization never runs on the request path.
+    Agents already waiting in the queue are not queued again.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued_agent_ids: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start processing the queue in a background task."""
+
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop processing the queue, dropping the agents still waiting in it."""
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+        self._queued_agent_ids.clear()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+
+    def enqueue(self, agent_id: int) -> None:
+        """
+        Queue the agent for summarization. Does nothing if the worker is not running,
+        as the agent will be queued again with its next message.
+
+        Args:
+            agent_id (int): The ID of the agent.
+        """
+
+        if not self.running or agent_id in self._queued_agent_ids:
+            return
+
+        self._queued_agent_ids.add(agent_id)
+        self._queue.put_nowait(agent_id)
+
+    async def join(self) -> None:
+        """Wait until all queued agents are processed."""
+
+        await self._queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            agent_id = await self._queue.get()
+            self._queued_agent_ids.discard(agent_id)
+            try:
+                await SummaryService().summarize_conversation(agent_id)
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                self._queue.task_done()
+
+
+summarization_worker = SummarizationWorker()
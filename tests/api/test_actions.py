@@ -1,13 +1,19 @@
 import pytest
 
-from app.models import Action, ActionParam, Agent, GlobalState
+from app.models import Action, ActionConditionOperator, ActionParam, Agent, GlobalState
 from app.models.action import (
     ActionEvaluationResult,
     ActionRequest,
     ActionResponse,
     ActionUpdateRequest,
 )
-from app.models.action_condition import ActionCondition, ComparisonMethod
+from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
+    ActionCondition,
+    ActionConditionUpdateRequest,
+    ComparisonMethod,
+    LogicalOperator,
+)
 from app.models.action_param import ActionParamType
 from app.services.action_service import ActionService
 from app.services.global_state_service import GlobalStateService
@@ -68,6 +74,7 @@ async def test_create_action__unprocessable_entity(client, payload):
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget(5)
 async def test_create_action__triggered_agent__success(client, insert, cleanup_db):
     # given
     agent = Agent(name="Agent 1")
@@ -141,6 +148,7 @@ async def test_get_action_by_id__unprocessable_entity(client):
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget(5)
 async def test_update_action__success(client, insert, cleanup_db):
     # given
     action = Action(name="Old Name", description="Old Desc")
@@ -198,6 +206,7 @@ async def test_update_action__unprocessable_entity(client, insert, cleanup_db):
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget(7)
 async def test_update_action__triggered_agent__success(client, insert, cleanup_db):
     # given
     action = Action(name="Action")
@@ -230,6 +239,7 @@ async def test_update_action__triggered_agent__not_found(client, insert, cleanup
     assert f"Agent with id {request.triggered_agent_id} not found" in response.text
 
 
+@pytest.mark.query_budget(5)
 async def test_delete_action__success(client, insert, cleanup_db):
     # given
     action = Action(name="Action to Delete")
@@ -297,6 +307,41 @@ async def test_evaluate_action_conditions__with_conditions__success(
     assert evaluation_result.result == (number_value > expected_value)
 
 
+@pytest.mark.query_budget(5, repeats=1)
+async def test_evaluate_action_conditions__nested_tree__success(
+    client, insert, root_operator, cleanup_db
+):
+    # given
+    global_state = GlobalState(id=1, state={"number": 5})
+    await GlobalStateService().update_state(global_state)
+
+    for expected_values in (("5", "6"), ("7", "5"), ("5", "5")):
+        operator = ActionConditionOperator(
+            logical_operator=LogicalOperator.OR,
+            action_id=root_operator.action_id,
+            parent_id=root_operator.id,
+            root_id=root_operator.id,
+        )
+        operator = await insert(operator)
+        for expected_value in expected_values:
+            condition = ActionCondition(
+                parent_id=operator.id,
+                root_id=root_operator.id,
+                state_variable_name="number",
+                comparison=ComparisonMethod.EQUAL,
+                expected_value=expected_value,
+            )
+            await insert(condition)
+
+    # when
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+
+    # then
+    assert response.status_code == 200
+    evaluation_result = ActionEvaluationResult.model_validate(response.json())
+    assert evaluation_result.result is True
+
+
 async def test_evaluate_action_conditions__action_not_found(client, cleanup_db):
     # given
     action_id = 999
@@ -355,3 +400,125 @@ async def test_evaluate_action_conditions__invalid_comparison(
         f"Comparison '{condition.comparison.name}' is not valid for values: "
         f"state_var=hello, expected_value=True" in response.text
     )
+
+
+async def test_evaluate_action_conditions__condition_updated__reevaluated(
+    client, insert, root_operator, cleanup_db
+):
+    # given
+    global_state = GlobalState(id=1, state={"number": 5})
+    await GlobalStateService().update_state(global_state)
+
+    condition = ActionCondition(
+        parent_id=root_operator.id,
+        root_id=root_operator.id,
+        state_variable_name="number",
+        comparison=ComparisonMethod.GREATER,
+        expected_value="10",
+    )
+    condition = await insert(condition)
+
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+    assert ActionEvaluationResult.model_validate(response.json()).result is False
+
+    response = await client.patch(
+        f"/conditions/condition/{condition.id}",
+        json=ActionConditionUpdateRequest(comparison=ComparisonMethod.LESS).model_dump(
+            exclude_unset=True
+        ),
+    )
+    assert response.status_code == 200
+
+    # when
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+
+    # then
+    assert response.status_code == 200
+    evaluation_result = ActionEvaluationResult.model_validate(response.json())
+    assert evaluation_result.result is True
+
+
+async def test_evaluate_action_conditions__condition_deleted__reevaluated(
+    client, insert, root_operator, cleanup_db
+):
+    # given
+    condition = ActionCondition(
+        parent_id=root_operator.id,
+        root_id=root_operator.id,
+        state_variable_name="missing_var",
+        comparison=ComparisonMethod.EQUAL,
+        expected_value='"some_value"',
+    )
+    condition = await insert(condition)
+
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+    assert response.status_code == 409
+
+    response = await client.delete(f"/conditions/condition/{condition.id}")
+    assert response.status_code == 204
+
+    # when
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+
+    # then
+    assert response.status_code == 200
+    evaluation_result = ActionEvaluationResult.model_validate(response.json())
+    assert evaluation_result.result is False
+
+
+async def test_evaluate_action_conditions__unreachable_nodes(
+    client, insert, root_operator, cleanup_db
+):
+    # given
+    other_action = Action(name="Other Action")
+    other_action = await insert(other_action)
+
+    other_root = ActionConditionOperator(
+        logical_operator=LogicalOperator.AND, action_id=other_action.id
+    )
+    other_root = await insert(other_root)
+
+    other_root.root_id = other_root.id
+    other_root = await insert(other_root)
+
+    condition = ActionCondition(
+        parent_id=other_root.id,
+        root_id=root_operator.id,
+        state_variable_name="number",
+        comparison=ComparisonMethod.EQUAL,
+        expected_value="1",
+    )
+    condition = await insert(condition)
+
+    # when
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+
+    # then
+    assert response.status_code == 409
+    assert (
+        f"Condition tree with root id {root_operator.id} has unreachable nodes: "
+        f"orphaned conditions [{condition.id}]" in response.text
+    )
+
+
+async def test_evaluate_action_conditions__tree_too_deep(client, insert, root_operator, cleanup_db):
+    # given
+    parent = root_operator
+    for _ in range(MAX_CONDITION_TREE_DEPTH):
+        operator = ActionConditionOperator(
+            logical_operator=LogicalOperator.AND,
+            action_id=root_operator.action_id,
+            parent_id=parent.id,
+            root_id=root_operator.id,
+        )
+        parent = await insert(operator)
+
+    # when
+    response = await client.post(f"/actions/{root_operator.action_id}/evaluate_conditions")
+
+    # then
+    assert response.status_code == 409
+    assert (
+        f"Condition tree with root id {root_operator.id} is deeper "
+        f"than the maximum of {MAX_CONDITION_TREE_DEPTH} levels" in response.text
+    )
@@ -1,9 +1,17 @@
+import json
+
 import pytest
 
 from app.models import ActionParam, AgentMessage, Player
 from app.models.action import Action
 from app.models.action_param import ActionParamType
-from app.models.agent import Agent, AgentRequest, AgentResponse, AgentUpdateRequest
+from app.models.agent import (
+    Agent,
+    AgentRequest,
+    AgentResponse,
+    AgentUpdateRequest,
+    HistoryStrategy,
+)
 from app.models.agent_message import QueryResponseDict
 from app.services.agent_service import AgentService
 
@@ -39,8 +47,32 @@ async def test_create_agent__success(client, cleanup_db):
     assert response_agent.instructions == request.instructions
 
 
+async def test_create_agent__with_history_strategy__success(client, cleanup_db):
+    # given
+    request = AgentRequest(
+        name="Test Agent", history_strategy=HistoryStrategy.TOKEN_BUDGET, history_limit=2000
+    )
+
+    # when
+    response = await client.post("/agents", json=request.model_dump())
+
+    # then
+    assert response.status_code == 201
+    response_agent = AgentResponse.model_validate(response.json())
+    assert response_agent.history_strategy == HistoryStrategy.TOKEN_BUDGET
+    assert response_agent.history_limit == 2000
+
+
 @pytest.mark.parametrize(
-    "payload", [{}, {"name": 999}, {"description": "desc"}, {"name": "name", "description": 999}]
+    "payload",
+    [
+        {},
+        {"name": 999},
+        {"description": "desc"},
+        {"name": "name", "description": 999},
+        {"name": "name", "history_strategy": "everything"},
+        {"name": "name", "history_limit": 0},
+    ],
 )
 async def test_create_agent__unprocessable_entity(client, payload):
     # when
@@ -224,6 +256,102 @@ async def test_get_agent_messages__not_found(client, cleanup_db):
     assert f"Agent with id {agent_id} not found" in response.text
 
 
+async def test_get_agent_messages__paginated__pages_follow_cursors(client, insert, cleanup_db):
+    # given
+    player = Player(name="Player")
+    player = await insert(player)
+
+    agent = Agent(name="Agent")
+    agent = await insert(agent)
+
+    messages = [
+        await insert(
+            AgentMessage(
+                agent_id=agent.id,
+                caller_player_id=player.id,
+                query=f"Query {i}",
+                response=QueryResponseDict(response=f"Response {i}", actions=[]),
+            )
+        )
+        for i in range(5)
+    ]
+
+    # when
+    newest_page = await client.get(f"/agents/{agent.id}/messages", params={"limit": 2})
+    older_page = await client.get(
+        f"/agents/{agent.id}/messages",
+        params={"limit": 2, "before": newest_page.headers["X-Before-Cursor"]},
+    )
+    newer_page = await client.get(
+        f"/agents/{agent.id}/messages",
+        params={"limit": 2, "after": older_page.headers["X-After-Cursor"]},
+    )
+
+    # then
+    for response in (newest_page, older_page, newer_page):
+        assert response.status_code == 200
+
+    assert [AgentMessage.model_validate(msg) for msg in newest_page.json()] == messages[3:]
+    assert [AgentMessage.model_validate(msg) for msg in older_page.json()] == messages[1:3]
+    assert [AgentMessage.model_validate(msg) for msg in newer_page.json()] == messages[3:]
+
+
+async def test_get_agent_messages__invalid_cursor(client, insert, cleanup_db):
+    # given
+    agent = Agent(name="Agent")
+    agent = await insert(agent)
+
+    # when
+    response = await client.get(f"/agents/{agent.id}/messages", params={"before": "invalid"})
+
+    # then
+    assert response.status_code == 400
+    assert "Invalid message cursor invalid" in response.text
+
+
+async def test_export_agent_messages__success(client, insert, cleanup_db):
+    # given
+    player = Player(name="Player")
+    player = await insert(player)
+
+    agent = Agent(name="Agent")
+    agent = await insert(agent)
+
+    messages = [
+        await insert(
+            AgentMessage(
+                agent_id=agent.id,
+                caller_player_id=player.id,
+                query=f"Query {i}",
+                response=QueryResponseDict(response=f"Response {i}", actions=[]),
+            )
+        )
+        for i in range(3)
+    ]
+
+    # when
+    response = await client.get(f"/agents/{agent.id}/messages/export")
+
+    # then
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [
+        AgentMessage.model_validate(json.loads(line)) for line in response.text.splitlines()
+    ] == messages
+
+
+async def test_export_agent_messages__not_found(client, cleanup_db):
+    # given
+    agent_id = 999
+
+    # when
+    response = await client.get(f"/agents/{agent_id}/messages/export")
+
+    # then
+    assert response.status_code == 404
+    assert f"Agent with id {agent_id} not found" in response.text
+
+
 async def test_delete_agent_messages__success(client, insert, cleanup_db):
     # given
     player = Player(name="Player")
@@ -263,6 +391,7 @@ async def test_delete_agent_messages__not_found(client, cleanup_db):
     assert response.status_code == 204
 
 
+@pytest.mark.query_budget(7)
 async def test_assign_action_to_agent__success(client, insert, cleanup_db):
     # given
     agent = Agent(name="Agent")
@@ -321,6 +450,7 @@ async def test_assign_action_to_agent__conflict(client, insert, cleanup_db):
     )
 
 
+@pytest.mark.query_budget(6)
 async def test_remove_action_from_agent__success(client, insert, cleanup_db):
     # given
     action = Action(name="Action")
@@ -55,6 +55,8 @@ ENDPOINTS = [
     ("DELETE", "/conditions/operator/1"),
     ("DELETE", "/conditions/condition_tree/1"),
     ("POST", "/conditions/condition_tree/assign"),
+    # Metrics
+    ("GET", "http://testserver/metrics"),
 ]
 
 
@@ -1,7 +1,9 @@
 import pytest
 
 from app.models import Action, GlobalState
+from app.models.action_availability import action_availability
 from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
     ActionCondition,
     ActionConditionRequest,
     ActionConditionResponse,
@@ -13,9 +15,11 @@ from app.models.action_condition_operator import (
     ActionConditionOperatorRequest,
     ActionConditionOperatorResponse,
     ActionConditionOperatorUpdateRequest,
+    ConditionTreeResponse,
     LogicalOperator,
     NewConditionTreeRequest,
 )
+from app.services.action_availability_service import ActionAvailabilityService
 from app.services.action_condition_service import ActionConditionService
 from app.services.global_state_service import GlobalStateService
 
@@ -200,6 +204,7 @@ async def test_create_action_condition__unprocessable_entity(client, payload):
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget(5)
 async def test_create_action_condition_operator__success(client, insert, root_operator, cleanup_db):
     # given
     request = ActionConditionOperatorRequest(
@@ -316,6 +321,7 @@ async def test_create_action_condition_operator__unprocessable_entity(client, pa
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget(7, repeats=2)
 async def test_create_new_condition_tree__success(client, insert, cleanup_db):
     # given
     action = Action(name="Test Action")
@@ -366,6 +372,206 @@ async def test_create_new_condition_tree__action_already_has_root(
     )
 
 
+@pytest.mark.query_budget(8, repeats=2)
+async def test_replace_condition_tree__new_tree(client, insert, cleanup_db):
+    # given
+    action = await insert(Action(name="Test Action"))
+    global_state = GlobalState(id=1, state={"test": 1})
+    await GlobalStateService().update_state(global_state)
+
+    condition = {"state_variable_name": "test", "comparison": "==", "expected_value": "1"}
+    request = {
+        "logical_operator": "AND",
+        "conditions": [condition],
+        "operators": [
+            {"logical_operator": "OR", "conditions": [condition, condition]},
+            {"logical_operator": "OR", "operators": [{"logical_operator": "AND"}]},
+        ],
+    }
+
+    # when
+    response = await client.put(f"/conditions/tree/{action.id}", json=request)
+
+    # then
+    assert response.status_code == 200
+    tree = ConditionTreeResponse.model_validate(response.json())
+    root, first_or, second_or, nested_and = tree.operators
+    assert root.id == tree.root_id
+    assert root.parent_id is None
+    assert [operator.parent_id for operator in tree.operators[1:]] == [
+        root.id,
+        root.id,
+        second_or.id,
+    ]
+    assert [condition.parent_id for condition in tree.conditions] == [
+        root.id,
+        first_or.id,
+        first_or.id,
+    ]
+    assert {operator.action_id for operator in tree.operators} == {action.id}
+    assert {node.root_id for node in [*tree.operators, *tree.conditions]} == {root.id}
+
+    operators = await ActionConditionService().get_condition_operators()
+    assert sorted(
+        (ActionConditionOperatorResponse.model_validate(operator) for operator in operators),
+        key=lambda operator: operator.id,
+    ) == sorted(tree.operators, key=lambda operator: operator.id)
+    conditions = await ActionConditionService().get_conditions()
+    assert sorted(
+        (ActionConditionResponse.model_validate(condition) for condition in conditions),
+        key=lambda condition: condition.id,
+    ) == sorted(tree.conditions, key=lambda condition: condition.id)
+    assert (await ActionConditionService().evaluate_action_conditions(action.id)).result
+
+
+@pytest.mark.query_budget(11, repeats=1)
+async def test_replace_condition_tree__existing_tree(client, insert, root_operator, cleanup_db):
+    # given
+    global_state = GlobalState(id=1, state={"test": 1})
+    await GlobalStateService().update_state(global_state)
+
+    operator = ActionConditionOperator(
+        logical_operator=LogicalOperator.AND,
+        action_id=root_operator.action_id,
+        parent_id=root_operator.id,
+        root_id=root_operator.id,
+    )
+    operator = await insert(operator)
+    kept_condition, moved_condition, deleted_condition = await insert(
+        *[
+            ActionCondition(
+                parent_id=parent_id,
+                root_id=root_operator.id,
+                state_variable_name="test",
+                comparison=ComparisonMethod.EQUAL,
+                expected_value="1",
+            )
+            for parent_id in [root_operator.id, operator.id, operator.id]
+        ]
+    )
+
+    request = {
+        "id": root_operator.id,
+        "logical_operator": "AND",
+        "conditions": [
+            {
+                "id": kept_condition.id,
+                "state_variable_name": "test",
+                "comparison": ">",
+                "expected_value": "0",
+            }
+        ],
+        "operators": [
+            {
+                "logical_operator": "OR",
+                "conditions": [
+                    {
+                        "id": moved_condition.id,
+                        "state_variable_name": "test",
+                        "comparison": "==",
+                        "expected_value": "1",
+                    }
+                ],
+            }
+        ],
+    }
+
+    # when
+    response = await client.put(f"/conditions/tree/{root_operator.action_id}", json=request)
+
+    # then
+    assert response.status_code == 200
+    tree = ConditionTreeResponse.model_validate(response.json())
+    assert tree.root_id == root_operator.id
+
+    operators = await ActionConditionService().get_condition_operators()
+    root, new_operator = sorted(operators, key=lambda operator: operator.id)
+    assert root.id == root_operator.id
+    assert root.logical_operator == LogicalOperator.AND
+    assert new_operator.id not in {root_operator.id, operator.id}
+    assert new_operator.parent_id == root.id
+
+    conditions = await ActionConditionService().get_conditions()
+    assert sorted((c.id, c.parent_id, c.comparison) for c in conditions) == [
+        (kept_condition.id, root.id, ComparisonMethod.GREATER),
+        (moved_condition.id, new_operator.id, ComparisonMethod.EQUAL),
+    ]
+    assert deleted_condition.id not in {condition.id for condition in tree.conditions}
+
+
+async def test_replace_condition_tree__action_not_found(client, cleanup_db):
+    # when
+    response = await client.put("/conditions/tree/132", json={"logical_operator": "AND"})
+
+    # then
+    assert response.status_code == 404
+    assert "Action with id 132 not found" in response.text
+
+
+async def test_replace_condition_tree__node_not_in_tree(client, insert, root_operator, cleanup_db):
+    # given
+    action = await insert(Action(name="Other Action"))
+    request = {
+        "logical_operator": "AND",
+        "operators": [{"id": root_operator.id, "logical_operator": "OR"}],
+    }
+
+    # when
+    response = await client.put(f"/conditions/tree/{action.id}", json=request)
+
+    # then
+    assert response.status_code == 404
+    assert f"Operator with id {root_operator.id} not found in the tree" in response.text
+    assert await ActionConditionService().get_root_operator_for_action_id(action.id) is None
+
+
+async def test_replace_condition_tree__root_given_twice(client, root_operator, cleanup_db):
+    # given
+    request = {
+        "logical_operator": "AND",
+        "operators": [{"id": root_operator.id, "logical_operator": "OR"}],
+    }
+
+    # when
+    response = await client.put(f"/conditions/tree/{root_operator.action_id}", json=request)
+
+    # then
+    assert response.status_code == 409
+    assert f"Operator with id {root_operator.id} is given more than once" in response.text
+
+
+async def test_replace_condition_tree__invalid_condition_logic(client, root_operator, cleanup_db):
+    # given
+    request = {
+        "logical_operator": "AND",
+        "conditions": [
+            {"state_variable_name": "missing", "comparison": "==", "expected_value": "1"}
+        ],
+    }
+
+    # when
+    response = await client.put(f"/conditions/tree/{root_operator.action_id}", json=request)
+
+    # then
+    assert response.status_code == 409
+    assert "State variable name 'missing' not found" in response.text
+    assert await ActionConditionService().get_conditions() == []
+
+
+async def test_replace_condition_tree__tree_too_deep(client, root_operator, cleanup_db):
+    # given
+    request = {"logical_operator": "AND"}
+    for _ in range(MAX_CONDITION_TREE_DEPTH):
+        request = {"logical_operator": "AND", "operators": [request]}
+
+    # when
+    response = await client.put(f"/conditions/tree/{root_operator.action_id}", json=request)
+
+    # then
+    assert response.status_code == 422
+    assert f"deeper than the maximum of {MAX_CONDITION_TREE_DEPTH} levels" in response.text
+
+
 async def test_get_action_conditions__success(client, insert, root_operator, cleanup_db):
     # given
     conditions = [
@@ -498,6 +704,50 @@ async def test_get_action_condition_operator_by_id__unprocessable_entity(client)
     assert response.status_code == 422
 
 
+async def test_update_action_condition__availability_of_other_actions_kept(
+    client, insert, cleanup_db
+):
+    # given
+    global_state = GlobalState(id=1, state={"value": 1})
+    await GlobalStateService().update_state(global_state)
+
+    actions = await insert(Action(name="Edited Action"), Action(name="Other Action"))
+    conditions = []
+    for action in actions:
+        root = await insert(
+            ActionConditionOperator(logical_operator=LogicalOperator.AND, action_id=action.id)
+        )
+        root.root_id = root.id
+        root = await insert(root)
+
+        condition = ActionCondition(
+            parent_id=root.id,
+            root_id=root.id,
+            state_variable_name="value",
+            comparison=ComparisonMethod.EQUAL,
+            expected_value="1",
+        )
+        conditions.append(await insert(condition))
+
+    available_actions = await ActionAvailabilityService().get_available_actions(actions)
+    assert available_actions == actions
+
+    request = ActionConditionUpdateRequest(expected_value="2")
+
+    # when
+    response = await client.patch(
+        f"/conditions/condition/{conditions[0].id}", json=request.model_dump(exclude_unset=True)
+    )
+
+    # then
+    assert response.status_code == 200
+    assert action_availability.get(actions[0].id) is None
+    assert action_availability.get(actions[1].id) is True
+
+    available_actions = await ActionAvailabilityService().get_available_actions(actions)
+    assert available_actions == [actions[1]]
+
+
 async def test_update_action_condition__success(client, insert, root_operator, cleanup_db):
     # given
     global_state = GlobalState(id=1, state={"old": "old_value", "new": "new_value"})
@@ -921,6 +1171,7 @@ async def test_delete_action_condition_operator__not_found(client, cleanup_db):
     assert response.status_code == 204
 
 
+@pytest.mark.query_budget(4, repeats=2)
 async def test_delete_tree_by_root_id__success(client, insert, root_operator, cleanup_db):
     # given
     child_operator = ActionConditionOperator(
@@ -931,23 +1182,40 @@ async def test_delete_tree_by_root_id__success(client, insert, root_operator, cl
     )
     child_operator = await insert(child_operator)
 
-    condition = ActionCondition(
-        parent_id=child_operator.id,
-        root_id=root_operator.id,
-        state_variable_name="test",
-        comparison=ComparisonMethod.EQUAL,
-        expected_value='"test_value"',
-    )
-    condition = await insert(condition)
+    grandchild_operators = [
+        await insert(
+            ActionConditionOperator(
+                logical_operator=LogicalOperator.AND,
+                parent_id=child_operator.id,
+                root_id=root_operator.id,
+                action_id=root_operator.action_id,
+            )
+        )
+        for _ in range(3)
+    ]
+
+    conditions = [
+        await insert(
+            ActionCondition(
+                parent_id=parent.id,
+                root_id=root_operator.id,
+                state_variable_name="test",
+                comparison=ComparisonMethod.EQUAL,
+                expected_value='"test_value"',
+            )
+        )
+        for parent in (child_operator, *grandchild_operators)
+    ]
 
     # when
     response = await client.delete(f"/conditions/condition_tree/{root_operator.id}")
 
     # then
     assert response.status_code == 204
-    assert await ActionConditionService().get_condition_operator_by_id(root_operator.id) is None
-    assert await ActionConditionService().get_condition_operator_by_id(child_operator.id) is None
-    assert await ActionConditionService().get_condition_by_id(condition.id) is None
+    for operator in (root_operator, child_operator, *grandchild_operators):
+        assert await ActionConditionService().get_condition_operator_by_id(operator.id) is None
+    for condition in conditions:
+        assert await ActionConditionService().get_condition_by_id(condition.id) is None
 
 
 async def test_delete_tree_by_root_id__not_found(client, cleanup_db):
@@ -979,15 +1247,20 @@ async def test_delete_tree_by_root_id__not_root(client, insert, root_operator, c
     assert f"Operator with id {child_operator.id} is not a root" in response.text
 
 
+@pytest.mark.query_budget(4, repeats=1)
 async def test_assign_tree_to_action__success(client, insert, root_operator, cleanup_db):
     # given
-    child_operator = ActionConditionOperator(
-        logical_operator=LogicalOperator.OR,
-        parent_id=root_operator.id,
-        root_id=root_operator.id,
-        action_id=root_operator.action_id,
-    )
-    child_operator = await insert(child_operator)
+    child_operators = [
+        await insert(
+            ActionConditionOperator(
+                logical_operator=LogicalOperator.OR,
+                parent_id=root_operator.id,
+                root_id=root_operator.id,
+                action_id=root_operator.action_id,
+            )
+        )
+        for _ in range(3)
+    ]
 
     action = Action(name="New Action")
     action = await insert(action)
@@ -1005,10 +1278,11 @@ async def test_assign_tree_to_action__success(client, insert, root_operator, cle
     updated_operator = await ActionConditionService().get_condition_operator_by_id(root_operator.id)
     assert updated_operator.action_id == action.id
 
-    updated_child_operator = await ActionConditionService().get_condition_operator_by_id(
-        child_operator.id
-    )
-    assert updated_child_operator.action_id == action.id
+    for child_operator in child_operators:
+        updated_child_operator = await ActionConditionService().get_condition_operator_by_id(
+            child_operator.id
+        )
+        assert updated_child_operator.action_id == action.id
 
 
 async def test_assign_tree_to_action__root_not_found(client, insert, cleanup_db):
@@ -0,0 +1,87 @@
+from collections.abc import Generator
+
+import pytest
+
+from app.core.metrics import metrics
+from app.models.agent import Agent
+from app.models.player import Player
+from app.sockets.server import MeasuredServer
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics() -> Generator[None, None, None]:
+    metrics.clear()
+    yield
+    metrics.clear()
+
+
+async def test_get_metrics__http_request__duration_and_statements_recorded(
+    client, insert, cleanup_db
+):
+    # given
+    player = await insert(Player(name="Player", description="desc"))
+    await client.get(f"/players/{player.id}")
+
+    # when
+    response = await client.get("http://testserver/metrics")
+
+    # then
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/api/v1/players/{player_id}",'
+        'status="200"} 1'
+    ) in lines
+    assert 'db_statements_per_request_sum{endpoint="GET /api/v1/players/{player_id}"} 1' in lines
+    assert 'db_pool_connections{state="checked_out"} 0' in lines
+    assert 'cache_hits_total{cache="condition_tree"} 0' in lines
+
+
+async def test_get_metrics__streamed_response__statements_of_body_recorded(
+    client, insert, cleanup_db
+):
+    # given
+    agent = await insert(Agent(name="Agent"))
+    await client.get(f"/agents/{agent.id}/messages/export")
+
+    # when
+    response = await client.get("http://testserver/metrics")
+
+    # then
+    assert (
+        'db_statements_per_request_sum{endpoint="GET /api/v1/agents/{agent_id}/messages/export"} 3'
+    ) in response.text.splitlines()
+
+
+async def test_get_metrics__unmatched_route__grouped(client):
+    # given
+    await client.get("/missing/1")
+    await client.get("/missing/2")
+
+    # when
+    response = await client.get("http://testserver/metrics")
+
+    # then
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 2'
+    ) in response.text.splitlines()
+
+
+async def test_measured_server__event_handled__duration_and_statements_recorded():
+    # given
+    server = MeasuredServer(async_mode="asgi")
+
+    async def ping(sid: str, data: dict) -> dict:
+        return data
+
+    server.on("ping", ping)
+
+    # when
+    result = await server.handlers["/"]["ping"]("sid", {"pong": True})
+
+    # then
+    assert result == {"pong": True}
+    lines = metrics.render().splitlines()
+    assert 'socketio_event_duration_seconds_count{event="ping"} 1' in lines
+    assert 'db_statements_per_request_bucket{endpoint="socketio ping",le="0"} 1' in lines
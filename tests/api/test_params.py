@@ -1,12 +1,13 @@
 import pytest
 
-from app.models import Action, ActionParam
+from app.models import Action, ActionParam, Agent
 from app.models.action_param import (
     ActionParamRequest,
     ActionParamResponse,
     ActionParamType,
     ActionParamUpdateRequest,
 )
+from app.models.structured_output import fingerprint_actions, structured_output_cache
 from app.services.action_param_service import ActionParamService
 
 
@@ -279,6 +280,67 @@ async def test_update_action_param__invalid_request(client, insert, cleanup_db):
     assert response.status_code == 422
 
 
+async def test_update_action_param__cached_structured_output_invalidated(
+    client, insert, cleanup_db
+):
+    # given
+    action = Action(
+        name="Test Action",
+        params=[
+            ActionParam(
+                action_id=0,
+                name="Param",
+                description="Description",
+                type=ActionParamType.STRING,
+            )
+        ],
+    )
+    action = await insert(action)
+    param = action.params[0]
+
+    fingerprint = fingerprint_actions([action])
+    Agent(name="Agent").to_structured_output([action])
+    request = ActionParamUpdateRequest(type=ActionParamType.INTEGER)
+
+    # when
+    response = await client.patch(
+        f"/params/{param.id}", json=request.model_dump(exclude_unset=True)
+    )
+
+    # then
+    assert response.status_code == 200
+    assert structured_output_cache.get(fingerprint) is None
+
+
+async def test_delete_action_param__cached_structured_output_invalidated(
+    client, insert, cleanup_db
+):
+    # given
+    action = Action(
+        name="Test Action",
+        params=[
+            ActionParam(
+                action_id=0,
+                name="Param",
+                description="Description",
+                type=ActionParamType.STRING,
+            )
+        ],
+    )
+    action = await insert(action)
+    param = action.params[0]
+
+    fingerprint = fingerprint_actions([action])
+    Agent(name="Agent").to_structured_output([action])
+
+    # when
+    response = await client.delete(f"/params/{param.id}")
+
+    # then
+    assert response.status_code == 204
+    assert structured_output_cache.get(fingerprint) is None
+
+
 async def test_delete_action_param__success(client, insert, cleanup_db):
     # given
     action = Action(name="Test Action")
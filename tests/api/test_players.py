@@ -4,6 +4,7 @@ from app.models.player import Player, PlayerRequest, PlayerResponse, PlayerUpdat
 from app.services.player_service import PlayerService
 
 
+@pytest.mark.query_budget(1)
 async def test_get_players__success(client, insert, cleanup_db):
     # given
     players = [
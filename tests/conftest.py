@@ -7,10 +7,9 @@ import sqlalchemy as sa
 from alembic import command as alembic_command
 from alembic.config import Config as AlembicConfig
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio.engine import create_async_engine
 from testcontainers.postgres import PostgresContainer
 
-from app.core.database import Session
+from app.core.database import Session, create_engine
 from app.main import socket_app
 from app.models import (
     Action,
@@ -19,11 +18,14 @@ from app.models import (
     ActionParam,
     Agent,
     AgentMessage,
+    AgentSummary,
     GlobalState,
     Player,
 )
+from app.models.global_state_store import global_state_store
 from app.repositories.base_repository import BaseRepository, ModelType
 from app.repositories.unit_of_work import UnitOfWork
+from tests.query_budget import QueryReport, check_query_budgets, record_calls
 
 POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
@@ -31,6 +33,53 @@ POSTGRES_DB = os.getenv("POSTGRES_DB")
 APP_USER = os.getenv("APP_USER")
 APP_PASSWORD = os.getenv("APP_PASSWORD")
 
+query_report = QueryReport()
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--query-report",
+        metavar="PATH",
+        help="Write the SQL statements of every API call and socket event to a JSON report.",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line(
+        "markers",
+        "query_budget(statements, endpoint=None, repeats=None): fail if an API call or socket "
+        "event of the test executes more SQL statements, or repeats one more times, than declared",
+    )
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item: pytest.Item) -> Generator[None, None, None]:
+    with record_calls() as calls:
+        try:
+            result = yield
+        finally:
+            query_report.add(item.nodeid, calls)
+
+    check_query_budgets(item, calls)
+    return result
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    path = session.config.getoption("--query-report")
+    if path is not None:
+        query_report.write(path)
+
+
+def pytest_terminal_summary(
+    terminalreporter: pytest.TerminalReporter, config: pytest.Config
+) -> None:
+    if config.getoption("--query-report") is None:
+        return
+
+    terminalreporter.section("SQL statements per call")
+    for line in query_report.summary():
+        terminalreporter.write_line(line)
+
 
 @pytest.fixture(scope="session", autouse=True)
 def setup() -> Generator[PostgresContainer, None, None]:
@@ -46,7 +95,7 @@ def setup() -> Generator[PostgresContainer, None, None]:
         alembic_config.set_main_option("sqlalchemy.url", connection_url)
         alembic_command.upgrade(alembic_config, "head", tag="tests")
 
-        engine = create_async_engine(connection_url, poolclass=sa.NullPool)
+        engine = create_engine(connection_url, pooled=False)
         Session.configure(bind=engine)
 
         yield postgres
@@ -69,6 +118,8 @@ async def cleanup_db() -> AsyncGenerator[None]:
         session.add(global_state)
         await session.commit()
 
+    global_state_store.clear()
+
 
 @pytest_asyncio.fixture(scope="session")
 async def client() -> AsyncGenerator[AsyncClient, None]:
@@ -92,6 +143,7 @@ REPOSITORY_ATTRIBUTES = {
     ActionParam: "params",
     Agent: "agents",
     AgentMessage: "messages",
+    AgentSummary: "summaries",
     GlobalState: "state",
     Player: "players",
 }
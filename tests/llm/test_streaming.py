@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from app.llm.streaming import ResponseTextStream
+
+
+def feed_in_chunks(text: str, chunk_size: int) -> list[str]:
+    stream = ResponseTextStream()
+    return [stream.feed(text[i : i + chunk_size]) for i in range(0, len(text), chunk_size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_feed__chunked_json__response_text_decoded(chunk_size, ensure_ascii):
+    # given
+    response = 'Say "hi" \\ to them\n\t😀 é /   done'
+    generated = json.dumps(
+        {"response": response, "actions": {"Ask": {"question": '"response": "x"'}}},
+        ensure_ascii=ensure_ascii,
+        indent=2,
+    )
+
+    # when
+    deltas = feed_in_chunks(generated, chunk_size)
+
+    # then
+    assert "".join(deltas) == response
+
+
+def test_feed__response_text_complete__actions_ignored():
+    # given
+    stream = ResponseTextStream()
+
+    # when
+    deltas = [stream.feed(chunk) for chunk in ('{"response": "Hi', '", "actions": {"resp', "x")]
+
+    # then
+    assert deltas == ["Hi", "", ""]
+
+
+def test_feed__not_json__no_response_text():
+    # given
+    generated = "Hello, this is not JSON"
+
+    # when
+    deltas = feed_in_chunks(generated, 4)
+
+    # then
+    assert "".join(deltas) == ""
@@ -0,0 +1,56 @@
+import pytest
+
+from app.errors.conditions import InvalidConditionTreeError
+from app.models import ActionCondition, ActionConditionOperator
+from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
+    ComparisonMethod,
+    LogicalOperator,
+)
+from app.models.action_condition_tree import ActionConditionTreeNode, CompiledActionConditionTree
+
+
+def build_chain(nodes: int) -> ActionConditionTreeNode:
+    operators = [
+        ActionConditionOperator(
+            id=node_id,
+            parent_id=node_id - 1 if node_id > 1 else None,
+            root_id=1,
+            action_id=1,
+            logical_operator=LogicalOperator.AND,
+        )
+        for node_id in range(1, nodes)
+    ]
+    condition = ActionCondition(
+        id=1,
+        parent_id=nodes - 1,
+        root_id=1,
+        state_variable_name="value",
+        comparison=ComparisonMethod.EQUAL,
+        expected_value="1",
+    )
+
+    root = ActionConditionTreeNode.from_operator(operators[0])
+    return ActionConditionTreeNode.build(root, [condition], operators)
+
+
+def test_build__chain_at_max_depth__compiled_and_evaluated():
+    # given
+    root = build_chain(MAX_CONDITION_TREE_DEPTH)
+
+    # when
+    compiled_tree = CompiledActionConditionTree(root)
+
+    # then
+    assert compiled_tree.evaluator({"value": 1}, {}) is True
+    assert compiled_tree.evaluator({"value": 2}, {}) is False
+
+
+@pytest.mark.parametrize("nodes", [MAX_CONDITION_TREE_DEPTH + 1, 10_000])
+def test_build__chain_too_deep__rejected(nodes):
+    # when
+    with pytest.raises(InvalidConditionTreeError) as error:
+        build_chain(nodes)
+
+    # then
+    assert f"deeper than the maximum of {MAX_CONDITION_TREE_DEPTH} levels" in str(error.value)
@@ -0,0 +1,149 @@
+"""
+Counts the SQL statements of every API call and socket event made by the tests.
+
+Tests declare budgets with the query_budget marker and fail when a call exceeds them:
+
+    @pytest.mark.query_budget(3)  # every call of the test
+    @pytest.mark.query_budget(10, endpoint="socketio query_agent", repeats=2)
+
+The budget limits the statements of a call, and repeats the executions of the same statement
+within a call, which is how N+1 queries show up. With --query-report, the statements
+of every endpoint are written to a JSON report, listing the repeated statements.
+"""
+
+import json
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import pytest
+
+from app.core.metrics import StatementCount, statement_observers
+
+# Statements executed this many times within a call are reported as possible N+1 queries
+REPEATED_STATEMENT_THRESHOLD = 3
+
+
+@dataclass
+class EndpointCall:
+    endpoint: str
+    statements: int
+    texts: Counter[str]
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.texts.values(), default=0)
+
+
+@dataclass
+class EndpointReport:
+    calls: int = 0
+    statements: int = 0
+    max_statements: int = 0
+    tests: set[str] = field(default_factory=set)
+    repeated_statements: dict[str, int] = field(default_factory=dict)
+
+    def add(self, test: str, call: EndpointCall) -> None:
+        self.calls += 1
+        self.statements += call.statements
+        self.max_statements = max(self.max_statements, call.statements)
+        self.tests.add(test)
+        for text, repeats in call.texts.items():
+            if repeats >= REPEATED_STATEMENT_THRESHOLD:
+                self.repeated_statements[text] = max(self.repeated_statements.get(text, 0), repeats)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "mean_statements": round(self.statements / self.calls, 2),
+            "max_statements": self.max_statements,
+            "tests": sorted(self.tests),
+            "repeated_statements": [
+                {"statement": text, "max_repeats": repeats}
+                for text, repeats in sorted(
+                    self.repeated_statements.items(), key=lambda item: -item[1]
+                )
+            ],
+        }
+
+
+class QueryReport:
+    """The statements of every endpoint called by the tests of the session."""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointReport] = {}
+
+    def add(self, test: str, calls: list[EndpointCall]) -> None:
+        for call in calls:
+            self.endpoints.setdefault(call.endpoint, EndpointReport()).add(test, call)
+
+    def write(self, path: str) -> None:
+        report = {
+            endpoint: self.endpoints[endpoint].to_dict() for endpoint in sorted(self.endpoints)
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    def summary(self) -> Iterator[str]:
+        """The endpoints ordered by their most statements, flagging repeated statements."""
+
+        for endpoint, report in sorted(
+            self.endpoints.items(), key=lambda item: -item[1].max_statements
+        ):
+            repeats = max(report.repeated_statements.values(), default=0)
+            flag = f"  statement repeated up to {repeats}x" if repeats else ""
+            yield (
+                f"{endpoint}: {report.max_statements} max, "
+                f"{report.statements / report.calls:.1f} mean statements{flag}"
+            )
+
+
+@contextmanager
+def record_calls() -> Iterator[list[EndpointCall]]:
+    """Records the statements of the calls made in this context."""
+
+    calls = []
+
+    def observer(endpoint: str, statements: StatementCount) -> None:
+        calls.append(EndpointCall(endpoint, statements.count, Counter(statements.texts or {})))
+
+    statement_observers.append(observer)
+    try:
+        yield calls
+    finally:
+        statement_observers.remove(observer)
+
+
+def check_query_budgets(item: pytest.Item, calls: list[EndpointCall]) -> None:
+    """Fails the test if any call exceeds the budgets declared by its query_budget markers."""
+
+    violations = []
+    for marker in item.iter_markers("query_budget"):
+        budget = _budget(*marker.args, **marker.kwargs)
+        for call in calls:
+            if budget["endpoint"] is not None and call.endpoint != budget["endpoint"]:
+                continue
+
+            if call.statements > budget["statements"]:
+                violations.append(
+                    f"{call.endpoint} executed {call.statements} SQL statements, "
+                    f"over the budget of {budget['statements']}"
+                )
+
+            if budget["repeats"] is not None and call.max_repeats > budget["repeats"]:
+                text = call.texts.most_common(1)[0][0]
+                violations.append(
+                    f"{call.endpoint} executed the same SQL statement {call.max_repeats} times, "
+                    f"over the budget of {budget['repeats']}: {text}"
+                )
+
+    if violations:
+        pytest.fail("Query budget exceeded:\n" + "\n".join(violations), pytrace=False)
+
+
+def _budget(
+    statements: int, endpoint: str | None = None, repeats: int | None = None
+) -> dict[str, Any]:
+    return {"statements": statements, "endpoint": endpoint, "repeats": repeats}
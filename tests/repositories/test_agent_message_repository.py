@@ -0,0 +1,199 @@
+import json
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any
+
+import pytest
+import pytest_asyncio
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app.core.database import Session
+from app.models.agent import HistoryStrategy
+from app.repositories.agent_message_repository import AgentMessageRepository
+
+SEEDED_AGENTS = 1_000
+SEEDED_MESSAGES = 1_000_000
+
+HISTORY_INDEXES = {
+    "ix_agentmessage_agent_id_timestamp",
+    "ix_agentmessage_caller_agent_id_timestamp",
+}
+
+
+@pytest_asyncio.fixture(scope="module")
+async def seeded_agent_id() -> AsyncGenerator[int, None]:
+    """Seeds a message table of a million messages spread over a thousand agents."""
+
+    async with Session() as session:
+        agent_ids = await session.exec(
+            sa.text(
+                "INSERT INTO agent (name, external_state, internal_state) "
+                "SELECT 'Agent ' || i, '{}', '{}' FROM generate_series(1, :agents) AS i "
+                "RETURNING id"
+            ).bindparams(agents=SEEDED_AGENTS)
+        )
+        first_agent_id = min(agent_id for (agent_id,) in agent_ids.all())
+
+        await session.exec(
+            sa.text(
+                "INSERT INTO agentmessage (agent_id, caller_agent_id, query, response, timestamp) "
+                "SELECT :first_agent_id + i % :agents, :first_agent_id + (i * 7 + 1) % :agents, "
+                '\'query \' || i, \'{"response": "response", "actions": []}\', '
+                "now() - i * interval '1 second' "
+                "FROM generate_series(1, :messages) AS i"
+            ).bindparams(
+                first_agent_id=first_agent_id, agents=SEEDED_AGENTS, messages=SEEDED_MESSAGES
+            )
+        )
+        await session.commit()
+        await session.exec(sa.text("ANALYZE agent, agentmessage"))
+
+    yield first_agent_id
+
+    async with Session() as session:
+        await session.exec(sa.text("TRUNCATE TABLE agentmessage, agent CASCADE"))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="module")
+async def empty_partitions(seeded_agent_id) -> set[str]:
+    """The partitions without seeded messages, which the planner may scan sequentially."""
+
+    async with Session() as session:
+        result = await session.exec(
+            sa.text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = CAST('agentmessage' AS regclass) "
+                "AND child.reltuples <= 0"
+            )
+        )
+        return {name for (name,) in result.all()}
+
+
+@pytest.fixture
+def explain() -> Callable[[Callable[[AgentMessageRepository], Awaitable[Any]]], Awaitable[dict]]:
+    """
+    Runs the repository call and returns the query plan of its last statement,
+    with the indexes of the partitions named after the table indexes they belong to.
+    """
+
+    async def _explain(find: Callable[[AgentMessageRepository], Awaitable[Any]]) -> dict:
+        statements = []
+
+        def capture_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        engine = Session.kw["bind"].sync_engine
+        event.listen(engine, "before_cursor_execute", capture_statement)
+        try:
+            async with Session() as session:
+                await find(AgentMessageRepository(session))
+                statement, parameters = statements[-1]
+
+                connection = await session.connection()
+                result = await connection.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                )
+                plan = result.scalar()
+
+                result = await connection.exec_driver_sql(
+                    "SELECT child.relname, parent.relname FROM pg_inherits "
+                    "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                    "JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent "
+                    "WHERE parent.relkind = 'I'"
+                )
+                table_indexes = dict(result.all())
+        finally:
+            event.remove(engine, "before_cursor_execute", capture_statement)
+
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        for node in plan_nodes(plan[0]["Plan"]):
+            if "Index Name" in node:
+                node["Index Name"] = table_indexes.get(node["Index Name"], node["Index Name"])
+
+        return plan[0]["Plan"]
+
+    return _explain
+
+
+def plan_nodes(plan: dict) -> list[dict]:
+    return [plan, *(node for child in plan.get("Plans", []) for node in plan_nodes(child))]
+
+
+def history_index_scans(plan: dict) -> list[dict]:
+    return [node for node in plan_nodes(plan) if node.get("Index Name") in HISTORY_INDEXES]
+
+
+def assert_uses_history_indexes(plan: dict, empty_partitions: set[str]) -> None:
+    nodes = plan_nodes(plan)
+    assert not [
+        node
+        for node in nodes
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] not in empty_partitions
+    ]
+    assert {node.get("Index Name") for node in nodes} >= HISTORY_INDEXES
+
+
+@pytest.mark.parametrize(
+    ("strategy", "limit"),
+    [
+        (HistoryStrategy.LAST_MESSAGES, 50),
+        (HistoryStrategy.TOKEN_BUDGET, 2_000),
+        (HistoryStrategy.TIME_WINDOW, 3_600),
+    ],
+)
+async def test_find_conversation_history__uses_history_indexes(
+    explain, seeded_agent_id, empty_partitions, strategy, limit
+):
+    # when
+    plan = await explain(
+        lambda repository: repository.find_conversation_history(
+            seeded_agent_id, strategy, limit, max_messages=200
+        )
+    )
+
+    # then
+    assert_uses_history_indexes(plan, empty_partitions)
+
+
+async def test_find_conversation_history__last_messages__stops_after_limit(
+    explain, seeded_agent_id
+):
+    # when
+    plan = await explain(
+        lambda repository: repository.find_conversation_history(
+            seeded_agent_id, HistoryStrategy.LAST_MESSAGES, 50, max_messages=200
+        )
+    )
+
+    # then
+    branch_limits = [
+        node
+        for node in plan_nodes(plan)[1:]
+        if node["Node Type"] == "Limit" and history_index_scans(node)
+    ]
+    assert len(branch_limits) == 2
+    assert sum(len(history_index_scans(node)) for node in branch_limits) == len(
+        history_index_scans(plan)
+    )
+
+
+async def test_find_all_by_agent_id__uses_history_indexes(
+    explain, seeded_agent_id, empty_partitions
+):
+    # when
+    plan = await explain(lambda repository: repository.find_all_by_agent_id(seeded_agent_id))
+
+    # then
+    assert_uses_history_indexes(plan, empty_partitions)
+
+
+async def test_sum_estimated_tokens__uses_history_indexes(
+    explain, seeded_agent_id, empty_partitions
+):
+    # when
+    plan = await explain(lambda repository: repository.sum_estimated_tokens(seeded_agent_id))
+
+    # then
+    assert_uses_history_indexes(plan, empty_partitions)
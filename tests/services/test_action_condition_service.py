@@ -0,0 +1,51 @@
+from app.models import Action, ActionCondition, ActionConditionOperator, GlobalState
+from app.models.action_condition import ActionConditionUpdateRequest, ComparisonMethod
+from app.models.action_condition_operator import LogicalOperator
+from app.repositories.action_condition_repository import ActionConditionRepository
+from app.services.action_condition_service import ActionConditionService, condition_tree_cache
+from app.services.global_state_service import GlobalStateService
+
+
+async def test_get_compiled_condition_trees__tree_updated_while_loaded__not_cached(
+    insert, cleanup_db, monkeypatch
+):
+    # given
+    await GlobalStateService().update_state(GlobalState(id=1, state={"value": 1}))
+
+    action = await insert(Action(name="Action"))
+    root = await insert(
+        ActionConditionOperator(logical_operator=LogicalOperator.AND, action_id=action.id)
+    )
+    root.root_id = root.id
+    root = await insert(root)
+    condition = await insert(
+        ActionCondition(
+            parent_id=root.id,
+            root_id=root.id,
+            state_variable_name="value",
+            comparison=ComparisonMethod.EQUAL,
+            expected_value="1",
+        )
+    )
+
+    find_all_by_root_ids = ActionConditionRepository.find_all_by_root_ids
+
+    async def find_all_by_root_ids_then_update(
+        self: ActionConditionRepository, root_ids: list[int]
+    ) -> list[ActionCondition]:
+        conditions = await find_all_by_root_ids(self, root_ids)
+        await ActionConditionService().update_condition(
+            condition.id, ActionConditionUpdateRequest(expected_value="2")
+        )
+        return conditions
+
+    monkeypatch.setattr(
+        ActionConditionRepository, "find_all_by_root_ids", find_all_by_root_ids_then_update
+    )
+
+    # when
+    compiled_trees = await ActionConditionService().get_compiled_condition_trees([action.id])
+
+    # then
+    assert compiled_trees[action.id].root_id == root.id
+    assert condition_tree_cache.get(action.id) is None
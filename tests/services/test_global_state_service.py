@@ -0,0 +1,136 @@
+import pytest
+
+from app.models import GlobalState
+from app.models.global_state_store import global_state_store
+from app.models.state_patch import JsonPatchOperation
+from app.models.state_subscriptions import GLOBAL_STATE_TOPIC, state_subscriptions
+from app.repositories.unit_of_work import UnitOfWork
+from app.services import global_state_service
+from app.services.global_state_service import STATE_ID, GlobalStateService
+from app.workers.state_flush_worker import StateFlushWorker
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    monkeypatch.setattr(global_state_service, "STATE_FLUSH_INTERVAL", 60)
+
+
+class FailingCommitUnitOfWork(UnitOfWork):
+    async def commit(self) -> None:
+        await self.rollback()
+        await self._session.close()
+        raise ConnectionError("Commit failed")
+
+
+async def persisted_state() -> GlobalState:
+    async with UnitOfWork() as uow:
+        return await uow.state.find_by_id(STATE_ID)
+
+
+async def test_update_state__write_behind__served_from_memory_until_flushed(
+    cleanup_db, write_behind
+):
+    # given
+    state_service = GlobalStateService()
+
+    # when
+    await state_service.update_state(GlobalState(id=STATE_ID, state={"counter": 1}))
+    await state_service.update_state(GlobalState(id=STATE_ID, state={"counter": 2}))
+
+    # then
+    global_state = await state_service.get_state()
+    assert global_state.state == {"counter": 2}
+    assert global_state.version == 2
+    persisted = await persisted_state()
+    assert persisted.state == {}
+    assert persisted.version == 0
+
+    assert await state_service.flush_state() is True
+    persisted = await persisted_state()
+    assert persisted.state == {"counter": 2}
+    assert persisted.version == 2
+    assert global_state_store.dirty is False
+    assert await state_service.flush_state() is False
+
+
+async def test_update_state__write_through__persisted(cleanup_db, monkeypatch):
+    # given
+    monkeypatch.setattr(global_state_service, "STATE_FLUSH_INTERVAL", 0)
+
+    # when
+    await GlobalStateService().update_state(GlobalState(id=STATE_ID, state={"counter": 1}))
+
+    # then
+    persisted = await persisted_state()
+    assert persisted.state == {"counter": 1}
+    assert persisted.version == 1
+    assert global_state_store.dirty is False
+
+
+async def test_update_state__caller_mutates_state__store_unchanged(cleanup_db, write_behind):
+    # given
+    state = {"player": {"hp": 10}}
+    await GlobalStateService().update_state(GlobalState(id=STATE_ID, state=state))
+
+    # when
+    state["player"]["hp"] = 0
+
+    # then
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {"player": {"hp": 10}}
+
+
+async def test_patch_state__pending_updates__flushed_before_patch(cleanup_db, write_behind):
+    # given
+    state_service = GlobalStateService()
+    await state_service.update_state(GlobalState(id=STATE_ID, state={"counter": 1}))
+
+    # when
+    version = await state_service.patch_state(
+        [JsonPatchOperation(op="replace", path="/counter", value=2)]
+    )
+
+    # then
+    assert version == 2
+    global_state = await state_service.get_state()
+    assert global_state.state == {"counter": 2}
+    assert global_state.version == 2
+    persisted = await persisted_state()
+    assert persisted.state == {"counter": 2}
+    assert persisted.version == 2
+    assert global_state_store.dirty is False
+
+
+async def test_patch_state__commit_fails__store_and_subscribers_unchanged(cleanup_db):
+    # given
+    await GlobalStateService().update_state(GlobalState(id=STATE_ID, state={"counter": 1}))
+    state_subscriptions.subscribe("sid", GLOBAL_STATE_TOPIC, "/counter")
+
+    # when
+    with pytest.raises(ConnectionError):
+        await GlobalStateService(FailingCommitUnitOfWork()).patch_state(
+            [JsonPatchOperation(op="replace", path="/counter", value=2)]
+        )
+
+    # then
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {"counter": 1}
+    assert global_state.version == 1
+    assert state_subscriptions.pop_changes() == []
+    state_subscriptions.clear()
+
+
+async def test_state_flush_worker_stop__pending_updates__flushed(cleanup_db, write_behind):
+    # given
+    worker = StateFlushWorker()
+    worker.start()
+    await GlobalStateService().update_state(GlobalState(id=STATE_ID, state={"counter": 1}))
+
+    # when
+    await worker.stop()
+
+    # then
+    assert worker.running is False
+    persisted = await persisted_state()
+    assert persisted.state == {"counter": 1}
+    assert persisted.version == 1
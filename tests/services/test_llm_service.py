@@ -0,0 +1,57 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from langchain_core.runnables import RunnableConfig
+
+from app.errors.llm import LLMResponseError
+from app.llm.fake_chat_model import FakeChatModel
+from app.models import Agent
+from app.services.llm_service import OPENAI_MODEL, LLMService, chat_models
+
+
+@pytest_asyncio.fixture
+async def close_chat_models() -> AsyncGenerator[None, None]:
+    yield
+    await chat_models.aclose()
+
+
+async def test_stream_agent_chain__no_chain_end__error_raised():
+    # given
+    deltas = []
+
+    async def on_response_delta(delta: str) -> None:
+        deltas.append(delta)
+
+    # A chat model streams its tokens without the chain end event of a parsed response
+    chain = FakeChatModel()
+
+    # when
+    with pytest.raises(LLMResponseError) as error:
+        await LLMService()._stream_agent_chain(
+            chain, "sing me a song", RunnableConfig(), on_response_delta
+        )
+
+    # then
+    assert str(error.value) == (
+        "The response stream of the chain ended without a parsed response, got NoneType"
+    )
+    assert deltas == []
+
+
+async def test_get_agent_chain__chat_model_registered__chain_of_new_model(close_chat_models):
+    # given
+    agent = Agent(id=1, name="Agent")
+    llm_service = LLMService()
+
+    chat_models.register(OPENAI_MODEL, FakeChatModel())
+    chain = llm_service._get_agent_chain(agent, [])
+    assert llm_service._get_agent_chain(agent, []) is chain
+
+    # when
+    chat_models.register(OPENAI_MODEL, FakeChatModel())
+    new_chain = llm_service._get_agent_chain(agent, [])
+
+    # then
+    assert new_chain is not chain
+    assert llm_service._get_agent_chain(agent, []) is new_chain
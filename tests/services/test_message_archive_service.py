@@ -0,0 +1,181 @@
+from collections.abc import AsyncGenerator
+from datetime import UTC, date, datetime
+
+import pytest_asyncio
+import sqlalchemy as sa
+
+from app.core.database import Session
+from app.models import Agent, AgentMessage, Player
+from app.models.agent_message import QueryResponseDict
+from app.models.agent_message_partition import AgentMessagePartition
+from app.repositories.unit_of_work import UnitOfWork
+from app.services.agent_service import AgentService
+from app.services.message_archive_service import MessageArchiveService
+
+MARCH_2020 = AgentMessagePartition(date(2020, 3, 1))
+
+
+@pytest_asyncio.fixture
+async def drop_created_partitions() -> AsyncGenerator[None, None]:
+    async with UnitOfWork() as uow:
+        existing = set(await uow.partitions.find_all())
+
+    yield
+
+    async with UnitOfWork() as uow:
+        for partition in await uow.partitions.find_all():
+            if partition not in existing:
+                await uow.partitions.drop(partition)
+
+
+async def create_partition(partition: AgentMessagePartition) -> None:
+    async with UnitOfWork() as uow:
+        await uow.partitions.create(partition)
+
+
+async def table_of(message: AgentMessage) -> str:
+    async with Session() as session:
+        result = await session.exec(
+            sa.text(
+                "SELECT CAST(tableoid::regclass AS text) FROM agentmessage WHERE id = :id"
+            ).bindparams(id=message.id)
+        )
+        return result.one()[0]
+
+
+def message_at(agent: Agent, player: Player, timestamp: datetime) -> AgentMessage:
+    return AgentMessage(
+        agent_id=agent.id,
+        caller_player_id=player.id,
+        query="Hello",
+        response=QueryResponseDict(response="Hello", actions=[]),
+        timestamp=timestamp,
+    )
+
+
+async def test_create_upcoming_partitions__messages_in_default_partition__moved(
+    insert, cleanup_db, drop_created_partitions
+):
+    # given
+    player = await insert(Player(name="Player"))
+    agent = await insert(Agent(name="Agent"))
+    message = await insert(message_at(agent, player, datetime(2030, 1, 20, tzinfo=UTC)))
+    assert await table_of(message) == "agentmessage_default"
+
+    # when
+    created = await MessageArchiveService().create_upcoming_partitions(
+        now=datetime(2030, 1, 15, tzinfo=UTC)
+    )
+
+    # then
+    assert [partition.name for partition in created] == [
+        "agentmessage_p2030_01",
+        "agentmessage_p2030_02",
+        "agentmessage_p2030_03",
+    ]
+    assert await table_of(message) == "agentmessage_p2030_01"
+    assert await AgentService().get_agent_messages(agent.id) == [message]
+
+
+async def test_archive_expired_partitions__expired__archived_and_restored(
+    insert, cleanup_db, drop_created_partitions, tmp_path
+):
+    # given
+    await create_partition(MARCH_2020)
+    player = await insert(Player(name="Player"))
+    agent = await insert(Agent(name="Agent", message_retention_days=30))
+    messages = [
+        await insert(message_at(agent, player, datetime(2020, 3, day, tzinfo=UTC)))
+        for day in (1, 31)
+    ]
+    archive_service = MessageArchiveService()
+
+    # when
+    paths = await archive_service.archive_expired_partitions(
+        now=datetime(2020, 5, 1, tzinfo=UTC), archive_dir=tmp_path
+    )
+
+    # then
+    assert paths == [tmp_path / "agentmessage_p2020_03.jsonl.gz"]
+    assert await AgentService().get_agent_messages(agent.id) == []
+    async with UnitOfWork() as uow:
+        assert MARCH_2020 not in await uow.partitions.find_all()
+
+    # when
+    restored = await archive_service.restore_archive(paths[0])
+
+    # then
+    assert restored == len(messages)
+    assert await AgentService().get_agent_messages(agent.id) == messages
+    assert await table_of(messages[0]) == MARCH_2020.name
+
+
+async def test_find_expired_partitions__retention_not_exceeded__not_expired(
+    insert, cleanup_db, drop_created_partitions
+):
+    # given
+    await create_partition(MARCH_2020)
+    player = await insert(Player(name="Player"))
+    short_retention_agent = await insert(Agent(name="Agent 1", message_retention_days=1))
+    long_retention_agent = await insert(Agent(name="Agent 2", message_retention_days=90))
+    kept_forever_agent = await insert(Agent(name="Agent 3"))
+    await insert(
+        message_at(short_retention_agent, player, datetime(2020, 3, 10, tzinfo=UTC)),
+        message_at(long_retention_agent, player, datetime(2020, 3, 10, tzinfo=UTC)),
+    )
+    archive_service = MessageArchiveService()
+
+    # when
+    expired_before_long_retention = await archive_service.find_expired_partitions(
+        now=datetime(2020, 5, 1, tzinfo=UTC)
+    )
+    expired_after_long_retention = await archive_service.find_expired_partitions(
+        now=datetime(2020, 7, 1, tzinfo=UTC)
+    )
+    await insert(message_at(kept_forever_agent, player, datetime(2020, 3, 10, tzinfo=UTC)))
+    expired_with_kept_forever_agent = await archive_service.find_expired_partitions(
+        now=datetime(2030, 1, 1, tzinfo=UTC)
+    )
+
+    # then
+    assert MARCH_2020 not in expired_before_long_retention
+    assert MARCH_2020 in expired_after_long_retention
+    assert MARCH_2020 not in expired_with_kept_forever_agent
+
+
+async def test_archive_expired_messages__partition_kept__expired_messages_archived_and_restored(
+    insert, cleanup_db, drop_created_partitions, tmp_path
+):
+    # given
+    await create_partition(MARCH_2020)
+    player = await insert(Player(name="Player"))
+    short_retention_agent = await insert(Agent(name="Agent 1", message_retention_days=30))
+    kept_forever_agent = await insert(Agent(name="Agent 2"))
+    expired_message, kept_message, kept_forever_message = await insert(
+        message_at(short_retention_agent, player, datetime(2020, 3, 1, tzinfo=UTC)),
+        message_at(short_retention_agent, player, datetime(2020, 3, 31, tzinfo=UTC)),
+        message_at(kept_forever_agent, player, datetime(2020, 3, 1, tzinfo=UTC)),
+    )
+    archive_service = MessageArchiveService()
+    now = datetime(2020, 4, 15, tzinfo=UTC)
+
+    # when
+    expired_partitions = await archive_service.find_expired_partitions(now)
+    path = await archive_service.archive_expired_messages(now=now, archive_dir=tmp_path)
+
+    # then
+    assert MARCH_2020 not in expired_partitions
+    assert path == tmp_path / "agentmessage_expired_20200415T000000.jsonl.gz"
+    assert await AgentService().get_agent_messages(short_retention_agent.id) == [kept_message]
+    assert await AgentService().get_agent_messages(kept_forever_agent.id) == [kept_forever_message]
+    assert await archive_service.archive_expired_messages(now=now, archive_dir=tmp_path) is None
+
+    # when
+    restored = await archive_service.restore_archive(path)
+
+    # then
+    assert restored == 1
+    assert await AgentService().get_agent_messages(short_retention_agent.id) == [
+        expired_message,
+        kept_message,
+    ]
@@ -1,6 +1,20 @@
+from collections.abc import AsyncGenerator
+
 import pytest
+import pytest_asyncio
+
+from app.services.llm_service import chat_models
 
 
 @pytest.fixture(scope="module")
 def sid() -> str:
     return "test_sid"
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def reset_llm_clients() -> AsyncGenerator[None, None]:
+    """Drops the shared chat models, which may be patched."""
+
+    yield
+
+    await chat_models.aclose()
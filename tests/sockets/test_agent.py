@@ -1,26 +1,54 @@
-from collections.abc import Generator
+import ast
+import asyncio
+import json
+from collections.abc import AsyncGenerator, Generator
+from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, call, patch
 from uuid import UUID, uuid4
 
 import pytest
 import pytest_asyncio
+from langchain_core.language_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import create_async_engine
+from testcontainers.postgres import PostgresContainer
 
+from app.core.database import Session
+from app.core.metrics import metrics
+from app.llm.fake_chat_model import FakeChatModel
 from app.llm.models import ChainOutput
 from app.models import Action, ActionConditionOperator, ActionParam, Agent, AgentMessage, Player
 from app.models.action_condition import ActionCondition, ComparisonMethod, LogicalOperator
 from app.models.action_param import ActionParamType
+from app.models.agent import HistoryStrategy
 from app.models.agent_message import ActionResponseDict, QueryResponseDict
 from app.services.agent_service import AgentService
-from app.sockets.agent import query_agent
-from app.sockets.models import ActionQueryResponse, AgentQueryRequest, AgentQueryResponse
+from app.services.llm_service import chat_models
+from app.sockets.agent import (
+    query_agent,
+    spectate_agent,
+    spectate_player,
+    stop_spectating_agent,
+)
+from app.sockets.models import (
+    ActionQueryResponse,
+    AgentQueryRequest,
+    AgentQueryResponse,
+    UpdateStateRequest,
+)
+from app.sockets.state import update_global_state
+from app.workers.summarization_worker import summarization_worker
 
 
 @pytest.fixture(scope="module")
 def query_id() -> Generator[UUID, None, None]:
-    with patch("app.sockets.models.uuid4") as mock_uuid4:
-        query_id = uuid4()
-        mock_uuid4.return_value = query_id
+    query_id = uuid4()
+    with (
+        patch("app.sockets.models.uuid4", return_value=query_id),
+        patch("app.sockets.agent.uuid4", return_value=query_id),
+    ):
         yield query_id
 
 
@@ -34,6 +62,8 @@ def chat_model() -> Generator[MagicMock, None, None]:
 def sio() -> Generator[MagicMock, None, None]:
     with patch("app.sockets.agent.sio") as mock_sio:
         mock_sio.emit = AsyncMock()
+        mock_sio.enter_room = AsyncMock()
+        mock_sio.leave_room = AsyncMock()
         yield mock_sio
 
 
@@ -96,6 +126,82 @@ async def agent_with_action(insert, sample_action: Action) -> Agent:
     return await insert(agent)
 
 
+@pytest_asyncio.fixture
+async def agent_with_sibling_triggers(insert) -> tuple[Agent, Agent, Agent]:
+    agent_2 = Agent(name="Agent 2", instructions="Instructions for agent 2")
+    agent_3 = Agent(name="Agent 3", instructions="Instructions for agent 3")
+    agent_2, agent_3 = await insert(agent_2, agent_3)
+
+    actions = [
+        Action(
+            name=f"Ask {triggered_agent.name}",
+            description=f"Ask {triggered_agent.name} a question",
+            params=[
+                ActionParam(
+                    name="question",
+                    description="The question",
+                    type=ActionParamType.STRING,
+                    action_id=0,
+                )
+            ],
+            triggered_agent_id=triggered_agent.id,
+        )
+        for triggered_agent in (agent_2, agent_3)
+    ]
+    agent = Agent(name="Agent 1", instructions="Instructions for agent 1", actions=actions)
+    agent = await insert(agent)
+
+    return agent, agent_2, agent_3
+
+
+@pytest.fixture
+def respond_by_query():
+    def _respond(responses: dict[str, ChainOutput | BaseException]):
+        def _side_effect(prompt) -> ChainOutput:
+            query = ast.literal_eval(prompt.to_messages()[-1].content)["query"]
+            response = responses[query]
+            if isinstance(response, BaseException):
+                raise response
+
+            return response
+
+        return _side_effect
+
+    return _respond
+
+
+@pytest_asyncio.fixture
+async def summarization() -> AsyncGenerator[FakeListChatModel, None]:
+    summary_chat_model = FakeListChatModel(responses=["The player asked for songs."])
+    with (
+        patch("app.services.summary_service.SUMMARY_MODEL", "fake-summarizer"),
+        patch("app.services.summary_service.SUMMARY_TOKEN_THRESHOLD", 1),
+        patch("app.services.summary_service.SUMMARY_KEEP_MESSAGES", 1),
+    ):
+        chat_models.register("fake-summarizer", summary_chat_model)
+        summarization_worker.start()
+
+        yield summary_chat_model
+
+        await summarization_worker.stop()
+
+
+@pytest_asyncio.fixture
+async def limited_pool(setup: PostgresContainer) -> AsyncGenerator[int, None]:
+    pool_size = 2
+    engine = create_async_engine(
+        setup.get_connection_url(), pool_size=pool_size, max_overflow=0, pool_timeout=5
+    )
+    bind = Session.kw["bind"]
+    Session.configure(bind=engine)
+
+    yield pool_size
+
+    Session.configure(bind=bind)
+    await engine.dispose()
+
+
+@pytest.mark.query_budget(14, repeats=2)
 async def test_query_agent__success(
     sio,
     sid,
@@ -153,10 +259,11 @@ async def test_query_agent__success(
             )
         ],
     )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_has_awaits(
         [
-            call("agent_response", expected_agent_response.model_dump()),
-            call("agent_response_end", {"query_id": str(query_id)}),
+            call("agent_response", expected_agent_response.model_dump(), to=recipients),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
         ]
     )
 
@@ -170,6 +277,7 @@ async def test_query_agent__success(
     assert message.caller_agent_id is None
 
 
+@pytest.mark.query_budget(30, repeats=4)
 async def test_query_agent__trigger_agents__success(
     sio,
     sid,
@@ -293,12 +401,21 @@ async def test_query_agent__trigger_agents__success(
         response="Agent 3 here, the meaning of life is 42.",
         actions=[],
     )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_has_awaits(
         [
-            call("agent_response", expected_agent_response_1.model_dump()),
-            call("agent_response", expected_agent_response_2.model_dump()),
-            call("agent_response", expected_agent_response_3.model_dump()),
-            call("agent_response_end", {"query_id": str(query_id)}),
+            call("agent_response", expected_agent_response_1.model_dump(), to=recipients),
+            call(
+                "agent_response",
+                expected_agent_response_2.model_dump(),
+                to=[*recipients, f"agent:{agent_2.id}"],
+            ),
+            call(
+                "agent_response",
+                expected_agent_response_3.model_dump(),
+                to=[*recipients, f"agent:{agent_3.id}"],
+            ),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
         ]
     )
     logger.warning.assert_not_called()
@@ -412,6 +529,7 @@ async def test_query_agent__condition_evaluation_error(sio, sid, sample_player,
 
     # then
     assert result == {"success": False}
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_awaited_once_with(
         "agent_response_error",
         {
@@ -420,6 +538,7 @@ async def test_query_agent__condition_evaluation_error(sio, sid, sample_player,
                 "state_var=active, expected_value=123"
             )
         },
+        to=recipients,
     )
 
 
@@ -436,8 +555,9 @@ async def test_query_agent__internal_server_error(
 
     # then
     assert result == {"success": False}
+    recipients = [sid, f"agent:{sample_agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_awaited_once_with(
-        "agent_response_error", {"error": "Internal server error: LLM error"}
+        "agent_response_error", {"error": "Internal server error: LLM error"}, to=recipients
     )
 
 
@@ -537,9 +657,10 @@ async def test_query_agent__trigger_agents__condition_evaluation_error(
             )
         ],
     )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_has_awaits(
         [
-            call("agent_response", expected_agent_response.model_dump()),
+            call("agent_response", expected_agent_response.model_dump(), to=recipients),
             call(
                 "agent_response_error",
                 {
@@ -548,8 +669,9 @@ async def test_query_agent__trigger_agents__condition_evaluation_error(
                         "state_var=active, expected_value=123"
                     )
                 },
+                to=recipients,
             ),
-            call("agent_response_end", {"query_id": str(query_id)}),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
         ]
     )
     logger.warning.assert_not_called()
@@ -611,11 +733,16 @@ async def test_query_agent__trigger_agents__internal_server_error(
             )
         ],
     )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
     sio.emit.assert_has_awaits(
         [
-            call("agent_response", expected_agent_response.model_dump()),
-            call("agent_response_error", {"error": "Internal server error: LLM error"}),
-            call("agent_response_end", {"query_id": str(query_id)}),
+            call("agent_response", expected_agent_response.model_dump(), to=recipients),
+            call(
+                "agent_response_error",
+                {"error": "Internal server error: LLM error"},
+                to=recipients,
+            ),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
         ]
     )
     logger.warning.assert_not_called()
@@ -624,6 +751,713 @@ async def test_query_agent__trigger_agents__internal_server_error(
     )
 
 
+@pytest.mark.query_budget(23, repeats=3)
+async def test_query_agent__trigger_agents__siblings__success(
+    sio,
+    sid,
+    query_id,
+    chat_model,
+    build_actions_model,
+    respond_by_query,
+    sample_player,
+    agent_with_sibling_triggers,
+    cleanup_db,
+):
+    # given
+    agent, agent_2, agent_3 = agent_with_sibling_triggers
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="ask them")
+
+    chat_model.side_effect = respond_by_query(
+        {
+            request.query: ChainOutput(
+                response="Asking both agents.",
+                actions=build_actions_model(
+                    {
+                        "Ask Agent 2": {"question": "Question 2"},
+                        "Ask Agent 3": {"question": "Question 3"},
+                    }
+                ),
+            ),
+            str({"question": "Question 2"}): ChainOutput(
+                response="Agent 2 here.", actions=build_actions_model({})
+            ),
+            str({"question": "Question 3"}): ChainOutput(
+                response="Agent 3 here.", actions=build_actions_model({})
+            ),
+        }
+    )
+
+    # when
+    result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": True}
+    expected_agent_response_2 = AgentQueryResponse(
+        query_id=query_id, agent_id=agent_2.id, response="Agent 2 here.", actions=[]
+    )
+    expected_agent_response_3 = AgentQueryResponse(
+        query_id=query_id, agent_id=agent_3.id, response="Agent 3 here.", actions=[]
+    )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
+    sio.emit.assert_has_awaits(
+        [
+            call(
+                "agent_response",
+                expected_agent_response_2.model_dump(),
+                to=[*recipients, f"agent:{agent_2.id}"],
+            ),
+            call(
+                "agent_response",
+                expected_agent_response_3.model_dump(),
+                to=[*recipients, f"agent:{agent_3.id}"],
+            ),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
+        ]
+    )
+
+    for triggered_agent, expected_response, question in (
+        (agent_2, expected_agent_response_2, "Question 2"),
+        (agent_3, expected_agent_response_3, "Question 3"),
+    ):
+        messages = await AgentService().get_agent_messages(triggered_agent.id)
+        assert len(messages) == 1
+        assert messages[0].caller_agent_id == agent.id
+        assert messages[0].query == str({"question": question})
+        assert messages[0].response == expected_response.to_message_response()
+
+
+async def test_query_agent__trigger_agents__siblings__partial_failure(
+    sio,
+    sid,
+    query_id,
+    chat_model,
+    logger,
+    build_actions_model,
+    respond_by_query,
+    sample_player,
+    agent_with_sibling_triggers,
+    cleanup_db,
+):
+    # given
+    agent, agent_2, agent_3 = agent_with_sibling_triggers
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="ask them")
+
+    chat_model.side_effect = respond_by_query(
+        {
+            request.query: ChainOutput(
+                response="Asking both agents.",
+                actions=build_actions_model(
+                    {
+                        "Ask Agent 2": {"question": "Question 2"},
+                        "Ask Agent 3": {"question": "Question 3"},
+                    }
+                ),
+            ),
+            str({"question": "Question 2"}): Exception("LLM error"),
+            str({"question": "Question 3"}): ChainOutput(
+                response="Agent 3 here.", actions=build_actions_model({})
+            ),
+        }
+    )
+
+    # when
+    result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": False}
+    expected_agent_response_3 = AgentQueryResponse(
+        query_id=query_id, agent_id=agent_3.id, response="Agent 3 here.", actions=[]
+    )
+    recipients = [sid, f"agent:{agent.id}", f"player:{sample_player.id}"]
+    sio.emit.assert_has_awaits(
+        [
+            call(
+                "agent_response_error",
+                {"error": "Internal server error: LLM error"},
+                to=recipients,
+            ),
+            call(
+                "agent_response",
+                expected_agent_response_3.model_dump(),
+                to=[*recipients, f"agent:{agent_3.id}"],
+            ),
+            call("agent_response_end", {"query_id": str(query_id)}, to=recipients),
+        ]
+    )
+
+    assert await AgentService().get_agent_messages(agent_2.id) == []
+    messages = await AgentService().get_agent_messages(agent_3.id)
+    assert len(messages) == 1
+    assert messages[0].caller_agent_id == agent.id
+
+
+async def test_query_agent__trigger_agents__sibling_cancelled__cancellation_raised(
+    sio,
+    sid,
+    chat_model,
+    build_actions_model,
+    respond_by_query,
+    sample_player,
+    agent_with_sibling_triggers,
+    cleanup_db,
+):
+    # given
+    agent, agent_2, agent_3 = agent_with_sibling_triggers
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="ask them")
+
+    chat_model.side_effect = respond_by_query(
+        {
+            request.query: ChainOutput(
+                response="Asking both agents.",
+                actions=build_actions_model(
+                    {
+                        "Ask Agent 2": {"question": "Question 2"},
+                        "Ask Agent 3": {"question": "Question 3"},
+                    }
+                ),
+            ),
+            str({"question": "Question 2"}): asyncio.CancelledError(),
+            str({"question": "Question 3"}): ChainOutput(
+                response="Agent 3 here.", actions=build_actions_model({})
+            ),
+        }
+    )
+
+    # when
+    with pytest.raises(asyncio.CancelledError):
+        await query_agent(sid, request.model_dump())
+
+    # then
+    emitted_events = [emit.args[0] for emit in sio.emit.await_args_list]
+    assert "agent_response_error" not in emitted_events
+    assert await AgentService().get_agent_messages(agent_2.id) == []
+    assert await AgentService().get_agent_messages(agent_3.id) == []
+
+
+async def test_query_agent__unavailable_actions_not_offered(
+    sio, sid, build_actions_model, sample_player, insert, cleanup_db
+):
+    # given
+    agent = Agent(
+        name="Agent",
+        internal_state={"number": 5},
+        actions=[
+            Action(name="Available Action"),
+            Action(name="Unavailable Action"),
+            Action(name="Unconditional Action"),
+        ],
+    )
+    agent = await insert(agent)
+    actions = {action.name: action for action in agent.actions}
+
+    for action_name, expected_value in (("Available Action", "1"), ("Unavailable Action", "10")):
+        root = ActionConditionOperator(
+            action_id=actions[action_name].id, logical_operator=LogicalOperator.AND
+        )
+        root = await insert(root)
+
+        root.root_id = root.id
+        root = await insert(root)
+
+        condition = ActionCondition(
+            parent_id=root.id,
+            root_id=root.id,
+            state_agent_id=agent.id,
+            state_variable_name="number",
+            comparison=ComparisonMethod.GREATER,
+            expected_value=expected_value,
+        )
+        await insert(condition)
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="hello")
+
+    # when
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        with_structured_output = mock_chat_model.return_value.with_structured_output
+        with_structured_output.return_value.return_value = ChainOutput(
+            response="Hello!", actions=build_actions_model({})
+        )
+        result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": True}
+    output_model = with_structured_output.call_args.args[0]
+    actions_model = output_model.model_fields["actions"].annotation
+    assert set(actions_model.model_fields) == {"Available Action", "Unconditional Action"}
+
+
+@pytest.mark.parametrize(
+    ("history_strategy", "history_limit"),
+    [
+        (HistoryStrategy.LAST_MESSAGES, 2),
+        (HistoryStrategy.TOKEN_BUDGET, 250),
+        (HistoryStrategy.TIME_WINDOW, 3600),
+    ],
+)
+async def test_query_agent__history_strategy__only_selected_messages_in_prompt(
+    sio,
+    sid,
+    chat_model,
+    build_actions_model,
+    sample_player,
+    insert,
+    cleanup_db,
+    history_strategy,
+    history_limit,
+):
+    # given
+    agent = Agent(name="Agent", history_strategy=history_strategy, history_limit=history_limit)
+    agent = await insert(agent)
+
+    now = datetime.now(UTC)
+    for query, timestamp in [
+        ("first " * 50, now - timedelta(days=1)),
+        ("second " * 50, now - timedelta(minutes=2)),
+        ("third " * 50, now - timedelta(minutes=1)),
+    ]:
+        message = AgentMessage(
+            agent_id=agent.id,
+            caller_player_id=sample_player.id,
+            query=query,
+            response=QueryResponseDict(response="ok", actions=[]),
+            timestamp=timestamp,
+        )
+        await insert(message)
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="hello")
+    chat_model.return_value = ChainOutput(response="Hello!", actions=build_actions_model({}))
+
+    # when
+    await query_agent(sid, request.model_dump())
+
+    # then
+    prompt_messages = chat_model.call_args.args[0].to_messages()
+    history_queries = [
+        ast.literal_eval(message.content)["query"].split()[0] for message in prompt_messages[1:-1:2]
+    ]
+    assert history_queries == ["second", "third"]
+
+
+async def test_query_agent__history_over_threshold__older_messages_summarized(
+    sio, sid, chat_model, build_actions_model, sample_player, summarization, insert, cleanup_db
+):
+    # given
+    agent = Agent(name="Singer")
+    agent = await insert(agent)
+
+    now = datetime.now(UTC)
+    messages = []
+    for query, timestamp in [
+        ("sing me a song", now - timedelta(minutes=2)),
+        ("another one", now - timedelta(minutes=1)),
+    ]:
+        message = AgentMessage(
+            agent_id=agent.id,
+            caller_player_id=sample_player.id,
+            query=query,
+            response=QueryResponseDict(response="La la la", actions=[]),
+            timestamp=timestamp,
+        )
+        messages.append(await insert(message))
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="one more")
+    chat_model.return_value = ChainOutput(response="La la la", actions=build_actions_model({}))
+
+    # when
+    await query_agent(sid, request.model_dump())
+    await summarization_worker.join()
+
+    await query_agent(sid, request.model_dump())
+
+    # then
+    summary = await AgentService().get_agent_summary(agent.id)
+    assert summary.summary == "The player asked for songs."
+    assert summary.last_message_id == messages[1].id
+
+    system_message, *history, _ = chat_model.call_args.args[0].to_messages()
+    assert "The player asked for songs." in system_message.content
+    assert [ast.literal_eval(message.content)["query"] for message in history[::2]] == ["one more"]
+
+
+async def test_query_agent__messages_deleted__summary_deleted(
+    sio, sid, chat_model, build_actions_model, sample_player, summarization, insert, cleanup_db
+):
+    # given
+    agent = Agent(name="Singer")
+    agent = await insert(agent)
+
+    message = AgentMessage(
+        agent_id=agent.id,
+        caller_player_id=sample_player.id,
+        query="sing me a song",
+        response=QueryResponseDict(response="La la la", actions=[]),
+    )
+    await insert(message)
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="one more")
+    chat_model.return_value = ChainOutput(response="La la la", actions=build_actions_model({}))
+
+    await query_agent(sid, request.model_dump())
+    await summarization_worker.join()
+    assert await AgentService().get_agent_summary(agent.id) is not None
+
+    # when
+    await AgentService().delete_agent_messages(agent.id)
+    await query_agent(sid, request.model_dump())
+
+    # then
+    assert await AgentService().get_agent_summary(agent.id) is None
+
+    system_message, *history, _ = chat_model.call_args.args[0].to_messages()
+    assert "The player asked for songs." not in system_message.content
+    assert history == []
+
+
+async def test_query_agent__history_under_threshold__not_summarized(
+    sio,
+    sid,
+    chat_model,
+    build_actions_model,
+    sample_player,
+    sample_agent,
+    summarization,
+    cleanup_db,
+):
+    # given
+    request = AgentQueryRequest(agent_id=sample_agent.id, player_id=sample_player.id, query="hi")
+    chat_model.return_value = ChainOutput(response="Hello!", actions=build_actions_model({}))
+
+    # when
+    with patch("app.services.summary_service.SUMMARY_TOKEN_THRESHOLD", 10_000):
+        await query_agent(sid, request.model_dump())
+        await summarization_worker.join()
+
+    # then
+    assert await AgentService().get_agent_summary(sample_agent.id) is None
+
+
+async def test_query_agent__repeated_queries__chat_model_and_chain_reused(
+    sio, sid, build_actions_model, sample_player, sample_agent, cleanup_db
+):
+    # given
+    request = AgentQueryRequest(agent_id=sample_agent.id, player_id=sample_player.id, query="hi")
+
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        with_structured_output = mock_chat_model.return_value.with_structured_output
+        structured_chat_model = with_structured_output.return_value
+        structured_chat_model.return_value = ChainOutput(
+            response="Hello!", actions=build_actions_model({})
+        )
+
+        # when
+        await query_agent(sid, request.model_dump())
+        await query_agent(sid, request.model_dump())
+
+    # then
+    mock_chat_model.assert_called_once()
+    with_structured_output.assert_called_once()
+
+    first_prompt, second_prompt = (
+        prompt_call.args[0] for prompt_call in structured_chat_model.call_args_list
+    )
+    assert len(first_prompt.to_messages()) == 2
+    assert len(second_prompt.to_messages()) == 4
+
+
+async def test_query_agent__global_state_updated__available_actions_refreshed(
+    sio, sid, build_actions_model, sample_player, insert, cleanup_db
+):
+    # given
+    agent = Agent(name="Agent", actions=[Action(name="Open Door")])
+    agent = await insert(agent)
+
+    root = ActionConditionOperator(
+        action_id=agent.actions[0].id, logical_operator=LogicalOperator.AND
+    )
+    root = await insert(root)
+
+    root.root_id = root.id
+    root = await insert(root)
+
+    condition = ActionCondition(
+        parent_id=root.id,
+        root_id=root.id,
+        state_variable_name="door_unlocked",
+        comparison=ComparisonMethod.EQUAL,
+        expected_value="true",
+    )
+    await insert(condition)
+
+    await update_global_state(sid, UpdateStateRequest(state={"door_unlocked": False}).model_dump())
+
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="hello")
+
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        with_structured_output = mock_chat_model.return_value.with_structured_output
+        with_structured_output.return_value.return_value = ChainOutput(
+            response="Hello!", actions=build_actions_model({})
+        )
+
+        await query_agent(sid, request.model_dump())
+        actions_before_update = with_structured_output.call_args.args[0].model_fields["actions"]
+
+        # when
+        await update_global_state(
+            sid, UpdateStateRequest(state={"door_unlocked": True}).model_dump()
+        )
+        await query_agent(sid, request.model_dump())
+        actions_after_update = with_structured_output.call_args.args[0].model_fields["actions"]
+
+    # then
+    assert set(actions_before_update.annotation.model_fields) == set()
+    assert set(actions_after_update.annotation.model_fields) == {"Open Door"}
+
+
+async def test_query_agent__concurrent_queries__not_limited_by_connections(
+    sio, sid, build_actions_model, sample_player, sample_agent, limited_pool, cleanup_db
+):
+    # given
+    concurrent_queries = limited_pool * 5
+    waiting_queries = 0
+    all_waiting = asyncio.Event()
+
+    async def _chat_model(_prompt) -> ChainOutput:
+        nonlocal waiting_queries
+        waiting_queries += 1
+        if waiting_queries == concurrent_queries:
+            all_waiting.set()
+
+        await asyncio.wait_for(all_waiting.wait(), timeout=10)
+        return ChainOutput(response="Hello!", actions=build_actions_model({}))
+
+    request = AgentQueryRequest(agent_id=sample_agent.id, player_id=sample_player.id, query="hi")
+
+    # when
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        mock_chat_model.return_value.with_structured_output.return_value = RunnableLambda(
+            _chat_model
+        )
+        results = await asyncio.gather(
+            *(query_agent(sid, request.model_dump()) for _ in range(concurrent_queries))
+        )
+
+    # then
+    assert results == [{"success": True}] * concurrent_queries
+    assert waiting_queries == concurrent_queries
+    messages = await AgentService().get_agent_messages(sample_agent.id)
+    assert len(messages) == concurrent_queries
+
+
+async def test_query_agent__stream__response_deltas_sent_before_response(
+    sio, sid, query_id, build_actions_model, sample_player, agent_with_action, cleanup_db
+):
+    # given
+    llm_output = {
+        "response": 'Sure! Here\'s a "song" for you.',
+        "actions": {"Sing": {"song_name": "Happy"}},
+    }
+
+    def _parse_output(message: AIMessage) -> ChainOutput:
+        parsed = json.loads(message.content)
+        return ChainOutput(
+            response=parsed["response"], actions=build_actions_model(parsed["actions"])
+        )
+
+    request = AgentQueryRequest(
+        agent_id=agent_with_action.id, player_id=sample_player.id, query="sing", stream=True
+    )
+
+    # when
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        chat_model = GenericFakeChatModel(messages=iter([AIMessage(json.dumps(llm_output))]))
+        mock_chat_model.return_value.with_structured_output.return_value = (
+            chat_model | RunnableLambda(_parse_output)
+        )
+        result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": True}
+    recipients = [sid, f"agent:{agent_with_action.id}", f"player:{sample_player.id}"]
+    events = [emit_call.args[0] for emit_call in sio.emit.await_args_list]
+    deltas = [emit_call.args[1] for emit_call in sio.emit.await_args_list[:-2]]
+    assert events == ["agent_response_delta"] * len(deltas) + [
+        "agent_response",
+        "agent_response_end",
+    ]
+    assert len(deltas) > 1
+    assert "".join(delta["delta"] for delta in deltas) == llm_output["response"]
+    assert all(
+        delta["query_id"] == str(query_id) and delta["agent_id"] == agent_with_action.id
+        for delta in deltas
+    )
+    assert all(emit_call.kwargs == {"to": recipients} for emit_call in sio.emit.await_args_list)
+
+    expected_agent_response = AgentQueryResponse(
+        query_id=query_id,
+        agent_id=agent_with_action.id,
+        response=llm_output["response"],
+        actions=[ActionQueryResponse(name="Sing", params={"song_name": "Happy"})],
+    )
+    assert sio.emit.await_args_list[-2] == call(
+        "agent_response", expected_agent_response.model_dump(), to=recipients
+    )
+
+
+async def test_query_agent__stream__no_parsed_response__error_sent(
+    sio, sid, sample_player, sample_agent, cleanup_db
+):
+    # given
+    request = AgentQueryRequest(
+        agent_id=sample_agent.id, player_id=sample_player.id, query="sing", stream=True
+    )
+
+    # when
+    with patch("app.services.llm_service.ChatOpenAI") as mock_chat_model:
+        # Without the structured output, the chain ends with the raw message of the model
+        mock_chat_model.return_value.with_structured_output.return_value = FakeChatModel()
+        result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": False}
+    event, data = sio.emit.await_args.args
+    assert event == "agent_response_error"
+    assert data["error"].startswith(
+        "Internal server error: The response stream of the chain ended without a parsed response"
+    )
+
+
+async def test_query_agent__timing__span_tree_sent_to_caller(
+    sio, sid, query_id, chat_model, build_actions_model, sample_player, sample_agent, cleanup_db
+):
+    # given
+    request = AgentQueryRequest(
+        agent_id=sample_agent.id, player_id=sample_player.id, query="hi", timing=True
+    )
+    chat_model.return_value = ChainOutput(response="Hello!", actions=build_actions_model({}))
+
+    # when
+    result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": True}
+    event, timing = sio.emit.await_args_list[-1].args
+    assert event == "agent_response_timing"
+    assert sio.emit.await_args_list[-1].kwargs == {"to": sid}
+    assert timing["query_id"] == str(query_id)
+
+    [root] = timing["spans"]
+    assert root["name"] == "query_agent"
+    assert root["attributes"] == {"agent_id": sample_agent.id, "player_id": sample_player.id}
+    children = {child["name"]: child for child in root["children"]}
+    llm_query = children["LLMService.query_agent"]
+    llm_steps = [child["name"] for child in llm_query["children"]]
+    assert "ActionAvailabilityService.get_available_actions" in llm_steps
+    assert llm_steps[-2:] == ["LLMService._get_agent_chain", "llm"]
+    assert "AgentService.add_agent_message" in children
+    assert "_trigger_agents" in children
+    assert all(child["duration_ms"] <= root["duration_ms"] for child in root["children"])
+
+
+async def test_query_agent__trace_export_path__otlp_trace_appended(
+    sio,
+    sid,
+    query_id,
+    chat_model,
+    build_actions_model,
+    sample_player,
+    sample_agent,
+    tmp_path,
+    cleanup_db,
+):
+    # given
+    export_path = tmp_path / "traces.jsonl"
+    request = AgentQueryRequest(agent_id=sample_agent.id, player_id=sample_player.id, query="hi")
+    chat_model.return_value = ChainOutput(response="Hello!", actions=build_actions_model({}))
+
+    # when
+    with (
+        patch("app.sockets.agent.TRACING_ENABLED", True),
+        patch("app.core.tracing.TRACING_ENABLED", True),
+        patch("app.core.tracing.TRACE_EXPORT_PATH", str(export_path)),
+    ):
+        await query_agent(sid, request.model_dump())
+
+    # then
+    [line] = export_path.read_text().splitlines()
+    [resource_spans] = json.loads(line)["resourceSpans"]
+    [scope_spans] = resource_spans["scopeSpans"]
+    spans = scope_spans["spans"]
+    assert {span["traceId"] for span in spans} == {query_id.hex}
+    assert spans[0]["name"] == "query_agent"
+    assert spans[0]["parentSpanId"] == ""
+    span_ids = {span["spanId"] for span in spans}
+    assert all(span["parentSpanId"] in span_ids for span in spans[1:])
+    assert all(int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"]) for span in spans)
+    assert "agent_response_timing" not in [
+        emit_call.args[0] for emit_call in sio.emit.await_args_list
+    ]
+
+
+async def test_query_agent__llm_call__latency_and_token_usage_recorded(
+    sio, sid, sample_player, sample_agent, cleanup_db
+):
+    # given
+    metrics.clear()
+    request = AgentQueryRequest(agent_id=sample_agent.id, player_id=sample_player.id, query="hi")
+
+    # when
+    with (
+        patch("app.services.llm_service.LLM_PROVIDER", "fake"),
+        patch("app.services.llm_service.FAKE_LLM_LATENCY", "none"),
+    ):
+        await query_agent(sid, request.model_dump())
+
+    # then
+    lines = metrics.render().splitlines()
+    assert f'llm_request_duration_seconds_count{{agent_id="{sample_agent.id}"}} 1' in lines
+    input_tokens, output_tokens = (
+        next(
+            line
+            for line in lines
+            if line.startswith(f'llm_tokens_total{{agent_id="{sample_agent.id}",type="{kind}"}}')
+        )
+        for kind in ("input", "output")
+    )
+    assert int(input_tokens.rsplit(" ", 1)[1]) > 0
+    assert int(output_tokens.rsplit(" ", 1)[1]) > 0
+
+
+async def test_query_agent__fake_llm_provider__schema_valid_actions_trigger_agents(
+    sio, sid, sample_player, agent_with_sibling_triggers, cleanup_db
+):
+    # given
+    agent, agent_2, agent_3 = agent_with_sibling_triggers
+    request = AgentQueryRequest(agent_id=agent.id, player_id=sample_player.id, query="hi")
+
+    # when
+    with (
+        patch("app.services.llm_service.LLM_PROVIDER", "fake"),
+        patch("app.services.llm_service.FAKE_LLM_LATENCY", "none"),
+        patch("app.services.llm_service.FAKE_LLM_ACTION_PROBABILITY", 1),
+    ):
+        result = await query_agent(sid, request.model_dump())
+
+    # then
+    assert result == {"success": True}
+    responses = [
+        AgentQueryResponse.model_validate(emit_call.args[1])
+        for emit_call in sio.emit.await_args_list
+        if emit_call.args[0] == "agent_response"
+    ]
+    assert [response.agent_id for response in responses] == [agent.id, agent_2.id, agent_3.id]
+    assert [action.name for action in responses[0].actions] == ["Ask Agent 2", "Ask Agent 3"]
+    assert all(isinstance(action.params["question"], str) for action in responses[0].actions)
+    assert all(response.response for response in responses)
+
+
 @pytest.mark.parametrize(
     "payload", [{}, {"agent_id": 1}, {"player_id": 1, "agent_id": 1, "query": True}]
 )
@@ -634,3 +1468,39 @@ async def test_query_agent__validation_error(sio, sid, payload):
     # then
     assert result == {"error": "Validation error."}
     sio.emit.assert_not_awaited()
+
+
+async def test_spectate_agent__success(sio, sid):
+    # when
+    response = await spectate_agent(sid, {"agent_id": 1})
+
+    # then
+    assert response == {"agent_id": 1}
+    sio.enter_room.assert_awaited_once_with(sid, "agent:1")
+
+
+async def test_stop_spectating_agent__success(sio, sid):
+    # when
+    response = await stop_spectating_agent(sid, {"agent_id": 1})
+
+    # then
+    assert response == {"agent_id": 1}
+    sio.leave_room.assert_awaited_once_with(sid, "agent:1")
+
+
+async def test_spectate_player__success(sio, sid):
+    # when
+    response = await spectate_player(sid, {"player_id": 1})
+
+    # then
+    assert response == {"player_id": 1}
+    sio.enter_room.assert_awaited_once_with(sid, "player:1")
+
+
+async def test_spectate_agent__validation_error(sio, sid):
+    # when
+    response = await spectate_agent(sid, {"agent_id": "one"})
+
+    # then
+    assert response == {"error": "Validation error."}
+    sio.enter_room.assert_not_awaited()
@@ -1,3 +1,4 @@
+import asyncio
 from collections.abc import Generator
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -9,6 +10,10 @@ from app.services.global_state_service import GlobalStateService
 from app.sockets.models import (
     AgentCombinedStateRequest,
     AgentStateRequest,
+    MergePatchAgentStateRequest,
+    MergePatchStateRequest,
+    PatchAgentStateRequest,
+    PatchStateRequest,
     UpdateAgentStateRequest,
     UpdateStateRequest,
 )
@@ -16,6 +21,12 @@ from app.sockets.state import (
     get_agent_state,
     get_combined_agent_state,
     get_global_state,
+    get_versioned_agent_state,
+    get_versioned_global_state,
+    merge_patch_agent_state,
+    merge_patch_global_state,
+    patch_agent_state,
+    patch_global_state,
     update_agent_state,
     update_global_state,
 )
@@ -211,3 +222,335 @@ async def test_get_combined_agent_state__validation_error(sio, sid, agent_id):
 
     # then
     assert response == {"error": "Validation error."}
+
+
+async def test_patch_global_state__success(sio, sid, cleanup_db):
+    # given
+    global_state = await GlobalStateService().get_state()
+    global_state.state = {
+        "counter": 1,
+        "items": ["b"],
+        "player": {"name": "Player", "hp": 10},
+        "obsolete": True,
+    }
+    await GlobalStateService().update_state(global_state)
+
+    request = PatchStateRequest.model_validate(
+        {
+            "operations": [
+                {"op": "test", "path": "/counter", "value": 1},
+                {"op": "replace", "path": "/counter", "value": 2},
+                {"op": "add", "path": "/items/0", "value": "a"},
+                {"op": "add", "path": "/items/-", "value": "c"},
+                {"op": "add", "path": "/player/level", "value": 3},
+                {"op": "remove", "path": "/obsolete"},
+                {"op": "copy", "from": "/player/hp", "path": "/max_hp"},
+                {"op": "move", "from": "/player/name", "path": "/name"},
+            ]
+        }
+    )
+
+    # when
+    response = await patch_global_state(sid, request.model_dump(by_alias=True))
+
+    # then
+    assert response == {"version": 2}
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {
+        "counter": 2,
+        "items": ["a", "b", "c"],
+        "player": {"hp": 10, "level": 3},
+        "max_hp": 10,
+        "name": "Player",
+    }
+    assert global_state.version == 2
+
+
+@pytest.mark.parametrize(
+    ("operation", "error"),
+    [
+        ({"op": "test", "path": "/counter", "value": 2}, "Test failed at path /counter"),
+        (
+            {"op": "replace", "path": "/missing", "value": 1},
+            "Cannot replace the value at path /missing",
+        ),
+        ({"op": "add", "path": "/missing/key", "value": 1}, "Cannot add the value at path"),
+        ({"op": "remove", "path": "/counter/key"}, "Cannot remove the value at path"),
+    ],
+)
+async def test_patch_global_state__failed_operation__nothing_applied(
+    sio, sid, cleanup_db, operation, error
+):
+    # given
+    global_state = await GlobalStateService().get_state()
+    global_state.state = {"counter": 1}
+    await GlobalStateService().update_state(global_state)
+
+    payload = {
+        "operations": [
+            {"op": "replace", "path": "/counter", "value": 5},
+            operation,
+        ]
+    }
+
+    # when
+    response = await patch_global_state(sid, payload)
+
+    # then
+    assert error in response["error"]
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {"counter": 1}
+    assert global_state.version == 1
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"operations": [{"op": "increment", "path": "/counter"}]},
+        {"operations": [{"op": "add", "path": "/counter"}]},
+        {"operations": [{"op": "remove", "path": "counter"}]},
+        {"operations": [{"op": "move", "from": "/a", "path": "/a/b"}]},
+        {"operations": [{"op": "replace", "path": "", "value": 1}]},
+    ],
+)
+async def test_patch_global_state__validation_error(sio, sid, payload):
+    # when
+    response = await patch_global_state(sid, payload)
+
+    # then
+    assert response == {"error": "Validation error."}
+
+
+async def test_patch_global_state__concurrent_patches__none_lost(sio, sid, cleanup_db):
+    # given
+    global_state = await GlobalStateService().get_state()
+    global_state.state = {"events": []}
+    await GlobalStateService().update_state(global_state)
+
+    payloads = [{"operations": [{"op": "add", "path": "/events/-", "value": i}]} for i in range(20)]
+
+    # when
+    responses = await asyncio.gather(*(patch_global_state(sid, payload) for payload in payloads))
+
+    # then
+    assert sorted(response["version"] for response in responses) == list(range(2, 22))
+    global_state = await GlobalStateService().get_state()
+    assert sorted(global_state.state["events"]) == list(range(20))
+
+
+async def test_merge_patch_global_state__success(sio, sid, cleanup_db):
+    # given
+    global_state = await GlobalStateService().get_state()
+    global_state.state = {
+        "weather": "rain",
+        "player": {"name": "Player", "hp": 10, "buffs": ["haste"]},
+        "obsolete": True,
+    }
+    await GlobalStateService().update_state(global_state)
+
+    request = MergePatchStateRequest(
+        patch={"weather": "sun", "player": {"hp": 7, "buffs": []}, "obsolete": None},
+        test=[{"path": "/player/hp", "value": 10}],
+    )
+
+    # when
+    response = await merge_patch_global_state(sid, request.model_dump())
+
+    # then
+    assert response == {"version": 2}
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {
+        "weather": "sun",
+        "player": {"name": "Player", "hp": 7, "buffs": []},
+    }
+
+
+async def test_merge_patch_global_state__test_failed__nothing_applied(sio, sid, cleanup_db):
+    # given
+    global_state = await GlobalStateService().get_state()
+    global_state.state = {"weather": "rain"}
+    await GlobalStateService().update_state(global_state)
+
+    request = MergePatchStateRequest(
+        patch={"weather": "sun"}, test=[{"path": "/weather", "value": "snow"}]
+    )
+
+    # when
+    response = await merge_patch_global_state(sid, request.model_dump())
+
+    # then
+    assert response == {"error": "Test failed at path /weather"}
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {"weather": "rain"}
+
+
+async def test_patch_agent_state__internal__success(sio, sid, insert, cleanup_db):
+    # given
+    agent = Agent(name="Agent 1", internal_state={"inventory": ["sword"]})
+    agent = await insert(agent)
+
+    request = PatchAgentStateRequest.model_validate(
+        {
+            "agent_id": agent.id,
+            "internal": True,
+            "operations": [{"op": "add", "path": "/inventory/-", "value": "shield"}],
+        }
+    )
+
+    # when
+    response = await patch_agent_state(sid, request.model_dump(by_alias=True))
+
+    # then
+    assert response == {"version": 1}
+    agent = await AgentService().get_agent_by_id(agent.id)
+    assert agent.internal_state == {"inventory": ["sword", "shield"]}
+    assert agent.state_version == 1
+
+
+async def test_patch_agent_state__agent_not_found(sio, sid):
+    # given
+    payload = {"agent_id": 999, "internal": True, "operations": []}
+
+    # when
+    response = await patch_agent_state(sid, payload)
+
+    # then
+    assert response == {"error": "Agent with id 999 not found"}
+
+
+async def test_merge_patch_agent_state__external__success(sio, sid, insert, cleanup_db):
+    # given
+    agent = Agent(name="Agent 1", external_state={"mood": "calm", "position": {"x": 1, "y": 2}})
+    agent = await insert(agent)
+
+    request = MergePatchAgentStateRequest(
+        agent_id=agent.id, internal=False, patch={"mood": None, "position": {"x": 3}}
+    )
+
+    # when
+    response = await merge_patch_agent_state(sid, request.model_dump())
+
+    # then
+    assert response == {"version": 1}
+    agent = await AgentService().get_agent_by_id(agent.id)
+    assert agent.external_state == {"position": {"x": 3, "y": 2}}
+
+
+async def test_update_global_state__expected_version__success(sio, sid, cleanup_db):
+    # given
+    await update_global_state(sid, {"state": {"counter": 1}})
+    request = UpdateStateRequest(state={"counter": 2}, expected_version=1)
+
+    # when
+    response = await update_global_state(sid, request.model_dump())
+
+    # then
+    assert response == request.model_dump()
+    assert await get_versioned_global_state(sid) == {"state": {"counter": 2}, "version": 2}
+
+
+async def test_update_global_state__stale_version__conflict(sio, sid, cleanup_db):
+    # given
+    await update_global_state(sid, {"state": {"counter": 1}})
+    await update_global_state(sid, {"state": {"counter": 2}})
+
+    # when
+    response = await update_global_state(sid, {"state": {"counter": 3}, "expected_version": 1})
+
+    # then
+    assert response == {
+        "error": "State version conflict, the current version is 2",
+        "state": {"counter": 2},
+        "version": 2,
+    }
+    global_state = await GlobalStateService().get_state()
+    assert global_state.state == {"counter": 2}
+
+
+async def test_patch_global_state__stale_version__nothing_applied(sio, sid, cleanup_db):
+    # given
+    await update_global_state(sid, {"state": {"counter": 1}})
+    payload = {
+        "operations": [{"op": "replace", "path": "/counter", "value": 5}],
+        "expected_version": 0,
+    }
+
+    # when
+    response = await patch_global_state(sid, payload)
+
+    # then
+    assert response == {
+        "error": "State version conflict, the current version is 1",
+        "state": {"counter": 1},
+        "version": 1,
+    }
+    assert await get_versioned_global_state(sid) == {"state": {"counter": 1}, "version": 1}
+
+
+async def test_merge_patch_agent_state__expected_version__success(sio, sid, insert, cleanup_db):
+    # given
+    agent = await insert(Agent(name="Agent 1", external_state={"mood": "calm"}))
+    payload = {
+        "agent_id": agent.id,
+        "internal": False,
+        "patch": {"mood": "angry"},
+        "expected_version": 0,
+    }
+
+    # when
+    response = await merge_patch_agent_state(sid, payload)
+
+    # then
+    assert response == {"version": 1}
+    response = await merge_patch_agent_state(sid, payload)
+    assert response["error"] == "State version conflict, the current version is 1"
+    assert response["state"] == {"mood": "angry"}
+
+
+async def test_update_agent_state__concurrent_same_version__one_applied(
+    sio, sid, insert, cleanup_db
+):
+    # given
+    agent = await insert(Agent(name="Agent 1", internal_state={"owner": None}))
+    payloads = [
+        {"agent_id": agent.id, "state": {"owner": i}, "internal": True, "expected_version": 0}
+        for i in range(10)
+    ]
+
+    # when
+    responses = await asyncio.gather(*(update_agent_state(sid, payload) for payload in payloads))
+
+    # then
+    applied = [response for response in responses if "error" not in response]
+    assert len(applied) == 1
+    assert all(response["version"] == 1 for response in responses if "error" in response)
+    response = await get_versioned_agent_state(sid, {"agent_id": agent.id, "internal": True})
+    assert response == {"state": applied[0]["state"], "version": 1}
+
+
+async def test_update_agent_state__internal_and_external__neither_lost(
+    sio, sid, insert, cleanup_db
+):
+    # given
+    agent = await insert(Agent(name="Agent 1"))
+    payloads = [
+        {"agent_id": agent.id, "state": {"hp": 5}, "internal": True},
+        {"agent_id": agent.id, "state": {"mood": "calm"}, "internal": False},
+    ]
+
+    # when
+    await asyncio.gather(*(update_agent_state(sid, payload) for payload in payloads))
+
+    # then
+    agent = await AgentService().get_agent_by_id(agent.id)
+    assert agent.internal_state == {"hp": 5}
+    assert agent.external_state == {"mood": "calm"}
+    assert agent.state_version == 2
+
+
+async def test_get_versioned_agent_state__agent_not_found(sio, sid):
+    # when
+    response = await get_versioned_agent_state(sid, {"agent_id": 999, "internal": True})
+
+    # then
+    assert response == {"error": "Agent with id 999 not found"}
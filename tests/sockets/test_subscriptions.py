@@ -0,0 +1,170 @@
+from collections.abc import Generator
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import pytest
+
+from app.models import Agent
+from app.models.state_subscriptions import state_subscriptions
+from app.sockets.state import patch_agent_state, update_agent_state, update_global_state
+from app.sockets.subscriptions import (
+    subscribe_agent_state,
+    subscribe_global_state,
+    unsubscribe_all,
+    unsubscribe_global_state,
+)
+
+
+@pytest.fixture
+def sio() -> Generator[MagicMock, None, None]:
+    with patch("app.sockets.subscriptions.sio") as mock_sio:
+        mock_sio.emit = AsyncMock()
+        mock_sio.enter_room = AsyncMock()
+        mock_sio.leave_room = AsyncMock()
+        yield mock_sio
+
+    state_subscriptions.clear()
+
+
+async def test_subscribe_global_state__state_updated__diff_sent(sio, sid, cleanup_db):
+    # given
+    await update_global_state(sid, {"state": {"weather": "sun", "day": 1}})
+    response = await subscribe_global_state(sid)
+
+    # when
+    await update_global_state(sid, {"state": {"weather": "rain", "time": "noon"}})
+
+    # then
+    assert response == {"state": {"weather": "sun", "day": 1}, "version": 1}
+    sio.enter_room.assert_awaited_once_with(sid, "state:global:")
+    sio.emit.assert_awaited_once_with(
+        "global_state_changed",
+        {
+            "agent_id": None,
+            "internal": False,
+            "path": "",
+            "version": 2,
+            "operations": [
+                {"op": "remove", "path": "/day"},
+                {"op": "replace", "path": "/weather", "value": "rain"},
+                {"op": "add", "path": "/time", "value": "noon"},
+            ],
+        },
+        to="state:global:",
+    )
+
+
+async def test_subscribe_global_state__path__only_changes_under_path_sent(sio, sid, cleanup_db):
+    # given
+    await update_global_state(sid, {"state": {"player": {"hp": 10, "mp": 5}, "day": 1}})
+    await subscribe_global_state(sid, {"path": "/player/hp"})
+
+    # when
+    await update_global_state(sid, {"state": {"player": {"hp": 10, "mp": 4}, "day": 2}})
+    await update_global_state(sid, {"state": {"player": {"hp": 7, "mp": 4}, "day": 2}})
+
+    # then
+    sio.emit.assert_awaited_once_with(
+        "global_state_changed",
+        {
+            "agent_id": None,
+            "internal": False,
+            "path": "/player/hp",
+            "version": 3,
+            "operations": [{"op": "replace", "path": "/player/hp", "value": 7}],
+        },
+        to="state:global:/player/hp",
+    )
+
+
+async def test_unsubscribe_global_state__state_updated__nothing_sent(sio, sid, cleanup_db):
+    # given
+    await subscribe_global_state(sid, {"path": "/day"})
+    await unsubscribe_global_state(sid, {"path": "/day"})
+
+    # when
+    await update_global_state(sid, {"state": {"day": 2}})
+
+    # then
+    sio.leave_room.assert_awaited_once_with(sid, "state:global:/day")
+    sio.emit.assert_not_awaited()
+
+
+async def test_subscribe_global_state__disconnected__nothing_sent(sio, sid, cleanup_db):
+    # given
+    await subscribe_global_state(sid)
+    await unsubscribe_all(sid, "client disconnect")
+
+    # when
+    await update_global_state(sid, {"state": {"day": 2}})
+
+    # then
+    sio.emit.assert_not_awaited()
+
+
+async def test_subscribe_global_state__validation_error(sio, sid):
+    # when
+    response = await subscribe_global_state(sid, {"path": "player"})
+
+    # then
+    assert response == {"error": "Validation error."}
+
+
+async def test_subscribe_agent_state__state_updated_and_patched__diffs_sent(
+    sio, sid, insert, cleanup_db
+):
+    # given
+    agent = await insert(Agent(name="Agent 1", internal_state={"inventory": ["sword"]}))
+    response = await subscribe_agent_state(sid, {"agent_id": agent.id, "internal": True})
+
+    # when
+    await update_agent_state(
+        sid, {"agent_id": agent.id, "state": {"inventory": ["axe"]}, "internal": True}
+    )
+    await update_agent_state(
+        sid, {"agent_id": agent.id, "state": {"mood": "calm"}, "internal": False}
+    )
+    await patch_agent_state(
+        sid,
+        {
+            "agent_id": agent.id,
+            "internal": True,
+            "operations": [{"op": "add", "path": "/gold", "value": 3}],
+        },
+    )
+
+    # then
+    assert response == {"state": {"inventory": ["sword"]}, "version": 0}
+    room = f"state:agent:{agent.id}:internal:"
+    assert sio.emit.await_args_list == [
+        call(
+            "agent_state_changed",
+            {
+                "agent_id": agent.id,
+                "internal": True,
+                "path": "",
+                "version": 1,
+                "operations": [{"op": "replace", "path": "/inventory", "value": ["axe"]}],
+            },
+            to=room,
+        ),
+        call(
+            "agent_state_changed",
+            {
+                "agent_id": agent.id,
+                "internal": True,
+                "path": "",
+                "version": 3,
+                "operations": [{"op": "add", "path": "/gold", "value": 3}],
+            },
+            to=room,
+        ),
+    ]
+
+
+async def test_subscribe_agent_state__agent_not_found(sio, sid):
+    # when
+    response = await subscribe_agent_state(sid, {"agent_id": 999, "internal": False})
+
+    # then
+    assert response == {"error": "Agent with id 999 not found"}
+    assert state_subscriptions.paths((999, False)) == []
@@ -1,4 +1,5 @@
 import json
+from typing import Any
 from uuid import uuid4
 
 import streamlit as st
@@ -517,50 +518,46 @@ def edit_node_dialog(action_id: int, node: sf.StreamlitFlowNode) -> None:
         edit_operator_node(action_id, node)
 
 
-def save_node(parent: Operator, node: sf.StreamlitFlowNode) -> Condition | Operator:
-    """Saves a condition or operator node."""
+def build_tree_request(
+    flow_state: sf.StreamlitFlowState, node: sf.StreamlitFlowNode
+) -> dict[str, Any]:
+    """Recursively builds the request of an operator node with all its children."""
 
-    if node.data["type"] == "condition":
-        condition = Condition.model_validate(node.data)
-        condition.parent_id = parent.id
-        condition.root_id = parent.root_id
-
-        return api.create_condition(condition)
-    else:
-        operator = Operator.model_validate(node.data)
-        operator.parent_id = parent.id
-        operator.root_id = parent.root_id
-        operator.action_id = parent.action_id
-
-        return api.create_operator(operator)
-
-
-def save_operator_children(
-    flow_state: sf.StreamlitFlowState, operator: Operator, node: sf.StreamlitFlowNode
-) -> None:
-    """Recursively saves the children of an operator node."""
-
-    children_node_ids = [edge.target for edge in flow_state.edges if edge.source == node.id]
+    operator = Operator.model_validate(node.data)
+    children_node_ids = {edge.target for edge in flow_state.edges if edge.source == node.id}
     children_nodes = [node for node in flow_state.nodes if node.id in children_node_ids]
+
+    conditions, operators = [], []
     for child_node in children_nodes:
-        child = save_node(operator, child_node)
-        if child_node.data["type"] == "operator":
-            save_operator_children(flow_state, child, child_node)
+        if child_node.data["type"] == "condition":
+            condition = Condition.model_validate(child_node.data)
+            conditions.append(
+                {
+                    "id": condition.id or None,
+                    **condition.model_dump(
+                        mode="json",
+                        include={
+                            "state_agent_id",
+                            "state_variable_name",
+                            "comparison",
+                            "expected_value",
+                        },
+                    ),
+                }
+            )
+        else:
+            operators.append(build_tree_request(flow_state, child_node))
 
+    return {
+        "id": operator.id or None,
+        "logical_operator": operator.logical_operator.value,
+        "conditions": conditions,
+        "operators": operators,
+    }
 
-def save_condition_tree(action_id: int) -> None:
-    """Saves the condition tree of an action."""
 
-    root = next(
-        (root for root in condition_tree_roots if root.action_id == action_id),
-        None,
-    )
-    if root is not None:
-        if not api.delete_condition_tree(root.id):
-            return
-
-        api.get_operators.clear()
-        api.get_conditions.clear()
+def save_condition_tree(action_id: int) -> None:
+    """Saves the whole condition tree of an action with a single request."""
 
     flow_state: sf.StreamlitFlowState = st.session_state[f"flow_state_{action_id}"]
 
@@ -569,16 +566,14 @@ def save_condition_tree(action_id: int) -> None:
         st.toast("Did not find a root node.", icon=":material/error:")
         return
 
-    root = api.create_condition_tree(
-        {"action_id": action_id, "logical_operator": root_node.data["logical_operator"]}
-    )
-    if not root:
+    if not api.replace_condition_tree(action_id, build_tree_request(flow_state, root_node)):
         return
 
-    save_operator_children(flow_state, root, root_node)
     api.get_operators.clear()
     api.get_conditions.clear()
     st.toast("Condition tree saved successfully.", icon=":material/done:")
+    # Rebuilt from the saved tree, so that the new nodes get their IDs
+    del st.session_state[f"flow_state_{action_id}"]
     st.session_state[f"is_saved_{action_id}"] = True
     if f"evaluation_result_{action_id}" in st.session_state:
         del st.session_state[f"evaluation_result_{action_id}"]
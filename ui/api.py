@@ -384,16 +384,16 @@ def get_operators() -> list[Operator]:
     ]
 
 
-def create_condition_tree(tree_dict: dict) -> Operator | None:
-    response = fetch("POST", "/conditions/tree", json=tree_dict)
+def replace_condition_tree(action_id: int, tree_dict: dict) -> bool:
+    response = fetch("PUT", f"/conditions/tree/{action_id}", json=tree_dict)
     if response is None:
-        return None
+        return False
 
-    if response.status_code != 201:
+    if response.status_code != 200:
         error_toast(response)
-        return None
+        return False
 
-    return Operator.from_response(ActionConditionOperatorResponse.model_validate(response.json()))
+    return True
 
 
 def delete_condition_tree(root_id: int) -> bool:
@@ -406,27 +406,3 @@ def delete_condition_tree(root_id: int) -> bool:
         return False
 
     return True
-
-
-def create_condition(condition: Condition) -> Condition | None:
-    response = fetch("POST", "/conditions/condition", json=condition.model_dump())
-    if response is None:
-        return None
-
-    if response.status_code != 201:
-        error_toast(response)
-        return None
-
-    return Condition.from_response(ActionConditionResponse.model_validate(response.json()))
-
-
-def create_operator(operator: Operator) -> Operator | None:
-    response = fetch("POST", "/conditions/operator", json=operator.model_dump())
-    if response is None:
-        return None
-
-    if response.status_code != 201:
-        error_toast(response)
-        return None
-
-    return Operator.from_response(ActionConditionOperatorResponse.model_validate(response.json()))
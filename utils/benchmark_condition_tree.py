@@ -0,0 +1,126 @@
+"""
+Measures building, compiling and evaluating condition trees of different sizes.
+
+The trees are generated in memory, so no database is required, in two shapes: complete 4-ary
+trees, whose inner nodes are operators and whose leaves are conditions, and chains of operators
+ending with a condition. Chains deeper than MAX_CONDITION_TREE_DEPTH are rejected when built.
+
+Usage:
+    python -m utils.benchmark_condition_tree [nodes ...]
+"""
+
+import sys
+import time
+from collections.abc import Callable
+
+from app.errors.conditions import InvalidConditionTreeError
+from app.models import ActionCondition, ActionConditionOperator
+from app.models.action_condition import (
+    MAX_CONDITION_TREE_DEPTH,
+    ComparisonMethod,
+    LogicalOperator,
+)
+from app.models.action_condition_tree import ActionConditionTreeNode
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+BRANCHING = 4
+ROOT_ID = 1
+
+
+Tree = tuple[ActionConditionOperator, list[ActionCondition], list[ActionConditionOperator]]
+
+
+def generate_tree(nodes: int) -> Tree:
+    """Generates the root, conditions and operators of a complete tree with the given size."""
+
+    conditions = []
+    operators = []
+    for node_id in range(1, nodes + 1):
+        parent_id = (node_id - 2) // BRANCHING + 1 if node_id > 1 else None
+        if (node_id - 1) * BRANCHING + 2 <= nodes:
+            operators.append(
+                ActionConditionOperator(
+                    id=node_id,
+                    parent_id=parent_id,
+                    root_id=ROOT_ID,
+                    action_id=1,
+                    logical_operator=LogicalOperator.AND,
+                )
+            )
+        else:
+            conditions.append(
+                ActionCondition(
+                    id=node_id,
+                    parent_id=parent_id,
+                    root_id=ROOT_ID,
+                    state_variable_name=f"values/{node_id % 10}",
+                    comparison=ComparisonMethod.AT_LEAST,
+                    expected_value="0",
+                )
+            )
+
+    return operators[0], conditions, operators
+
+
+def generate_chain(nodes: int) -> Tree:
+    """Generates the root, conditions and operators of a chain ending with a condition."""
+
+    operators = [
+        ActionConditionOperator(
+            id=node_id,
+            parent_id=node_id - 1 if node_id > 1 else None,
+            root_id=ROOT_ID,
+            action_id=1,
+            logical_operator=LogicalOperator.AND,
+        )
+        for node_id in range(1, nodes)
+    ]
+    condition = ActionCondition(
+        id=nodes,
+        parent_id=nodes - 1,
+        root_id=ROOT_ID,
+        state_variable_name="values/0",
+        comparison=ComparisonMethod.AT_LEAST,
+        expected_value="0",
+    )
+
+    return operators[0], [condition], operators
+
+
+SHAPES: dict[str, Callable[[int], Tree]] = {"complete": generate_tree, "chain": generate_chain}
+
+
+def main(sizes: list[int]) -> None:
+    global_state = {"values": list(range(10))}
+
+    for shape, generate in SHAPES.items():
+        shape_sizes = sizes if shape == "complete" else [MAX_CONDITION_TREE_DEPTH, *sizes]
+        for nodes in shape_sizes:
+            root, conditions, operators = generate(nodes)
+
+            start = time.perf_counter()
+            try:
+                root_node = ActionConditionTreeNode.build(
+                    ActionConditionTreeNode.from_operator(root), conditions, operators
+                )
+            except InvalidConditionTreeError:
+                built = time.perf_counter()
+                print(f"{shape:>8} {nodes:>7} nodes: rejected in {(built - start) * 1000:.2f}ms")
+                continue
+
+            built = time.perf_counter()
+            evaluator = root_node.compile()
+            compiled = time.perf_counter()
+            evaluator(global_state, {})
+            evaluated = time.perf_counter()
+
+            print(
+                f"{shape:>8} {nodes:>7} nodes: "
+                f"build={(built - start) * 1000:.2f}ms "
+                f"compile={(compiled - built) * 1000:.2f}ms "
+                f"evaluate={(evaluated - compiled) * 1000:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,60 @@
+"""
+Measures the per-request database connection overhead with and without the connection pool.
+
+Every request opens a session, reads the global state and commits, like a UnitOfWork does.
+Requires a running database configured in the .env file.
+
+Usage:
+    python -m utils.benchmark_db_connections [requests]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.database import DATABASE_URL, create_engine
+from app.models import GlobalState
+
+DEFAULT_REQUESTS = 500
+
+
+async def measure(engine: AsyncEngine, requests: int) -> list[float]:
+    """Runs the requests sequentially and returns their durations in milliseconds."""
+
+    session_maker = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        async with session_maker() as session:
+            await session.get(GlobalState, 1)
+            await session.commit()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return durations
+
+
+async def main(requests: int) -> None:
+    for name, pooled in (("NullPool", False), ("Pooled", True)):
+        engine = create_engine(DATABASE_URL, pooled=pooled)
+        durations = await measure(engine, requests)
+        await engine.dispose()
+
+        percentiles = statistics.quantiles(durations, n=100)
+        print(
+            f"{name:>8}: "
+            f"mean={statistics.mean(durations):.2f}ms "
+            f"p50={percentiles[49]:.2f}ms "
+            f"p95={percentiles[94]:.2f}ms "
+            f"total={sum(durations):.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS))
@@ -0,0 +1,83 @@
+"""
+Measures the bytes sent per agent query as the number of connected clients grows,
+broadcasting the responses to every client versus routing them to the caller and spectators.
+
+The clients are registered in memory with a Socket.IO server whose packets are counted
+instead of sent, so no database, LLM or network is required.
+
+Usage:
+    python -m utils.benchmark_socket_egress [clients ...]
+"""
+
+import asyncio
+import sys
+from uuid import uuid4
+
+import socketio
+from engineio import packet
+
+from app.models import Agent, Player
+from app.sockets.agent import agent_room, player_room, query_recipients
+from app.sockets.models import AgentQueryResponse
+
+DEFAULT_CLIENTS = [10, 100, 1_000]
+SPECTATORS = 2
+
+
+class CountingServer(socketio.AsyncServer):
+    """A Socket.IO server counting the bytes of the packets it would send."""
+
+    sent_bytes: int
+
+    def __init__(self) -> None:
+        super().__init__(async_mode="asgi")
+        self.sent_bytes = 0
+
+    async def _send_eio_packet(self, eio_sid: str, eio_pkt: packet.Packet) -> None:
+        encoded = eio_pkt.encode()
+        self.sent_bytes += len(encoded if isinstance(encoded, bytes) else encoded.encode())
+
+
+async def emit_query(server: CountingServer, to: list[str] | None) -> int:
+    """Emits the events of a query without triggered agents and returns the bytes sent."""
+
+    response = AgentQueryResponse(
+        query_id=uuid4(), agent_id=1, response="Greetings, traveller! " * 10, actions=[]
+    )
+
+    server.sent_bytes = 0
+    await server.emit("agent_response", response.model_dump(), to=to)
+    await server.emit("agent_response_end", {"query_id": str(response.query_id)}, to=to)
+    return server.sent_bytes
+
+
+async def measure(clients: int) -> tuple[int, int]:
+    """Returns the bytes sent per query when broadcast and when routed."""
+
+    server = CountingServer()
+    sids = [await server.manager.connect(f"eio_{i}", "/") for i in range(clients)]
+
+    agent = Agent(id=1, name="Agent")
+    player = Player(id=1, name="Player")
+    for sid in sids[1 : SPECTATORS + 1]:
+        await server.enter_room(sid, agent_room(agent.id))
+        await server.enter_room(sid, player_room(player.id))
+
+    broadcast = await emit_query(server, None)
+    routed = await emit_query(server, query_recipients(sids[0], agent, player))
+    return broadcast, routed
+
+
+async def main(client_counts: list[int]) -> None:
+    for clients in client_counts:
+        broadcast, routed = await measure(clients)
+        print(
+            f"{clients:>6} clients: "
+            f"broadcast={broadcast / 1024:.1f}KiB/query "
+            f"routed={routed / 1024:.1f}KiB/query "
+            f"({1 + SPECTATORS} recipients)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(clients) for clients in sys.argv[1:]] or DEFAULT_CLIENTS))
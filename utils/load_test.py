@@ -0,0 +1,202 @@
+"""
+Load tests the query path end to end without calling any LLM.
+
+Starts the app in-process with the fake LLM provider, seeds a chain of agents where every agent
+can trigger the next one, and drives concurrent Socket.IO clients through query_agent cascades.
+Reports the latency percentiles of the queries, the throughput and the SQL statements executed.
+The clients share the process with the server, so the latencies include their overhead.
+
+Requires a running database configured in the .env file, the seeded rows are deleted afterwards.
+The fake LLM is configured with the FAKE_LLM_* variables, and LLM_PROVIDER=openai can be passed
+explicitly to load test against OpenAI instead.
+
+Usage:
+    python -m utils.load_test [--clients 20] [--queries 10] [--agents 3]
+"""
+
+import os
+
+# Set before the app loads the .env file, which does not override the environment
+os.environ.setdefault("LLM_PROVIDER", "fake")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+from dataclasses import dataclass, field  # noqa: E402
+from uuid import uuid4  # noqa: E402
+
+import socketio  # noqa: E402
+import uvicorn  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.core.database import async_engine  # noqa: E402
+from app.main import socket_app  # noqa: E402
+from app.models import Agent, Player  # noqa: E402
+from app.models.action import ActionRequest  # noqa: E402
+from app.models.action_param import ActionParamRequest, ActionParamType  # noqa: E402
+from app.models.agent import AgentRequest  # noqa: E402
+from app.models.player import PlayerRequest  # noqa: E402
+from app.services.action_param_service import ActionParamService  # noqa: E402
+from app.services.action_service import ActionService  # noqa: E402
+from app.services.agent_service import AgentService  # noqa: E402
+from app.services.player_service import PlayerService  # noqa: E402
+from utils.socketio_client import PORT, login  # noqa: E402
+
+QUERY_TIMEOUT = 120
+
+
+@dataclass
+class LoadTestResult:
+    latencies: list[float] = field(default_factory=list)
+    responses: int = 0
+    errors: int = 0
+
+
+class StatementCounter:
+    """Counts the SQL statements executed by the engine of the app."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *_) -> None:
+        self.count += 1
+
+
+async def seed(run_id: str, agents: int, clients: int) -> tuple[list[Agent], list[Player]]:
+    """Creates a chain of agents triggering the next one, and a player per client."""
+
+    seeded_agents = [
+        await AgentService().create_agent(
+            AgentRequest(
+                name=f"Load test {run_id} agent {i}",
+                description="An agent created by the load test",
+                instructions="Answer the question and ask the next agent if needed.",
+            )
+        )
+        for i in range(agents)
+    ]
+
+    for caller, triggered_agent in zip(seeded_agents, seeded_agents[1:], strict=False):
+        action = await ActionService().create_action(
+            ActionRequest(
+                name=f"Load test {run_id} ask {triggered_agent.id}",
+                description=f"Ask {triggered_agent.name} a question",
+                triggered_agent_id=triggered_agent.id,
+            )
+        )
+        await ActionParamService().create_action_param(
+            ActionParamRequest(
+                action_id=action.id,
+                name="question",
+                description="The question",
+                type=ActionParamType.STRING,
+            )
+        )
+        await AgentService().assign_action_to_agent(caller.id, action.id)
+
+    players = [
+        await PlayerService().create_player(
+            PlayerRequest(name=f"Load test {run_id} player {i}", description="A load test player")
+        )
+        for i in range(clients)
+    ]
+
+    return seeded_agents, players
+
+
+async def cleanup(agents: list[Agent], players: list[Player]) -> None:
+    """Deletes the seeded agents, their actions and messages, and the players."""
+
+    for agent in agents:
+        await AgentService().delete_agent_messages(agent.id)
+
+    for agent in agents:
+        populated_agent = await AgentService().get_populated_agent(agent.id)
+        for action in populated_agent.actions:
+            await ActionService().delete_action(action.id)
+
+    for agent in reversed(agents):
+        await AgentService().delete_agent(agent.id)
+
+    for player in players:
+        await PlayerService().delete_player(player.id)
+
+
+async def run_client(
+    token: str, agent: Agent, player: Player, queries: int, result: LoadTestResult
+) -> None:
+    """Connects a client and sends its queries one after another, each awaiting its cascade."""
+
+    client = socketio.AsyncClient()
+
+    @client.on("agent_response")
+    async def agent_response(_) -> None:
+        result.responses += 1
+
+    await client.connect(
+        f"http://localhost:{PORT}", auth={"access_token": token}, transports=["websocket"]
+    )
+
+    try:
+        for i in range(queries):
+            start = time.perf_counter()
+            response = await client.call(
+                "query_agent",
+                {"agent_id": agent.id, "player_id": player.id, "query": f"Question {i}"},
+                timeout=QUERY_TIMEOUT,
+            )
+            result.latencies.append((time.perf_counter() - start) * 1000)
+            if not response.get("success"):
+                result.errors += 1
+    finally:
+        await client.disconnect()
+
+
+async def main(clients: int, queries: int, agents: int) -> None:
+    server = uvicorn.Server(uvicorn.Config(socket_app, port=PORT, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.1)
+
+    seeded_agents, players = await seed(uuid4().hex[:8], agents, clients)
+    token = await asyncio.to_thread(login)
+
+    statements = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", statements)
+    result = LoadTestResult()
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(run_client(token, seeded_agents[0], player, queries, result) for player in players)
+        )
+        duration = time.perf_counter() - start
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", statements)
+        await cleanup(seeded_agents, players)
+        server.should_exit = True
+        await server_task
+
+    percentiles = statistics.quantiles(result.latencies, n=100, method="inclusive")
+    print(
+        f"{clients} clients x {queries} queries, cascades of up to {agents} agents "
+        f"({os.environ['LLM_PROVIDER']} LLM)\n"
+        f"  latency: p50={percentiles[49]:.0f}ms p95={percentiles[94]:.0f}ms "
+        f"p99={percentiles[98]:.0f}ms max={max(result.latencies):.0f}ms\n"
+        f"  throughput: {len(result.latencies) / duration:.1f} queries/s, "
+        f"{result.responses / duration:.1f} agent responses/s, {result.errors} failed queries\n"
+        f"  SQL statements: {statements.count} "
+        f"({statements.count / len(result.latencies):.1f}/query, "
+        f"{statements.count / max(result.responses, 1):.1f}/agent response)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=20, help="concurrent socket clients")
+    parser.add_argument("--queries", type=int, default=10, help="queries sent by each client")
+    parser.add_argument("--agents", type=int, default=3, help="length of the agent chain")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.clients, args.queries, args.agents))
@@ -0,0 +1,54 @@
+"""
+Archives the expired partitions and messages of the agent message table to compressed
+JSONL files, or restores archived partitions and messages back into the database.
+
+Messages are expired once they outlived the retention of the agents of their conversations
+(MESSAGE_RETENTION_DAYS by default, kept forever if unset). Partitions whose messages all
+expired are archived whole, the expired messages of the other partitions to a separate file.
+Requires a running database configured in the .env file.
+
+Usage:
+    python -m utils.message_archive archive [archive_dir]
+    python -m utils.message_archive restore <archive_file>...
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from app.services.message_archive_service import MESSAGE_ARCHIVE_DIR, MessageArchiveService
+
+
+async def archive(archive_dir: Path) -> None:
+    archive_service = MessageArchiveService()
+    await archive_service.create_upcoming_partitions()
+
+    paths = await archive_service.archive_expired_partitions(archive_dir=archive_dir)
+    for path in paths:
+        print(f"Archived {path}")
+
+    print(f"Archived {len(paths)} partitions")
+
+    path = await archive_service.archive_expired_messages(archive_dir=archive_dir)
+    if path is not None:
+        print(f"Archived expired messages to {path}")
+
+
+async def restore(paths: list[Path]) -> None:
+    archive_service = MessageArchiveService()
+    for path in paths:
+        restored = await archive_service.restore_archive(path)
+        print(f"Restored {restored} messages from {path}")
+
+
+if __name__ == "__main__":
+    match sys.argv[1:]:
+        case ["archive"]:
+            asyncio.run(archive(MESSAGE_ARCHIVE_DIR))
+        case ["archive", archive_dir]:
+            asyncio.run(archive(Path(archive_dir)))
+        case ["restore", *paths] if paths:
+            asyncio.run(restore([Path(path) for path in paths]))
+        case _:
+            print(__doc__)
+            sys.exit(1)
@@ -1,6 +1,7 @@
 import json
 import os
 import threading
+from collections.abc import Callable
 from typing import Any
 from urllib.parse import urlencode
 
@@ -17,6 +18,12 @@ client = socketio.Client()
 
 PORT = 8080
 
+MAX_STATE_UPDATE_ATTEMPTS = 5
+VERSIONED_STATE_EVENTS = {
+    "update_global_state": "get_versioned_global_state",
+    "update_agent_state": "get_versioned_agent_state",
+}
+
 response_event = threading.Event()
 
 
@@ -53,6 +60,46 @@ def update_agent_state() -> None:
     )
 
 
+def update_state_with_retry(
+    event: str,
+    data: dict[str, Any],
+    update: Callable[[dict[str, Any]], dict[str, Any]],
+    max_attempts: int = MAX_STATE_UPDATE_ATTEMPTS,
+) -> dict[str, Any]:
+    """
+    Read, modify and write a state with compare-and-set, so that concurrent writers
+    never overwrite each other. The update computes the new state from the current one
+    and is applied again to the state returned by a version conflict, until the write succeeds.
+
+    Args:
+        event (str): update_global_state or update_agent_state.
+        data (dict[str, Any]): The other fields of the event, like agent_id and internal.
+        update (Callable[[dict[str, Any]], dict[str, Any]]): Computes the new state.
+        max_attempts (int): The maximum number of writes.
+
+    Returns:
+        dict[str, Any]: The response to the last write.
+    """
+
+    current = client.call(VERSIONED_STATE_EVENTS[event], data or None)
+    if "error" in current:
+        return current
+
+    response = current
+    for _ in range(max_attempts):
+        state = update(current["state"])
+        response = client.call(
+            event, {**data, "state": state, "expected_version": current["version"]}
+        )
+        # Only version conflicts return the current version along with the error
+        if "error" not in response or "version" not in response:
+            return response
+
+        current = response
+
+    return response
+
+
 def print_response_callback(data: dict[str, Any]) -> None:
     print(data)
     response_event.set()
@@ -71,6 +118,11 @@ def connect():
     print("Connected to the server.")
 
 
+@client.event
+def agent_response_delta(data: dict[str, Any]):
+    print(data["delta"], end="", flush=True)
+
+
 @client.event
 def agent_response(data: dict[str, Any]):
     print(data)
@@ -0,0 +1,73 @@
+"""
+A stub OpenTelemetry collector printing the span trees of the traced agent queries.
+
+Accepts the OTLP JSON export requests posted by the app when TRACE_COLLECTOR_URL is set
+to http://localhost:4318/v1/traces, and optionally appends them to a file.
+
+Usage:
+    python -m utils.trace_collector [port] [output file]
+"""
+
+import json
+import sys
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+DEFAULT_PORT = 4318
+
+
+def print_trace(spans: list[dict[str, Any]]) -> None:
+    """Prints the spans of a trace as a tree with their start and duration in milliseconds."""
+
+    start = min(int(span["startTimeUnixNano"]) for span in spans)
+    children = defaultdict(list)
+    for span in spans:
+        children[span["parentSpanId"]].append(span)
+
+    def _print(span: dict[str, Any], depth: int) -> None:
+        span_start = int(span["startTimeUnixNano"])
+        duration = int(span["endTimeUnixNano"]) - span_start
+        error = f" ERROR {span['status']['message']}" if span["status"]["code"] == 2 else ""
+        print(
+            f"{(span_start - start) / 1e6:>9.1f}ms {duration / 1e6:>9.1f}ms "
+            f"{'  ' * depth}{span['name']}{error}"
+        )
+        for child in children[span["spanId"]]:
+            _print(child, depth + 1)
+
+    print(f"trace {spans[0]['traceId']}")
+    for root in children[""]:
+        _print(root, 0)
+
+
+class TraceHandler(BaseHTTPRequestHandler):
+    output_path: str | None = None
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.loads(body)
+
+        for resource_spans in payload["resourceSpans"]:
+            for scope_spans in resource_spans["scopeSpans"]:
+                print_trace(scope_spans["spans"])
+
+        if self.output_path is not None:
+            with open(self.output_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(payload) + "\n")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    TraceHandler.output_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    print(f"Collecting traces on http://localhost:{port}/v1/traces")
+    ThreadingHTTPServer(("", port), TraceHandler).serve_forever()